@@ -1,39 +1,108 @@
 # To run this code you need to install the following dependencies:
 # pip install google-genai requests
 
-import requests
 from google import genai
-from google.genai import types
-from pymongo import MongoClient
+from google.genai import errors, types
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import hashlib
 import json
-import time
 import os
+import threading
+import time
+
+from database import get_database
+from attachments import Attachment, attachment_source, load_attachment, load_attachments
+import eval_metrics
+from eval_schema import elegibility_schema, technical_schema, financial_schema, legal_schema, parse_answer
+from gemini_files import DocumentRegistry
+from pdf_extract import EXTRACTOR_VERSION, DocumentExtractor, available as pdf_extraction_available, is_complete, \
+    render_pages
+import retrieval
+from retrieval import PageIndex, requirement_queries
+from prompt_cache import PromptCache
+from rankings import refresh_ranking
+from llm_client import LLMClient, http_options
 
 from dotenv import load_dotenv
 
 load_dotenv()
 
-client = genai.Client(
-    api_key=os.environ.get("GEMINI_API_KEY"),
-)
-mongo_client = MongoClient(os.environ.get("MONGODB_URI"))
-db = mongo_client['db']
+if os.environ.get("GEMINI_FAKE"):
+    from fakes import FakeGenaiClient
+    client = FakeGenaiClient(latency=float(os.environ.get("GEMINI_FAKE_LATENCY", 0)))
+else:
+    client = genai.Client(
+        api_key=os.environ.get("GEMINI_API_KEY"),
+        http_options=http_options(),
+    )
+# Same process-wide client (and connection pool) as the API routes
+db = get_database()
+
+MODEL = os.environ.get("GEMINI_MODEL", "gemini-2.0-flash")
+
+# Every model and Files API call is paced, bounded, retried and guarded by
+# the circuit breaker shared across the process (see llm_client.py).
+llm = LLMClient(client)
+
+# Bid documents are uploaded to the Gemini Files API once and referenced by
+# handle from every agent; GEMINI_FILES_API=0 falls back to inline bytes.
+document_registry = None
+if os.environ.get("GEMINI_FILES_API", "1") != "0":
+    document_registry = DocumentRegistry(
+        llm,
+        db.gemini_files,
+        min_bytes=int(os.environ.get("GEMINI_FILES_MIN_BYTES", 0)),
+    )
 
-def ai_chat(system_prompt, user_prompt:str='', file_attachments=None, temp=0):
+# PDFs are parsed locally once per content hash and agents get the compact
+# text instead of the file. EVAL_INPUT_MODE: auto (text when every page has
+# text, else the file), text (always text for PDFs) or binary (always the file).
+EVAL_INPUT_MODE = os.environ.get("EVAL_INPUT_MODE", "auto")
+document_extractor = None
+if EVAL_INPUT_MODE != "binary" and pdf_extraction_available():
+    document_extractor = DocumentExtractor(db.document_extracts)
+
+# Extracted bids are trimmed to the pages relevant to each agent's
+# requirements (see retrieval.py); EVAL_RETRIEVAL=0 sends every page.
+EVAL_RETRIEVAL = os.environ.get("EVAL_RETRIEVAL", "1") != "0"
+
+# Part of every agent fingerprint; extraction and retrieval settings only
+# matter when bids are extracted at all
+INPUT_SETTINGS = {'mode': EVAL_INPUT_MODE}
+if document_extractor is not None:
+    INPUT_SETTINGS['extractor_version'] = EXTRACTOR_VERSION
+    INPUT_SETTINGS['retrieval'] = EVAL_RETRIEVAL and {
+        'pages_per_requirement': retrieval.PAGES_PER_REQUIREMENT,
+        'max_pages': retrieval.MAX_PAGES,
+        'min_pages': retrieval.MIN_PAGES,
+        'k1': retrieval.K1,
+        'b': retrieval.B,
+    }
+
+# The system prompt and tender requirements are the same for every bid on a
+# tender, so they are put in a Gemini context cache once they reach the
+# model's minimum size; GEMINI_CONTEXT_CACHE=0 sends them with every call instead.
+prompt_cache = None
+if os.environ.get("GEMINI_CONTEXT_CACHE", "1") != "0":
+    prompt_cache = PromptCache(llm, db.prompt_caches, MODEL)
+
+def ai_chat(system_prompt, user_prompt:str='', file_attachments=None, temp=0, cached_content=None, response_schema=None):
     """
     Interact with the Gemini AI chat model, optionally including file attachments.
 
     Args:
         system_prompt (str): The system-level instructions for the AI.
         user_prompt (str): The user's message or query.
-        file_attachments (list of str): List of file paths or URLs to attach.
+        file_attachments (list): File paths, URLs, Attachment or prepared types.Part objects to attach.
         temp (float): Temperature setting for response variability.
+        cached_content (str): Name of a context cache that already holds the system prompt.
+        response_schema (dict): Schema the JSON answer must follow (see eval_schema).
 
     Returns:
         str: The AI-generated response text.
     """
 
-    model = "gemini-2.0-flash" 
+    model = MODEL
 
     parts = []
 
@@ -43,64 +112,14 @@ def ai_chat(system_prompt, user_prompt:str='', file_attachments=None, temp=0):
     # Handle file attachments
     if file_attachments:
         for attachment in file_attachments:
-            file_bytes = None
-            mime_type = "application/octet-stream"
-
-            if isinstance(attachment, str):
-                if attachment.startswith(('http://', 'https://')):
-                    # It's a URL
-                    try:
-                        response = requests.get(attachment)
-                        response.raise_for_status()
-                        file_bytes = response.content
-                        
-                        # Attempt to get mime type from headers, fallback to extension logic later if needed
-                        content_type = response.headers.get('Content-Type')
-                        if content_type:
-                            mime_type = content_type.split(';')[0].strip()
-                        
-                        # If generic or missing, try to guess from URL path
-                        if mime_type == "application/octet-stream" or not mime_type:
-                            if attachment.lower().endswith(".pdf"):
-                                mime_type = "application/pdf"
-                            elif attachment.lower().endswith((".jpg", ".jpeg")):
-                                mime_type = "image/jpeg"
-                            elif attachment.lower().endswith(".png"):
-                                mime_type = "image/png"
-
-                    except requests.RequestException as e:
-                        print(f"Error downloading URL {attachment}: {e}")
-                        continue
-
-                else:
-                    # It's a local file path
-                    file_path = attachment
-                    if file_path.lower().endswith(".pdf"):
-                        mime_type = "application/pdf"
-                    elif file_path.lower().endswith((".jpg", ".jpeg")):
-                        mime_type = "image/jpeg"
-                    elif file_path.lower().endswith(".png"):
-                        mime_type = "image/png"
-                    
-                    try:
-                        with open(file_path, "rb") as f:
-                            file_bytes = f.read()
-                    except FileNotFoundError:
-                        print(f"File not found: {file_path}")
-                        continue
-
-            elif isinstance(attachment, dict):
-                # It's a dict with data and mime_type
-                file_bytes = attachment.get('data')
-                mime_type = attachment.get('mime_type', 'application/octet-stream')
-            else:
+            if isinstance(attachment, types.Part):
+                # Already prepared once for the whole evaluation
+                parts.append(attachment)
                 continue
-
-            if file_bytes:
-                parts.append(types.Part.from_bytes(
-                    data=file_bytes,
-                    mime_type=mime_type
-                ))
+            if not isinstance(attachment, Attachment):
+                attachment = load_attachment(attachment)
+            if attachment and attachment.data:
+                parts.append(attachment.to_part())
 
     # Add the text prompt
     parts.append(types.Part.from_text(text=user_prompt))
@@ -112,53 +131,36 @@ def ai_chat(system_prompt, user_prompt:str='', file_attachments=None, temp=0):
         ),
     ]
 
-    generate_content_config = types.GenerateContentConfig(
-        temperature=temp,
-        response_mime_type="application/json",
-        system_instruction=[
-            types.Part.from_text(text=system_prompt),
-        ],
-    )
+    if cached_content:
+        # The system prompt lives in the cache and may not be sent again
+        generate_content_config = types.GenerateContentConfig(
+            temperature=temp,
+            response_mime_type="application/json",
+            response_schema=response_schema,
+            cached_content=cached_content,
+        )
+    else:
+        generate_content_config = types.GenerateContentConfig(
+            temperature=temp,
+            response_mime_type="application/json",
+            response_schema=response_schema,
+            system_instruction=[
+                types.Part.from_text(text=system_prompt),
+            ],
+        )
 
-    response = client.models.generate_content(
+    request_bytes = eval_metrics.request_size(contents, None if cached_content else system_prompt)
+    response = llm.generate_content(
         model=model,
         contents=contents,
         config=generate_content_config,
     )
+    eval_metrics.record_call(response, request_bytes)
 
     return response.text
 
 
-
-def evaluate_submission_async(bid_id):
-    """Placeholder function for AI evaluation logic"""
-    # Direct connection to DB for async thread
-
-    time.sleep(2)  # Ensure DB write has likely completed
-    
-    submission = db.submissions.find_one({'bid_id': bid_id})
-    if not submission:
-        client.close()
-        return
-    
-    tender = db.tenders.find_one({'tender_id': submission['tender_id']})
-    
-    if not tender:
-        print(f"AI EVAL : Tender {submission['tender_id']} not found for bid {bid_id}")
-        client.close()
-        return
-
-
-    # Simulate evaluation process
-    time.sleep(5)  # Simulate time-consuming evaluation
-
-    server_url = os.getenv("SERVER_URL", "")
-    
-    
-    # elegibility agent
-    if not 'elegibility_reasoning' in submission.get('evaluation', {}):
-        resp = ai_chat(
-            """You will be provided with:
+ELEGIBILITY_PROMPT = """You will be provided with:
 1. A complete bid document.
 2. A requirement schema defining evaluation criteria and structure.
 
@@ -181,31 +183,9 @@ json output format (strictly follow this) -
     "elegibility_score": 85,
     "elegibility_reasoning": "The bidder has over 5 years of experience and holds ISO 9001 certification but has only supplied to 2 large corporations in the last 2 years, which does not meet the requirement of at least 3.",
 }
-""",
-            file_attachments=[f"{server_url}{att['url']}" for att in submission.get('attachments', [])],
-            user_prompt=
-                f"elegibility_requirements : {tender['requirements'].get('eligibility', [])}",
-            temp=0)
-        resp = resp.replace('```json', '').replace('```', '')
-
-        # save evaluation back to submission
-        try:
-            eval_json = json.loads(resp)
-            # Use dot notation to avoid overwriting other evaluation fields
-            update_fields = {f'evaluation.{k}': v for k, v in eval_json.items()}
-            db.submissions.update_one(
-                {'bid_id': bid_id},
-                {'$set': update_fields}
-            )
-        except Exception as e:
-            print(f"Error parsing elegibility JSON for bid {bid_id}: {e}")
-        print(f"AI EVAL : Completed elegibility evaluation for bid {bid_id}")
+"""
 
-    time.sleep(10)
-    # technical agent
-    if not 'technical_reasoning' in submission.get('evaluation', {}):
-        resp = ai_chat(
-            """You will be provided with:
+TECHNICAL_PROMPT = """You will be provided with:
 
     1. A complete bid document.
     2. A requirement schema defining evaluation criteria and structure.
@@ -284,31 +264,9 @@ json output format (strictly follow this) -
     \"technical_checklist\": [
         true, false, true, true
         ],
-    }""",
-        file_attachments=[f"{server_url}{att['url']}" for att in submission.get('attachments', [])],
-        user_prompt=f"technical_checklist:{tender['requirements']['technical_checklist']}, technical_sku:{tender['requirements']['technical_sku']}",
-        temp=0)
-        resp = resp.replace('```json', '').replace('```', '')
+    }"""
 
-        # save evaluation back to submission
-        try:
-            eval_json = json.loads(resp)
-            # Use dot notation to avoid overwriting other evaluation fields
-            update_fields = {f'evaluation.{k}': v for k, v in eval_json.items()}
-            db.submissions.update_one(
-                {'bid_id': bid_id},
-                {'$set': update_fields}
-            )
-        except Exception as e:
-            print(f"Error parsing evaluation JSON for bid {bid_id}: {e}")
-
-        print(f"AI EVAL : Completed technical evaluation for bid {bid_id}")
-
-    time.sleep(10)
-    # financial agent
-    if not 'financial_reasoning' in submission.get('evaluation', {}):
-        resp = ai_chat(
-            """You will be provided with:
+FINANCIAL_PROMPT = """You will be provided with:
 
     1. A complete bid document.
     2. A requirement schema defining evaluation criteria and structure.
@@ -360,32 +318,9 @@ json output format (strictly follow this) -
 
         "financial_score": 95,
         "financial_reasoning": "The bid amount is within the acceptable range."
-    }""",
-        file_attachments=[f"{server_url}{att['url']}" for att in submission.get('attachments', [])],
-        user_prompt=f"financial_checklist:{tender['requirements'].get('financial_checklist', [])}    you must extract+calculate Financial pricing and cost based on the given bid submission PDF for the following items - {list(tender['requirements'].get('technical_sku', {}).keys())}",
-        temp=0)
-        
-        resp = resp.replace('```json', '').replace('```', '')
-
-        # save evaluation back to submission
-        try:
-            eval_json = json.loads(resp)
-            # Use dot notation to avoid overwriting other evaluation fields (like technical)
-            update_fields = {f'evaluation.{k}': v for k, v in eval_json.items()}
-            db.submissions.update_one(
-                {'bid_id': bid_id},
-                {'$set': update_fields}
-            )
-        except Exception as e:
-            print(f"Error parsing financial evaluation JSON for bid {bid_id}: {e}")
-
-        print(f"AI EVAL : Completed evaluation for bid {bid_id}")
+    }"""
 
-    time.sleep(10)
-    # legal agent
-    if not 'legal_reasoning' in submission.get('evaluation', {}):
-        resp = ai_chat(
-            """You will be provided with:
+LEGAL_PROMPT = """You will be provided with:
 1. A complete bid document.
 2. A requirement schema defining evaluation criteria and structure.
 
@@ -398,29 +333,349 @@ json output format (strictly follow this) -
 "legal": [true, true],
 "legal_score": 100,
 "legal_reasoning": "The bidder complies with all local and national regulations and the products are 85% made in India."
-}""",
-        file_attachments=[f"{server_url}{att['url']}" for att in submission.get('attachments', [])],
-        user_prompt=f"legal_requirements:{tender['requirements'].get('legal', [])}",
-        temp=0)
-        
-        resp = resp.replace('```json', '').replace('```', '')
-
-        # save evaluation back to submission
+}"""
+
+# Each agent reads the same bid attachments and writes its own keys under
+# `evaluation`, so the four of them are independent and can run side by side.
+AGENTS = [
+    {
+        'name': 'elegibility',
+        'system_prompt': ELEGIBILITY_PROMPT,
+        'user_prompt': lambda tender: f"elegibility_requirements : {tender['requirements'].get('eligibility', [])}",
+        'requirements': lambda tender: tender['requirements'].get('eligibility', []),
+        'response_schema': elegibility_schema,
+        'done_key': 'elegibility_reasoning',
+    },
+    {
+        'name': 'technical',
+        'system_prompt': TECHNICAL_PROMPT,
+        'user_prompt': lambda tender: f"technical_checklist:{tender['requirements'].get('technical_checklist', [])}, technical_sku:{tender['requirements'].get('technical_sku', {})}",
+        'requirements': lambda tender: [tender['requirements'].get('technical_checklist', []), tender['requirements'].get('technical_sku', {})],
+        'response_schema': technical_schema,
+        'done_key': 'technical_reasoning',
+    },
+    {
+        'name': 'financial',
+        'system_prompt': FINANCIAL_PROMPT,
+        'user_prompt': lambda tender: f"financial_checklist:{tender['requirements'].get('financial_checklist', [])}    you must extract+calculate Financial pricing and cost based on the given bid submission PDF for the following items - {list(tender['requirements'].get('technical_sku', {}).keys())}",
+        'requirements': lambda tender: [tender['requirements'].get('financial_checklist', []), list(tender['requirements'].get('technical_sku', {}).keys()), "price schedule unit price total cost quoted amount tax"],
+        'response_schema': financial_schema,
+        'done_key': 'financial_reasoning',
+    },
+    {
+        'name': 'legal',
+        'system_prompt': LEGAL_PROMPT,
+        'user_prompt': lambda tender: f"legal_requirements:{tender['requirements'].get('legal', [])}",
+        'requirements': lambda tender: tender['requirements'].get('legal', []),
+        'response_schema': legal_schema,
+        'done_key': 'legal_reasoning',
+    },
+]
+
+
+# Sent instead of the requirements when they are already in the context cache
+CACHED_USER_PROMPT = "Evaluate the attached bid document against the requirements above."
+
+# Appended to the prompt when an agent's answer failed validation
+RETRY_FEEDBACK = """
+
+Your previous answer was rejected:
+{problems}
+Answer again with only the JSON object in the required format, one entry per requirement."""
+
+# Calls per agent before its answer is given up on (the job queue may retry later)
+AGENT_ATTEMPTS = int(os.environ.get("EVAL_AGENT_ATTEMPTS", 3))
+
+
+class TenderContext:
+    """
+    Everything the agents need from a tender, prepared once per tender.
+
+    The per-agent user prompts, retrieval queries and response schemas are
+    built up front so that evaluating hundreds of bids on the same tender
+    doesn't rebuild them for every bid.
+    """
+
+    def __init__(self, tender):
+        self.tender = tender
+        self.tender_id = tender['tender_id']
+        self.user_prompts = {agent['name']: agent['user_prompt'](tender) for agent in AGENTS}
+        self.retrieval_queries = {agent['name']: requirement_queries(agent['requirements'](tender)) for agent in AGENTS}
+        self.response_schemas = {agent['name']: agent['response_schema'](tender['requirements']) for agent in AGENTS}
+
+
+TENDER_CONTEXT_TTL = float(os.environ.get("TENDER_CONTEXT_TTL", 60))
+_tender_contexts = {}  # tender_id -> (loaded_at, TenderContext)
+
+
+def get_tender_context(tender_id):
+    """Return the TenderContext for a tender, reusing a recent one if available."""
+    cached = _tender_contexts.get(tender_id)
+    if cached and time.monotonic() - cached[0] < TENDER_CONTEXT_TTL:
+        return cached[1]
+
+    tender = db.tenders.find_one({'tender_id': tender_id})
+    if not tender:
+        _tender_contexts.pop(tender_id, None)
+        return None
+    context = TenderContext(tender)
+    _tender_contexts[tender_id] = (time.monotonic(), context)
+    return context
+
+
+def agent_fingerprint(agent, context, attachments):
+    """
+    Fingerprint everything an agent's result depends on.
+
+    Covers the bid's attachment contents, the agent's slice of the tender
+    requirements (its rendered user prompt), its system prompt, the model and
+    the settings that decide what the model is shown of the bid (input mode,
+    extractor version, page retrieval), so a stored result can be recognised
+    as stale when any of them changes.
+    """
+    payload = json.dumps({
+        'attachments': sorted(attachment.sha256 for attachment in attachments),
+        'requirements': context.user_prompts[agent['name']],
+        'prompt': hashlib.sha256(agent['system_prompt'].encode()).hexdigest(),
+        'model': MODEL,
+        'inputs': INPUT_SETTINGS,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def call_agent(agent, context, inputs, feedback=''):
+    """
+    Send one agent request with the bid's inputs.
+
+    Gemini rejects a file reference it has deleted or failed to keep with a
+    400/403/404 even while our stored handle looks fresh; the bid's Files
+    API handles are then uploaded again and the request is sent once more.
+    """
+    queries = context.retrieval_queries[agent['name']]
+    parts = inputs.for_agent(queries)
+    try:
+        return send_agent_request(agent, context, parts, feedback)
+    except errors.ClientError as e:
+        if e.code not in (400, 403, 404) or not inputs.refresh_files(parts):
+            raise
+        print(f"AI EVAL : {agent['name']} request rejected ({e.code}), retrying with re-uploaded files")
+    return send_agent_request(agent, context, inputs.for_agent(queries), feedback)
+
+
+def send_agent_request(agent, context, file_attachments, feedback=''):
+    """Send one agent request, through the tender's context cache when possible"""
+    user_prompt = context.user_prompts[agent['name']]
+    response_schema = context.response_schemas[agent['name']]
+    cache_name = None
+    if prompt_cache is not None:
+        cache_name = prompt_cache.get(context.tender_id, agent['name'], agent['system_prompt'], user_prompt)
+
+    if cache_name:
         try:
-            eval_json = json.loads(resp)
-            # Use dot notation to avoid overwriting other evaluation fields
-            update_fields = {f'evaluation.{k}': v for k, v in eval_json.items()}
-            db.submissions.update_one(
-                {'bid_id': bid_id},
-                {'$set': update_fields}
-            )
+            # Requirements are already in the cache, only the bid is sent
+            return ai_chat(
+                agent['system_prompt'],
+                file_attachments=file_attachments,
+                user_prompt=CACHED_USER_PROMPT + feedback,
+                temp=0,
+                cached_content=cache_name,
+                response_schema=response_schema)
+        except errors.ClientError as e:
+            if e.code not in (400, 403, 404):
+                raise
+            print(f"AI EVAL : context cache {cache_name} unusable, sending prompt uncached: {e}")
+            prompt_cache.invalidate(cache_name)
+
+    return ai_chat(
+        agent['system_prompt'],
+        file_attachments=file_attachments,
+        user_prompt=user_prompt + feedback,
+        temp=0,
+        response_schema=response_schema)
+
+
+def run_agent(agent, bid_id, context, inputs, fingerprint=None):
+    """
+    Run a single evaluation agent and save its result on the submission.
+
+    The answer is repaired and validated against the agent's response
+    schema; an invalid answer is retried for this agent alone, telling the
+    model what was wrong, up to AGENT_ATTEMPTS times.
+
+    Args:
+        agent (dict): One of the entries in AGENTS.
+        bid_id (str): The submission being evaluated.
+        context (TenderContext): The tender the submission belongs to.
+        inputs (BidInputs): The bid's prepared attachments.
+        fingerprint (str): Input fingerprint stored alongside the result.
+    """
+    schema = context.response_schemas[agent['name']]
+    feedback = ''
+    with eval_metrics.AgentTrace(db, bid_id, context.tender_id, agent['name'], MODEL) as trace:
+        for attempt in range(1, AGENT_ATTEMPTS + 1):
+            trace.add('attempts')
+            resp = call_agent(agent, context, inputs, feedback)
+            with trace.timer('parse_seconds'):
+                eval_json, problems = parse_answer(resp, schema)
+            if not problems:
+                break
+            print(f"AI EVAL : invalid {agent['name']} answer for bid {bid_id} "
+                  f"(attempt {attempt}/{AGENT_ATTEMPTS}): {'; '.join(problems[:5])}")
+            feedback = RETRY_FEEDBACK.format(problems="\n".join(problems[:10]))
+        else:
+            raise ValueError(f"{agent['name']} answer still invalid after {AGENT_ATTEMPTS} attempts: {'; '.join(problems[:5])}")
+
+    # save evaluation back to submission
+    # Use dot notation to avoid overwriting other evaluation fields
+    update_fields = {f'evaluation.{k}': v for k, v in eval_json.items() if k in schema['properties']}
+    if fingerprint:
+        update_fields[f"evaluation_fingerprints.{agent['name']}"] = fingerprint
+    db.submissions.update_one(
+        {'bid_id': bid_id},
+        {'$set': update_fields}
+    )
+    refresh_ranking(db, bid_id)
+
+    print(f"AI EVAL : Completed {agent['name']} evaluation for bid {bid_id}")
+
+
+def prepare_part(attachment):
+    """Reference an attachment by its Files API handle, or inline it if that fails"""
+    if document_registry is not None:
+        try:
+            return document_registry.part_for(attachment)
         except Exception as e:
-            print(f"Error parsing legal evaluation JSON for bid {bid_id}: {e}")
+            print(f"AI EVAL : Files API upload failed for {attachment.source}, sending inline: {e}")
+    return attachment.to_part()
+
+
+class BidInputs:
+    """
+    A bid's attachments prepared once for all of its agents.
+
+    PDFs whose extracted text captures the document (see EVAL_INPUT_MODE)
+    are sent as text, trimmed per agent to the pages its requirements point
+    at; everything else is sent as the file itself to every agent.
+    """
+
+    def __init__(self, attachments):
+        self.parts = []
+        self.documents = []  # (name, extract)
+        self.sent_as_file = []  # (index in parts, attachment)
+        for attachment in attachments:
+            extract = document_extractor.get(attachment) if document_extractor is not None else None
+            if extract and (EVAL_INPUT_MODE == 'text' or is_complete(extract)):
+                self.documents.append((attachment.name, extract))
+            else:
+                self.sent_as_file.append((len(self.parts), attachment))
+                self.parts.append(prepare_part(attachment))
+        self.index = PageIndex(self.documents) if self.documents and EVAL_RETRIEVAL else None
+        self._refresh_lock = threading.Lock()
+        self._refreshed = False
+
+    def refresh_files(self, sent_parts):
+        """
+        Upload the Files API attachments again, at most once per bid.
+
+        Returns whether retrying with for_agent() would send different
+        handles than `sent_parts`: True after this call (or a concurrent
+        agent) re-uploaded them, False when there is nothing left to refresh.
+        """
+        with self._refresh_lock:
+            if any(self.parts[i] not in sent_parts for i, _ in self.sent_as_file):
+                return True
+            referenced = [(i, attachment) for i, attachment in self.sent_as_file
+                          if self.parts[i].file_data is not None]
+            if self._refreshed or not referenced:
+                return False
+            for i, attachment in referenced:
+                document_registry.invalidate(attachment.sha256)
+                self.parts[i] = prepare_part(attachment)
+            self._refreshed = True
+            return True
+
+    def for_agent(self, queries):
+        """The parts to send an agent with the given requirement queries"""
+        selection = self.index.select(queries) if self.index is not None and queries else None
+        parts = list(self.parts)
+        for i, (name, extract) in enumerate(self.documents):
+            if selection is None:
+                parts.append(types.Part.from_text(text=render_pages(extract, name)))
+            elif i in selection:
+                parts.append(types.Part.from_text(text=render_pages(extract, name, selection[i])))
+        return parts
+
+
+def evaluate_submission_async(bid_id, context=None, mode='missing'):
+    """
+    Run the AI evaluation agents for a submission and update its total score.
+
+    Args:
+        bid_id (str): The submission to evaluate.
+        context (TenderContext): Prepared tender context; looked up if not given.
+        mode (str): 'missing' runs only agents without a saved result;
+            'stale' also reruns agents whose input fingerprint changed (new
+            attachments, edited requirements, new prompt or model).
+    """
+    submission = db.submissions.find_one({'bid_id': bid_id})
+    if not submission:
+        return
+
+    if context is None or context.tender_id != submission['tender_id']:
+        # Re-evaluations must see freshly edited requirements, not a cached context
+        if mode != 'stale':
+            context = get_tender_context(submission['tender_id'])
+        else:
+            tender = db.tenders.find_one({'tender_id': submission['tender_id']})
+            context = TenderContext(tender) if tender else None
+
+    if not context:
+        print(f"AI EVAL : Tender {submission['tender_id']} not found for bid {bid_id}")
+        return
+
+    evaluation = submission.get('evaluation', {})
+    stored_fingerprints = submission.get('evaluation_fingerprints', {})
+    pending = [agent for agent in AGENTS if mode == 'stale' or agent['done_key'] not in evaluation]
+
+    attachments, inputs, fingerprints = [], None, {}
+    if pending:
+        server_url = os.getenv("SERVER_URL", "")
+        with eval_metrics.AgentTrace(db, bid_id, context.tender_id, 'inputs') as trace:
+            # Download, extract and encode every attachment once; all agents share the parts
+            with trace.timer('download_seconds'):
+                attachments = load_attachments([attachment_source(att, server_url) for att in submission.get('attachments', [])])
+            trace.add('attachments', len(attachments))
+            trace.add('attachment_bytes', sum(attachment.size for attachment in attachments))
+            fingerprints = {agent['name']: agent_fingerprint(agent, context, attachments) for agent in pending}
+            if mode == 'stale':
+                pending = [
+                    agent for agent in pending
+                    if agent['done_key'] not in evaluation
+                    or stored_fingerprints.get(agent['name']) != fingerprints[agent['name']]
+                ]
+            if pending:
+                with trace.timer('prepare_seconds'):
+                    inputs = BidInputs(attachments)
+                print(f"AI EVAL : running {', '.join(agent['name'] for agent in pending)} for bid {bid_id} ({mode})")
+
+    # Fan the pending agents out together; each one saves its result as soon
+    # as it lands and the shared rate limiter in ai_chat paces the API calls.
+    failed = []
+    if pending:
+        with ThreadPoolExecutor(max_workers=len(pending)) as pool:
+            futures = {
+                pool.submit(run_agent, agent, bid_id, context, inputs, fingerprints[agent['name']]): agent
+                for agent in pending
+            }
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    failed.append(futures[future]['name'])
+                    print(f"AI EVAL : {futures[future]['name']} agent failed for bid {bid_id}: {e}")
 
-        print(f"AI EVAL : Completed legal evaluation for bid {bid_id}")
-    
     # add verification in evaluation
-    if 'verification' not in submission.get('evaluation', {}):
+    if 'verification' not in evaluation:
         ver = {"verification": {
         "Company Registration": True,
         "Tax Compliance": True,
@@ -439,7 +694,7 @@ json output format (strictly follow this) -
         )
 
         print(f"AI EVAL : Completed verification for bid {bid_id}")
-    
+
     #calc total score
     evaluation = db.submissions.find_one({'bid_id': bid_id}).get('evaluation', {})
     total_score = 0
@@ -451,6 +706,11 @@ json output format (strictly follow this) -
         {'bid_id': bid_id},
         {'$set': {'evaluation_score': total_score}}
     )
+    refresh_ranking(db, bid_id)
+
+    # Let the job queue retry; agents that already saved a result are skipped
+    if failed:
+        raise RuntimeError(f"Agents {', '.join(failed)} failed for bid {bid_id}")
 
 if __name__ == "__main__":
     system_prompt = "You are an AI assistant that processes file attachments and answers questions based on their content."
@@ -0,0 +1,65 @@
+"""
+ASGI entry point: the async routes on the event loop, everything else on Flask.
+
+    WEB_CONCURRENCY=4 uvicorn --factory asgi:create_asgi_app --host 0.0.0.0 --port 8080
+
+Requests whose path and method match a route of the async app
+(async_app.py) are served by it; all others, and any URL it does not know,
+go to the unchanged Flask app (server.create_app) through a2wsgi, which
+runs them on a pool of ASGI_WSGI_THREADS (8) threads per process. Each
+process thus holds any number of waiting reads and VAPI calls while
+uploads and the other sync routes behave as they do under gunicorn.
+
+Give the process count as WEB_CONCURRENCY rather than --workers: with more
+than one the response cache then defaults to the shared Mongo backend, so
+invalidations reach every process (see response_cache.py).
+
+Evaluations run in `python worker.py`; the Flask app starts no evaluation
+worker unless EVAL_INPROCESS_WORKERS > 0. In that case also set
+GEMINI_PROCESSES to the process count so they split the Gemini rate budget
+(see llm_client.py); the worker is drained on shutdown for up to
+EVAL_DRAIN_SECONDS (80).
+"""
+import asyncio
+import os
+
+from a2wsgi import WSGIMiddleware
+from werkzeug.exceptions import HTTPException
+
+from async_app import create_async_app
+from server import create_app, stop_eval_worker
+
+
+class Dispatcher:
+    """Routes each ASGI connection to the async app or the WSGI fallback."""
+
+    def __init__(self, async_app, wsgi_app, wsgi_threads):
+        self.async_app = async_app
+        self.wsgi = WSGIMiddleware(wsgi_app, workers=wsgi_threads)
+        self._urls = async_app.url_map.bind('')
+
+    def handled_async(self, scope):
+        try:
+            self._urls.match(scope['path'], method=scope['method'])
+        except HTTPException:
+            # NotFound, MethodNotAllowed, or a redirect to the slash form
+            return False
+        return True
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan' or (scope['type'] == 'http' and self.handled_async(scope)):
+            return await self.async_app(scope, receive, send)
+        return await self.wsgi(scope, receive, send)
+
+
+def create_asgi_app(config=None):
+    """Build both apps for this process and return the dispatching ASGI app."""
+    flask_app = create_app(config)
+    async_app = create_async_app(config)
+
+    @async_app.after_serving
+    async def drain_eval_worker():
+        timeout = float(os.environ.get('EVAL_DRAIN_SECONDS', 80))
+        await asyncio.to_thread(stop_eval_worker, flask_app, timeout)
+
+    return Dispatcher(async_app, flask_app, int(os.environ.get('ASGI_WSGI_THREADS', 8)))
@@ -0,0 +1,236 @@
+"""
+Async variant of the I/O-bound API routes.
+
+`create_async_app()` builds a Quart app that serves the read routes hit
+hardest around bid deadlines, plus the outbound VAPI call, on the event
+loop with PyMongo's AsyncMongoClient and an httpx.AsyncClient, so a
+waiting request holds a coroutine rather than a worker thread:
+
+    GET  /tenders                          (same params and headers as the Flask route)
+    GET  /tenders/<id>
+    GET  /tenders/<tender_id>/submissions  (streamed, X-Total-Count)
+    GET  /submissions/<bid_id>
+    GET  /vendors/<vendor_id>
+    POST /api/calls/make-call
+
+URLs, query params and response bodies match the Flask blueprints, which
+keep the request parsing and shaping helpers both apps use. Everything
+else (uploads, the cached portal listing, rankings, files, metrics) stays
+on the Flask app; asgi.py serves the two side by side.
+"""
+import os
+import time
+import uuid
+
+import httpx
+from quart import Quart, Response, current_app, g, jsonify, request
+from quart_cors import cors
+
+from database import create_async_client
+from profiling import request_seconds
+from routes.calls import VAPI_API_URL, VAPI_TIMEOUT_SECONDS, build_call_payload, vapi_headers
+from routes.submissions import listing_page, shows_vendor_details, structured_evaluation, \
+    submission_listing_row, submissions_listing_pipeline
+from routes.tenders import COUNT_ESTIMATE_CAP, tender_listing_projection, tender_listing_query
+
+
+def get_async_db():
+    name = current_app.config.get('MONGO_DBNAME') or os.environ.get('MONGO_DBNAME', 'db')
+    return current_app.extensions['mongo'][name]
+
+
+def get_http_client():
+    return current_app.extensions['http']
+
+
+async def get_tenders():
+    """Get tenders (see routes.tenders.get_tenders for the query params)"""
+    db = get_async_db()
+    try:
+        query = tender_listing_query(request.args)
+        projection = tender_listing_projection(request.args.get('fields'))
+        limit = int(request.args['limit']) if 'limit' in request.args else None
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query parameter: {e}'}), 400
+    if limit is not None and limit < 1:
+        return jsonify({'error': 'limit must be positive'}), 400
+
+    descending = request.args.get('order') == 'desc'
+    page_query = dict(query)
+    if request.args.get('after'):
+        page_query['tender_id'] = {'$lt' if descending else '$gt': request.args['after']}
+
+    cursor = db.tenders.find(page_query, projection).sort('tender_id', -1 if descending else 1)
+    if limit:
+        cursor = cursor.limit(limit)
+    tenders = await cursor.to_list(None)
+
+    response = jsonify(tenders)
+    if limit and len(tenders) == limit:
+        response.headers['X-Next-Cursor'] = tenders[-1]['tender_id']
+
+    count_mode = request.args.get('count')
+    if count_mode == 'exact':
+        response.headers['X-Total-Count'] = str(await db.tenders.count_documents(query))
+    elif count_mode == 'estimate':
+        if query:
+            total = await db.tenders.count_documents(query, limit=COUNT_ESTIMATE_CAP)
+        else:
+            total = await db.tenders.estimated_document_count()
+        response.headers['X-Total-Count'] = str(total)
+        response.headers['X-Total-Count-Estimated'] = 'true'
+    return response, 200
+
+
+async def get_tender(id):
+    """Get a tender details by id"""
+    tender = await get_async_db().tenders.find_one({'tender_id': id}, {'_id': 0})
+    if tender:
+        return jsonify(tender), 200
+    return jsonify({'error': 'Tender not found'}), 404
+
+
+async def get_submissions(tender_id):
+    """Get submissions for a tender, best total score first (see routes.submissions.get_submissions)"""
+    db = get_async_db()
+    try:
+        limit, offset = listing_page(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    pipeline = submissions_listing_pipeline(tender_id, request.args.get('sort', 'score'), offset, limit)
+    total = await db.submissions.count_documents({'tender_id': tender_id})
+    cursor = await db.submissions.aggregate(pipeline, batchSize=200)
+    dumps = current_app.json.dumps
+
+    async def generate():
+        # Stream rows as the cursor yields them instead of building the whole list
+        try:
+            yield '['
+            i = 0
+            async for sub in cursor:
+                yield (',' if i else '') + dumps(submission_listing_row(sub))
+                i += 1
+            yield ']'
+        finally:
+            await cursor.close()
+
+    response = Response(generate(), mimetype='application/json')
+    response.headers['X-Total-Count'] = str(total)
+    return response, 200
+
+
+async def get_submission(bid_id):
+    """Get a specific submission details with combined evaluation logic"""
+    db = get_async_db()
+    submission = await db.submissions.find_one({'bid_id': bid_id}, {'_id': 0})
+    if not submission:
+        return jsonify({'error': 'Submission not found'}), 404
+
+    tender_id = submission.get('tender_id')
+    tender_reqs = {}
+    if tender_id:
+        tender = await db.tenders.find_one({'tender_id': tender_id}, {'_id': 0, 'requirements': 1})
+        # The tender may have been deleted since the bid was submitted
+        tender_reqs = (tender or {}).get('requirements') or {}
+
+    if 'evaluation' in submission:
+        submission['evaluation'] = structured_evaluation(submission['evaluation'], tender_reqs)
+
+    if shows_vendor_details(submission):
+        vendor = await db.vendors.find_one({'vendor_id': submission['vendor_id']}, {'_id': 0})
+        if vendor:
+            submission['vendor_details'] = vendor
+
+    return jsonify(submission), 200
+
+
+async def get_vendor(vendor_id):
+    vendor = await get_async_db().vendors.find_one({'vendor_id': vendor_id}, {'_id': 0})
+    if vendor:
+        return jsonify(vendor), 200
+    return jsonify({"error": "Vendor not found"}), 404
+
+
+async def make_call():
+    try:
+        data = await request.get_json()
+        mobile_number = data.get('mobile')
+        items = data.get('items', [])
+
+        if not mobile_number:
+            return jsonify({"error": "Mobile number is required"}), 400
+
+        payload = build_call_payload(mobile_number, items)
+        response = await get_http_client().post(VAPI_API_URL, json=payload, headers=vapi_headers())
+
+        if response.status_code == 201 or response.status_code == 200:
+            return jsonify({
+                "message": "Call initiated successfully",
+                "vapi_response": response.json()
+            }), 200
+        else:
+            return jsonify({
+                "error": "Failed to initiate call",
+                "details": response.text
+            }), response.status_code
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+ROUTES = [
+    ('/tenders', get_tenders, ['GET']),
+    ('/tenders/<id>', get_tender, ['GET']),
+    ('/tenders/<tender_id>/submissions', get_submissions, ['GET']),
+    ('/submissions/<bid_id>', get_submission, ['GET']),
+    ('/vendors/<vendor_id>', get_vendor, ['GET']),
+    ('/api/calls/make-call', make_call, ['POST']),
+]
+
+
+async def _begin_request():
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+    g.started = time.perf_counter()
+
+
+async def _finish_request(response):
+    # Same request id header and latency histogram as profiling.ProfilingMiddleware;
+    # a streamed listing is timed up to its first byte
+    response.headers['X-Request-ID'] = g.request_id
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    request_seconds.observe((request.method, route, str(response.status_code)), time.perf_counter() - g.started)
+    return response
+
+
+def create_async_app(config=None):
+    """
+    Build the Quart application.
+
+    The Mongo and HTTP clients are opened when the app starts serving, on
+    the loop that will use them, and closed when it stops.
+    """
+    app = Quart(__name__, static_folder=None)
+    if config:
+        app.config.update(config)
+    # Same policy as flask_cors in server.create_app, which reflects any requested header
+    app = cors(app, allow_headers='*',
+               expose_headers=['X-Total-Count', 'X-Total-Count-Estimated', 'X-Next-Cursor', 'X-Request-ID'])
+
+    for rule, view_func, methods in ROUTES:
+        app.add_url_rule(rule, view_func=view_func, methods=methods)
+    app.before_request(_begin_request)
+    app.after_request(_finish_request)
+
+    @app.before_serving
+    async def open_clients():
+        app.extensions['mongo'] = create_async_client(app.config.get('MONGO_URI'))
+        connect_seconds, read_seconds = VAPI_TIMEOUT_SECONDS
+        app.extensions['http'] = httpx.AsyncClient(timeout=httpx.Timeout(read_seconds, connect=connect_seconds))
+
+    @app.after_serving
+    async def close_clients():
+        await app.extensions.pop('http').aclose()
+        await app.extensions.pop('mongo').close()
+
+    return app
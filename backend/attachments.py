@@ -0,0 +1,233 @@
+import hashlib
+import mimetypes
+import os
+import threading
+from collections import OrderedDict
+
+import requests
+from google.genai import types
+
+from blobstore import blob_path
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def guess_mime_type(name, default="application/octet-stream"):
+    """Guess a mime type from a file name or URL path."""
+    mime_type, _ = mimetypes.guess_type(name.split('?')[0])
+    return mime_type or default
+
+
+class Attachment:
+    """The bytes of one bid attachment plus what is needed to send it to Gemini."""
+
+    def __init__(self, source, data, mime_type):
+        self.source = source
+        self.data = data
+        self.mime_type = mime_type
+        self.sha256 = hashlib.sha256(data).hexdigest()
+        self._part = None
+
+    @property
+    def size(self):
+        return len(self.data)
+
+    @property
+    def name(self):
+        """File name for prompts and logs."""
+        if isinstance(self.source, dict):
+            return self.source.get('file_name') or self.source.get('sha256', 'attachment')
+        return os.path.basename(str(self.source).split('?')[0])
+
+    def to_part(self):
+        """Build (once) the inline types.Part for this attachment."""
+        if self._part is None:
+            self._part = types.Part.from_bytes(data=self.data, mime_type=self.mime_type)
+        return self._part
+
+
+class AttachmentCache:
+    """
+    Size-bounded LRU of attachment bytes keyed by content hash.
+
+    Sources (URLs or local paths) are mapped to a content hash together with
+    a validator (ETag / Last-Modified for URLs, mtime and size for local
+    files) so a later evaluation can revalidate instead of downloading again.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._blobs = OrderedDict()  # sha256 -> (data, mime_type)
+        self._sources = {}  # source -> (validator, sha256)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, source):
+        """Return (validator, sha256) last seen for a source, or None."""
+        with self._lock:
+            return self._sources.get(source)
+
+    def get(self, sha256):
+        with self._lock:
+            entry = self._blobs.get(sha256)
+            if entry is not None:
+                self._blobs.move_to_end(sha256)
+            return entry
+
+    def put(self, source, validator, attachment):
+        if attachment.size > self.max_bytes:
+            return
+        with self._lock:
+            if attachment.sha256 not in self._blobs:
+                self._blobs[attachment.sha256] = (attachment.data, attachment.mime_type)
+                self._size += attachment.size
+            self._blobs.move_to_end(attachment.sha256)
+            if validator is not None:
+                self._sources[source] = (validator, attachment.sha256)
+            while self._size > self.max_bytes:
+                sha256, (data, _) = self._blobs.popitem(last=False)
+                self._size -= len(data)
+                self._sources = {s: v for s, v in self._sources.items() if v[1] != sha256}
+
+
+# Shared across evaluations in this process; ATTACHMENT_CACHE_MB=0 disables it.
+attachment_cache = AttachmentCache(int(os.environ.get("ATTACHMENT_CACHE_MB", 256)) * 1024 * 1024)
+# (connect, read) timeout for attachment downloads, so a stalled server can't hang an evaluation
+FETCH_TIMEOUT_SECONDS = (10, float(os.environ.get("ATTACHMENT_TIMEOUT_SECONDS", 30)))
+
+
+def _from_cache(source, cache, validator):
+    known = cache.lookup(source)
+    if known and known[0] == validator:
+        entry = cache.get(known[1])
+        if entry:
+            return Attachment(source, entry[0], entry[1])
+    return None
+
+
+def _fetch_url(url, cache):
+    headers = {}
+    known = cache.lookup(url)
+    entry = cache.get(known[1]) if known else None
+    if entry:
+        # Revalidate what we already hold instead of downloading it again
+        etag, last_modified = known[0]
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+    response = requests.get(url, headers=headers, timeout=FETCH_TIMEOUT_SECONDS)
+    if response.status_code == 304 and entry:
+        return Attachment(url, entry[0], entry[1])
+    response.raise_for_status()
+
+    # Attempt to get mime type from headers, fall back to the URL path if generic
+    mime_type = (response.headers.get('Content-Type') or '').split(';')[0].strip()
+    if not mime_type or mime_type == "application/octet-stream":
+        mime_type = guess_mime_type(url)
+
+    attachment = Attachment(url, response.content, mime_type)
+    validator = (response.headers.get('ETag'), response.headers.get('Last-Modified'))
+    cache.put(url, validator if any(validator) else None, attachment)
+    return attachment
+
+
+def _read_file(file_path, cache):
+    stat = os.stat(file_path)
+    validator = (stat.st_mtime_ns, stat.st_size)
+    attachment = _from_cache(file_path, cache, validator)
+    if attachment:
+        return attachment
+
+    with open(file_path, "rb") as f:
+        attachment = Attachment(file_path, f.read(), guess_mime_type(file_path))
+    cache.put(file_path, validator, attachment)
+    return attachment
+
+
+def _read_blob(blob, cache):
+    # Content-addressed: a cached copy is valid without revalidation
+    entry = cache.get(blob['sha256'])
+    if entry:
+        return Attachment(blob, entry[0], entry[1])
+    with open(blob_path(blob['sha256']), "rb") as f:
+        attachment = Attachment(blob, f.read(), blob.get('mime_type') or 'application/octet-stream')
+    cache.put(blob['sha256'], None, attachment)
+    return attachment
+
+
+def attachment_source(attachment, server_url=""):
+    """
+    Where the evaluator reads an attachment record from: the local blob
+    store when the file is in it, otherwise its URL on the API server.
+    """
+    if attachment.get('stored') == 'blob' and os.path.exists(blob_path(attachment['sha256'])):
+        return {'sha256': attachment['sha256'], 'mime_type': attachment.get('mime_type'),
+                'file_name': attachment.get('file_name')}
+    return f"{server_url}{attachment['url']}"
+
+
+def load_attachment(source, cache=None):
+    """
+    Load a single attachment.
+
+    Args:
+        source (str | dict): URL, local file path, dict with sha256 (and mime_type)
+            of a local blob, or dict with data and mime_type.
+        cache (AttachmentCache): Cross-evaluation cache, defaults to the shared one.
+
+    Returns:
+        Attachment | None: The loaded attachment, or None if it could not be read.
+    """
+    cache = cache or attachment_cache
+
+    if isinstance(source, dict) and source.get('sha256'):
+        try:
+            return _read_blob(source, cache)
+        except FileNotFoundError:
+            print(f"Blob not found: {source['sha256']}")
+            return None
+
+    if isinstance(source, dict):
+        if not source.get('data'):
+            return None
+        return Attachment(source, source['data'], source.get('mime_type', 'application/octet-stream'))
+
+    if not isinstance(source, str):
+        return None
+
+    if source.startswith(('http://', 'https://')):
+        try:
+            return _fetch_url(source, cache)
+        except requests.RequestException as e:
+            print(f"Error downloading URL {source}: {e}")
+            return None
+
+    try:
+        return _read_file(source, cache)
+    except FileNotFoundError:
+        print(f"File not found: {source}")
+        return None
+
+
+def load_attachments(sources, cache=None):
+    """
+    Load every attachment of an evaluation exactly once.
+
+    Duplicate sources are fetched a single time and empty or unreadable
+    files are skipped, so the result can be handed to every agent.
+    """
+    loaded = {}
+    for source in sources:
+        if isinstance(source, str):
+            key = source
+        elif isinstance(source, dict) and source.get('sha256'):
+            key = source['sha256']
+        else:
+            key = id(source)
+        if key not in loaded:
+            loaded[key] = load_attachment(source, cache)
+    return [attachment for attachment in loaded.values() if attachment and attachment.data]
@@ -0,0 +1,121 @@
+"""
+Evaluate every pending submission of a tender.
+
+    python batch_eval.py TND-2025-0122 --concurrency 8
+    python batch_eval.py TND-2025-0122 --queue
+    python batch_eval.py TND-2025-0122 --stale
+
+The tender is loaded and its agent prompts are prepared once, then the
+pending bids are either evaluated directly through a bounded thread pool or
+handed to the evaluation queue (the same path POST /tenders/<id>/evaluate uses).
+"""
+import argparse
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from eval_queue import enqueue_evaluation
+
+PENDING_QUERY = {'evaluation_score': {'$exists': False}}
+
+
+def pending_bid_ids(db, tender_id):
+    """Bids on the tender that have not been fully scored yet."""
+    cursor = db.submissions.find({'tender_id': tender_id, **PENDING_QUERY}, {'_id': 0, 'bid_id': 1})
+    return [sub['bid_id'] for sub in cursor]
+
+
+def all_bid_ids(db, tender_id):
+    cursor = db.submissions.find({'tender_id': tender_id}, {'_id': 0, 'bid_id': 1})
+    return [sub['bid_id'] for sub in cursor]
+
+
+def enqueue_tender(db, tender_id, mode='missing'):
+    """
+    Queue an evaluation job for the bids on a tender.
+
+    With mode 'missing' only unscored bids are queued; with 'stale' every bid
+    is queued and each one reruns just the agents whose inputs changed.
+
+    Returns:
+        dict: The batch_id and the number of bids queued.
+    """
+    batch_id = f"batch-{uuid.uuid4().hex}"
+    bid_ids = pending_bid_ids(db, tender_id) if mode == 'missing' else all_bid_ids(db, tender_id)
+    options = {'mode': mode} if mode != 'missing' else None
+    for bid_id in bid_ids:
+        enqueue_evaluation(db, bid_id, tender_id, options=options, batch_id=batch_id)
+    return {'batch_id': batch_id, 'queued': len(bid_ids)}
+
+
+def batch_progress(db, tender_id, batch_id=None):
+    """Count the tender's evaluation jobs (optionally one batch) by status."""
+    match = {'tender_id': tender_id}
+    if batch_id:
+        match['batch_id'] = batch_id
+    counts = {'queued': 0, 'running': 0, 'done': 0, 'failed': 0}
+    for row in db.eval_jobs.aggregate([
+        {'$match': match},
+        {'$group': {'_id': '$status', 'count': {'$sum': 1}}},
+    ]):
+        counts[row['_id']] = row['count']
+    counts['total'] = sum(counts.values())
+    return counts
+
+
+def evaluate_tender(tender_id, concurrency=4, progress=print, mode='missing'):
+    """
+    Evaluate all pending bids of a tender in this process.
+
+    Args:
+        tender_id (str): The tender to evaluate.
+        concurrency (int): Maximum number of bids evaluated at once.
+        progress (callable): Called with a status line after every bid.
+        mode (str): 'missing' or 'stale', see evaluate_submission_async.
+
+    Returns:
+        dict: Counts of evaluated and failed bids.
+    """
+    # Imported here so enqueue_tender can be used without a Gemini client
+    from ai_eval import db, evaluate_submission_async, TenderContext
+
+    tender = db.tenders.find_one({'tender_id': tender_id})
+    if not tender:
+        raise ValueError(f"Tender {tender_id} not found")
+    context = TenderContext(tender)
+
+    bid_ids = pending_bid_ids(db, tender_id) if mode == 'missing' else all_bid_ids(db, tender_id)
+    done, failed = 0, []
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {pool.submit(evaluate_submission_async, bid_id, context, mode): bid_id for bid_id in bid_ids}
+        for future in as_completed(futures):
+            try:
+                future.result()
+                done += 1
+            except Exception as e:
+                failed.append(futures[future])
+                progress(f"BATCH EVAL : {futures[future]} failed: {e}")
+            progress(f"BATCH EVAL : {tender_id} {done + len(failed)}/{len(bid_ids)} finished, "
+                     f"{len(failed)} failed, {time.monotonic() - started:.1f}s elapsed")
+    return {'evaluated': done, 'failed': failed, 'total': len(bid_ids)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate all pending bids of a tender")
+    parser.add_argument('tender_id')
+    parser.add_argument('--concurrency', type=int, default=4, help="Bids evaluated at once")
+    parser.add_argument('--queue', action='store_true', help="Queue the bids for the workers instead")
+    parser.add_argument('--stale', action='store_true', help="Also rerun agents whose inputs changed")
+    args = parser.parse_args()
+    mode = 'stale' if args.stale else 'missing'
+
+    if args.queue:
+        from ai_eval import db
+        print(enqueue_tender(db, args.tender_id, mode=mode))
+    else:
+        print(evaluate_tender(args.tender_id, concurrency=args.concurrency, mode=mode))
+
+
+if __name__ == '__main__':
+    main()
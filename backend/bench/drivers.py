@@ -0,0 +1,120 @@
+"""
+Concurrent load drivers and latency statistics for the benchmarks.
+"""
+import random
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from eval_metrics import percentile
+
+
+def summarize(name, latencies, errors, elapsed):
+    """Throughput and latency percentiles (milliseconds) of one scenario."""
+    latencies = sorted(latencies)
+    result = {
+        'scenario': name,
+        'requests': len(latencies) + errors,
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'throughput': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+    }
+    for label, fraction in (('p50', 0.5), ('p90', 0.9), ('p95', 0.95), ('p99', 0.99)):
+        value = percentile(latencies, fraction)
+        result[f'{label}_ms'] = round(value * 1000, 2) if value is not None else None
+    result['max_ms'] = round(latencies[-1] * 1000, 2) if latencies else None
+    return result
+
+
+def run_concurrently(name, operation, count, concurrency):
+    """
+    Call operation(i) `count` times from `concurrency` threads.
+
+    An operation that raises (or returns False) counts as an error and is
+    left out of the latencies.
+    """
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def one(i):
+        started = time.perf_counter()
+        try:
+            ok = operation(i) is not False
+        except Exception:
+            if not errors:
+                traceback.print_exc()
+            ok = False
+        seconds = time.perf_counter() - started
+        with lock:
+            if ok:
+                latencies.append(seconds)
+            else:
+                errors.append(i)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(count)))
+    return summarize(name, latencies, len(errors), time.perf_counter() - started)
+
+
+class HttpScenario:
+    """
+    A GET route exercised with paths drawn from the seeded ids.
+
+    Args:
+        name (str): Scenario name in reports and baselines.
+        path (callable): (random.Random, ids dict) -> request path.
+    """
+
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+
+    def run(self, base_url, ids, count, concurrency, seed=0):
+        local = threading.local()
+        rng = random.Random(seed)
+        # Draw every path up front so runs are repeatable whatever the thread timing
+        paths = [self.path(rng, ids) for _ in range(count)]
+
+        def request(i):
+            session = getattr(local, 'session', None)
+            if session is None:
+                session = local.session = requests.Session()
+            response = session.get(base_url + paths[i], timeout=60)
+            # Read the whole body; streamed listings are only done when it ends
+            response.content
+            return response.status_code < 400
+
+        return run_concurrently(self.name, request, count, concurrency)
+
+
+HTTP_SCENARIOS = [
+    HttpScenario('list_tenders', lambda rng, ids: '/tenders'),
+    HttpScenario('portal_tenders', lambda rng, ids: '/portal/tenders'),
+    HttpScenario('get_tender', lambda rng, ids: f"/tenders/{rng.choice(ids['tender_ids'])}"),
+    HttpScenario('get_submissions', lambda rng, ids: f"/tenders/{rng.choice(ids['tender_ids'])}/submissions?limit=50"),
+    HttpScenario('get_submission', lambda rng, ids: f"/submissions/{rng.choice(ids['bid_ids'])}"),
+    HttpScenario('rankings', lambda rng, ids: f"/tenders/{rng.choice(ids['tender_ids'])}/rankings?top=10"),
+]
+
+
+def run_evaluations(db, evaluate, bid_ids, concurrency):
+    """
+    Evaluate the given (unevaluated) bids through the full pipeline.
+
+    Previous results are cleared first so every run does the same work.
+    """
+    db.submissions.update_many(
+        {'bid_id': {'$in': bid_ids}},
+        {'$unset': {'evaluation': '', 'evaluation_score': '', 'evaluation_fingerprints': '', 'evaluation_metrics': ''}}
+    )
+
+    def evaluate_one(i):
+        evaluate(bid_ids[i])
+        submission = db.submissions.find_one({'bid_id': bid_ids[i]}, {'evaluation_score': 1})
+        return submission is not None and submission.get('evaluation_score') is not None
+
+    return run_concurrently('evaluate_submission', evaluate_one, len(bid_ids), concurrency)
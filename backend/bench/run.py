@@ -0,0 +1,222 @@
+"""
+API and evaluation pipeline benchmark.
+
+    python -m bench.run --mongo-uri mongodb://localhost:27017 --tenders 20 --bids 200
+    python -m bench.run --mongo-uri mongomock --gemini-latency 0.5 --save-baseline
+    python -m bench.run --mongo-uri mongodb://localhost:27017 --compare
+
+Run from backend/ (mongomock mode needs `pip install mongomock`). Seeds
+synthetic data into the --mongo-db database (bench/seed.py), starts a local
+fake Gemini + attachment server (fakes.FakeGeminiServer) and the API on a
+threaded local server, then drives each GET scenario and the evaluator
+concurrently and reports throughput and latency percentiles.
+
+--save-baseline writes the results to bench/baseline.json (or the given
+path); --compare checks a run against it and exits non-zero when a
+scenario's p95 latency or throughput is worse by more than --tolerance.
+Only compare runs made with the same scale, fakes and machine.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import threading
+import time
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the API routes and the evaluation pipeline")
+    parser.add_argument('--mongo-uri', default=os.environ.get('BENCH_MONGODB_URI', 'mongomock'),
+                        help="MongoDB URI of a scratch database, or 'mongomock' (default)")
+    parser.add_argument('--mongo-db', default=os.environ.get('BENCH_MONGO_DBNAME', 'texora_bench'),
+                        help="Database to seed and benchmark (never point this at real data)")
+    parser.add_argument('--target', help="Benchmark an already running API at this URL instead of starting one "
+                                         "(it must use the same database)")
+    parser.add_argument('--tenders', type=int, default=10, help="Tenders to seed")
+    parser.add_argument('--bids', type=int, default=100, help="Bids per tender to seed")
+    parser.add_argument('--no-seed', action='store_true', help="Reuse the data of a previous run")
+    parser.add_argument('--seed', type=int, default=42, help="Random seed for data and request paths")
+    parser.add_argument('--scenarios', help="Comma separated HTTP scenarios to run (default all)")
+    parser.add_argument('--requests', type=int, default=500, help="Requests per HTTP scenario")
+    parser.add_argument('--concurrency', type=int, default=16, help="Concurrent HTTP clients")
+    parser.add_argument('--warmup', type=int, default=20, help="Unmeasured requests per scenario first")
+    parser.add_argument('--evaluations', type=int, default=20, help="Bids to evaluate (0 skips the evaluator)")
+    parser.add_argument('--eval-concurrency', type=int, default=4, help="Bids evaluated at once")
+    parser.add_argument('--gemini', choices=['server', 'client'], default='server',
+                        help="Fake Gemini over HTTP through the real client (server) or in-process (client)")
+    parser.add_argument('--gemini-latency', type=float, default=0.2, help="Seconds per fake Gemini call")
+    parser.add_argument('--output', help="Write the results JSON here")
+    parser.add_argument('--save-baseline', nargs='?', const=DEFAULT_BASELINE, help="Store the results as baseline")
+    parser.add_argument('--compare', nargs='?', const=DEFAULT_BASELINE, help="Compare against a stored baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed regression (0.2 = 20%%)")
+    return parser.parse_args()
+
+
+def configure_fakes(args):
+    """Start the fake upstreams and point the app's environment at them (before it is imported)."""
+    from fakes import FakeGeminiServer
+
+    fake = FakeGeminiServer(latency=args.gemini_latency).start()
+    os.environ['EVAL_INPROCESS_WORKERS'] = '0'
+    os.environ['SERVER_URL'] = fake.url
+    os.environ.setdefault('GEMINI_RPM', '1000000')
+    os.environ.setdefault('GEMINI_BURST', '1000')
+    if args.gemini == 'server':
+        os.environ.update({
+            'GEMINI_BASE_URL': fake.url,
+            'GEMINI_API_KEY': os.environ.get('GEMINI_API_KEY') or 'bench',
+            'GEMINI_FILES_API': '0',
+            'GEMINI_CONTEXT_CACHE': '0',
+        })
+    else:
+        os.environ['GEMINI_FAKE'] = '1'
+        os.environ['GEMINI_FAKE_LATENCY'] = str(args.gemini_latency)
+    return fake
+
+
+def start_api():
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    from server import create_app
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args):
+            pass
+
+    server = make_server('127.0.0.1', 0, create_app(), threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def print_table(results):
+    columns = ['scenario', 'requests', 'errors', 'throughput', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms']
+    print(' '.join(f"{column:>20}" if i == 0 else f"{column:>11}" for i, column in enumerate(columns)))
+    for result in results:
+        print(' '.join(f"{str(result.get(column)):>20}" if i == 0 else f"{str(result.get(column)):>11}"
+                       for i, column in enumerate(columns)))
+
+
+def compare(results, baseline, tolerance):
+    """Print the change against the baseline; returns the scenarios that regressed."""
+    previous = {result['scenario']: result for result in baseline['results']}
+    regressions = []
+    print(f"\nAgainst baseline from {baseline['meta'].get('created_at')} (tolerance {tolerance:.0%}):")
+    for result in results:
+        before = previous.get(result['scenario'])
+        if not before:
+            print(f"  {result['scenario']}: not in baseline")
+            continue
+        notes = []
+        if before.get('p95_ms') and result.get('p95_ms') is not None:
+            change = result['p95_ms'] / before['p95_ms'] - 1
+            notes.append(f"p95 {before['p95_ms']} -> {result['p95_ms']} ms ({change:+.0%})")
+            if change > tolerance:
+                regressions.append(result['scenario'])
+        if before.get('throughput'):
+            change = result['throughput'] / before['throughput'] - 1
+            notes.append(f"throughput {before['throughput']} -> {result['throughput']}/s ({change:+.0%})")
+            if change < -tolerance and result['scenario'] not in regressions:
+                regressions.append(result['scenario'])
+        if result['errors'] > before.get('errors', 0) and result['scenario'] not in regressions:
+            regressions.append(result['scenario'])
+            notes.append(f"errors {before.get('errors', 0)} -> {result['errors']}")
+        print(f"  {result['scenario']}: {', '.join(notes)}")
+    return regressions
+
+
+def main():
+    args = parse_args()
+    fake = configure_fakes(args)
+
+    from bench.seed import BID_PREFIX, TENDER_PREFIX, connect, sample_pdf, seed
+    from bench.drivers import HTTP_SCENARIOS, run_evaluations
+
+    os.environ['MONGO_DBNAME'] = args.mongo_db
+    db = connect(args.mongo_uri)
+    if args.no_seed:
+        ids = {
+            'tender_ids': [doc['tender_id'] for doc in db.tenders.find({'tender_id': {'$regex': f'^{TENDER_PREFIX}'}}, {'tender_id': 1})],
+            'bid_ids': [doc['bid_id'] for doc in db.submissions.find({'bid_id': {'$regex': f'^{BID_PREFIX}'}}, {'bid_id': 1})],
+        }
+        ids['unevaluated_bid_ids'] = ids['bid_ids'][:args.evaluations]
+    else:
+        ids = seed(db, args.tenders, args.bids, seed=args.seed)
+    if not ids['tender_ids'] or not ids['bid_ids']:
+        sys.exit("No benchmark data; run without --no-seed first")
+
+    server = None
+    if args.target:
+        base_url = args.target.rstrip('/')
+    else:
+        server, base_url = start_api()
+
+    wanted = set(args.scenarios.split(',')) if args.scenarios else None
+    results = []
+    for scenario in HTTP_SCENARIOS:
+        if wanted and scenario.name not in wanted:
+            continue
+        if args.warmup:
+            scenario.run(base_url, ids, args.warmup, args.concurrency, seed=args.seed + 1)
+        print(f"BENCH : {scenario.name} x{args.requests} at concurrency {args.concurrency}")
+        results.append(scenario.run(base_url, ids, args.requests, args.concurrency, seed=args.seed))
+
+    if args.evaluations > 0 and (not wanted or 'evaluate_submission' in wanted):
+        from ai_eval import db as eval_db, evaluate_submission_async
+
+        bid_ids = ids['unevaluated_bid_ids'][:args.evaluations]
+        submissions = eval_db.submissions.find({'bid_id': {'$in': bid_ids}}, {'bid_id': 1, 'attachments': 1})
+        for submission in submissions:
+            for attachment in submission.get('attachments', []):
+                fake.attachments[attachment['url']] = sample_pdf(submission['bid_id'])
+        print(f"BENCH : evaluating {len(bid_ids)} bids at concurrency {args.eval_concurrency}")
+        results.append(run_evaluations(eval_db, evaluate_submission_async, bid_ids, args.eval_concurrency))
+
+    if server is not None:
+        server.shutdown()
+    fake.stop()
+
+    report = {
+        'meta': {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'mongo': 'mongomock' if args.mongo_uri == 'mongomock' else 'mongodb',
+            'tenders': len(ids['tender_ids']),
+            'bids': len(ids['bid_ids']),
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'eval_concurrency': args.eval_concurrency,
+            'gemini': args.gemini,
+            'gemini_latency': args.gemini_latency,
+            'python': platform.python_version(),
+            'machine': platform.node(),
+            'cpus': os.cpu_count(),
+        },
+        'results': results,
+    }
+    print()
+    print_table(results)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"BENCH : results written to {path}")
+
+    if args.compare:
+        if not os.path.exists(args.compare):
+            sys.exit(f"No baseline at {args.compare}; create one with --save-baseline")
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        changed = [key for key in ('mongo', 'tenders', 'bids', 'concurrency', 'gemini', 'gemini_latency')
+                   if baseline['meta'].get(key) != report['meta'][key]]
+        if changed:
+            print(f"BENCH : warning, baseline was run with different {', '.join(changed)}")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            sys.exit(f"BENCH : regressed: {', '.join(regressions)}")
+        print("BENCH : no regressions")
+
+
+if __name__ == '__main__':
+    main()
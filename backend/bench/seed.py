@@ -0,0 +1,164 @@
+"""
+Synthetic tenders, vendors and bids for the benchmarks.
+
+Tenders are built from the sample tenders in temps/seed_db.py and every
+bid from the sample submission in jsons/submission.json, so the documents
+have the shapes the routes and the evaluator see in production. Generation
+is seeded and therefore repeatable.
+"""
+import copy
+import json
+import os
+import random
+from datetime import datetime, timedelta
+
+import database
+from database import ensure_indexes
+from rankings import rebuild_rankings
+from temps.seed_db import TENDER_VARIATIONS
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_PDF = os.path.join(BACKEND_DIR, 'temps', 'test_doc.pdf')
+
+TENDER_PREFIX = 'TND-BENCH-'
+BID_PREFIX = 'bench-'
+VENDOR_PREFIX = 'v-bench-'
+INSERT_BATCH = 1000
+
+
+def connect(uri):
+    """
+    Point the shared client at the benchmark database.
+
+    uri is a MongoDB URI, or "mongomock" for an in-memory database (no
+    explain, command monitoring or pool stats, so Mongo timings are
+    meaningless there; use a local mongod for real numbers).
+    """
+    if uri == 'mongomock':
+        import mongomock
+        database._client = mongomock.MongoClient()
+        database._client_pid = os.getpid()
+        # The index check relies on explain, which mongomock lacks
+        os.environ['MONGO_ENSURE_INDEXES'] = '0'
+    else:
+        database.close_client()
+        database.get_client(uri)
+    return database.get_database()
+
+
+def _load_json(name):
+    with open(os.path.join(BACKEND_DIR, 'jsons', name)) as f:
+        return json.load(f)
+
+
+def sample_pdf(bid_id):
+    """The sample bid PDF made unique per bid, so content-hash caches behave as with real bids."""
+    with open(SAMPLE_PDF, 'rb') as f:
+        data = f.read()
+    # Readers ignore bytes after %%EOF
+    return data + f"\n%bench {bid_id}\n".encode()
+
+
+def make_tender(index):
+    tender = copy.deepcopy(TENDER_VARIATIONS[index % len(TENDER_VARIATIONS)])
+    tender_id = f"{TENDER_PREFIX}{index:05d}"
+    tender.update({
+        'tender_id': tender_id,
+        'title': f"{tender['title']} #{index}",
+        'stage': 'live',
+        'attachments': [],
+    })
+    return tender
+
+
+def make_submission(template, tender, index, rng, evaluated):
+    bid_id = f"{BID_PREFIX}{tender['tender_id']}-{index:05d}"
+    vendor_id = f"{VENDOR_PREFIX}{rng.randrange(1000):04d}"
+    submission = copy.deepcopy(template)
+    submission.update({
+        'bid_id': bid_id,
+        'tender_id': tender['tender_id'],
+        'vendor_id': vendor_id,
+        'bidder_name': f"Bench Vendor {vendor_id}",
+        'bid_amount': rng.randrange(100000, 10000000),
+        'submission_date': (datetime(2025, 1, 1) + timedelta(minutes=rng.randrange(500000))).isoformat() + 'Z',
+        'current_stage': rng.randrange(1, 4),
+        'attachments': [{
+            'file_name': 'bid_proposal.pdf',
+            'url': f"/bids/{tender['tender_id']}/submissions/{vendor_id}/{bid_id}.pdf",
+        }],
+    })
+    if evaluated:
+        evaluation = submission['evaluation']
+        for key in list(evaluation):
+            if key.endswith('_score'):
+                evaluation[key] = rng.randrange(30, 100)
+        scores = [value for key, value in evaluation.items() if key.endswith('_score')]
+        submission['evaluation_score'] = sum(scores) / len(scores)
+    else:
+        submission.pop('evaluation', None)
+        submission.pop('evaluation_score', None)
+    return submission
+
+
+def clear(db):
+    """Remove everything a previous seed created."""
+    db.tenders.delete_many({'tender_id': {'$regex': f'^{TENDER_PREFIX}'}})
+    db.submissions.delete_many({'bid_id': {'$regex': f'^{BID_PREFIX}'}})
+    db.tender_rankings.delete_many({'bid_id': {'$regex': f'^{BID_PREFIX}'}})
+    db.vendors.delete_many({'vendor_id': {'$regex': f'^{VENDOR_PREFIX}'}})
+    db.eval_jobs.delete_many({'bid_id': {'$regex': f'^{BID_PREFIX}'}})
+    db.eval_metrics.delete_many({'bid_id': {'$regex': f'^{BID_PREFIX}'}})
+
+
+def seed(db, tenders=10, bids_per_tender=100, unevaluated=0.1, seed=42):
+    """
+    Replace the benchmark data with a fresh synthetic set.
+
+    Args:
+        tenders (int): Number of tenders.
+        bids_per_tender (int): Submissions per tender.
+        unevaluated (float): Share of submissions left without an evaluation
+            (the evaluator benchmark runs on those).
+        seed (int): Random seed.
+
+    Returns:
+        dict: The generated ids: tender_ids, bid_ids, unevaluated_bid_ids.
+    """
+    rng = random.Random(seed)
+    template = _load_json('submission.json')['submissions'][0]
+    vendor_template = _load_json('vendor.json')
+    clear(db)
+    if os.environ.get('MONGO_ENSURE_INDEXES', '1') != '0':
+        ensure_indexes(db)
+
+    ids = {'tender_ids': [], 'bid_ids': [], 'unevaluated_bid_ids': []}
+    vendors = set()
+    batch = []
+    for t in range(tenders):
+        tender = make_tender(t)
+        db.tenders.insert_one(tender)
+        ids['tender_ids'].append(tender['tender_id'])
+        for i in range(bids_per_tender):
+            evaluated = rng.random() >= unevaluated
+            submission = make_submission(template, tender, i, rng, evaluated)
+            batch.append(submission)
+            vendors.add(submission['vendor_id'])
+            ids['bid_ids'].append(submission['bid_id'])
+            if not evaluated:
+                ids['unevaluated_bid_ids'].append(submission['bid_id'])
+            if len(batch) >= INSERT_BATCH:
+                db.submissions.insert_many(batch, ordered=False)
+                batch = []
+    if batch:
+        db.submissions.insert_many(batch, ordered=False)
+
+    if vendors:
+        db.vendors.insert_many([
+            {**vendor_template, 'vendor_id': vendor_id, 'company_name': f"Bench Vendor {vendor_id}"}
+            for vendor_id in sorted(vendors)
+        ])
+    rebuild_rankings(db)
+    print(f"BENCH SEED : {tenders} tenders, {len(ids['bid_ids'])} bids "
+          f"({len(ids['unevaluated_bid_ids'])} unevaluated), {len(vendors)} vendors")
+    return ids
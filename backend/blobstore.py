@@ -0,0 +1,183 @@
+"""
+Content-addressed store for tender and submission attachments.
+
+Every distinct file is kept once, at `<BLOB_DIR>/ab/cd/<sha256>`, however
+many tenders or bids attach it. The `blobs` collection counts references:
+
+    {
+        "sha256": "...", "size": 123, "mime_type": "application/pdf",
+        "refcount": 2, "created_at": <datetime>,
+        "gc_at": <datetime>   # only while a collection is in progress
+    }
+
+Attachment records on tenders and submissions carry the sha256, so the URL
+routes resolve a file name to its blob. Releasing the last reference
+deletes the blob. Legacy files written by name under static/ keep working
+and can be moved in with `python blobstore.py migrate`.
+"""
+import argparse
+import hashlib
+import os
+import uuid
+from datetime import datetime
+
+from pymongo import ReturnDocument
+
+COPY_CHUNK_BYTES = 1024 * 1024
+# Outside static/ so files are only reachable through the attachment routes
+BLOB_DIR = os.environ.get("BLOB_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'blobs')
+
+
+def blob_path(sha256):
+    return os.path.join(BLOB_DIR, sha256[:2], sha256[2:4], sha256)
+
+
+def has_blob(sha256):
+    return bool(sha256) and os.path.exists(blob_path(sha256))
+
+
+def hash_file(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK_BYTES), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def store(db, tmp_path, sha256, size, mime_type):
+    """
+    Move a fully written temp file into the store and take one reference.
+
+    The temp file must be on the same filesystem as BLOB_DIR. When the blob
+    already exists the temp file is simply discarded.
+    """
+    # Count the reference first so a concurrent collection cannot delete it
+    db.blobs.update_one(
+        {'sha256': sha256},
+        {
+            '$inc': {'refcount': 1},
+            '$unset': {'gc_at': ''},
+            '$setOnInsert': {'size': size, 'mime_type': mime_type, 'created_at': datetime.utcnow()},
+        },
+        upsert=True
+    )
+    path = blob_path(sha256)
+    if os.path.exists(path):
+        os.remove(tmp_path)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+
+
+def release(db, sha256):
+    """Drop one reference and delete the blob when it was the last."""
+    blob = db.blobs.find_one_and_update(
+        {'sha256': sha256},
+        {'$inc': {'refcount': -1}},
+        return_document=ReturnDocument.AFTER
+    )
+    if blob and blob['refcount'] <= 0:
+        collect(db, sha256)
+
+
+def collect(db, sha256):
+    """
+    Delete an unreferenced blob.
+
+    The file is first renamed aside; if a new reference arrived meanwhile
+    (store() clears gc_at) it is put back instead of deleted.
+    """
+    marker = datetime.utcnow()
+    if not db.blobs.find_one_and_update(
+        {'sha256': sha256, 'refcount': {'$lte': 0}, 'gc_at': None},
+        {'$set': {'gc_at': marker}}
+    ):
+        return
+
+    path = blob_path(sha256)
+    doomed = f"{path}.gc-{uuid.uuid4().hex}"
+    try:
+        os.replace(path, doomed)
+    except FileNotFoundError:
+        doomed = None
+
+    deleted = db.blobs.delete_one({'sha256': sha256, 'refcount': {'$lte': 0}, 'gc_at': marker}).deleted_count
+    if doomed is None:
+        return
+    if deleted or os.path.exists(path):
+        os.remove(doomed)
+    else:
+        os.replace(doomed, path)
+
+
+def release_attachments(db, attachments):
+    """Release the blobs of removed attachment records (legacy records have none)."""
+    for attachment in attachments or []:
+        if attachment.get('sha256') and attachment.get('stored') == 'blob':
+            release(db, attachment['sha256'])
+
+
+def find_attachment(doc, filename):
+    """The attachment record named filename on a tender or submission document."""
+    for attachment in (doc or {}).get('attachments', []):
+        if attachment.get('file_name') == filename:
+            return attachment
+    return None
+
+
+def migrate_legacy(db, static_folder):
+    """
+    Move attachments stored by name under static/ into the blob store.
+
+    Returns:
+        dict: Number of records migrated and of legacy files not found.
+    """
+    # attachments imports this module
+    from attachments import guess_mime_type
+
+    counts = {'migrated': 0, 'missing': 0}
+    sources = [
+        ('tenders', 'tender_id', lambda doc_id, name: os.path.join(static_folder, 'tender', doc_id, name),
+         lambda doc_id, name: f"/tenders/{doc_id}/files/{name}"),
+        ('submissions', 'bid_id', lambda doc_id, name: os.path.join(static_folder, 'submissions', doc_id, name),
+         lambda doc_id, name: f"/submissions/{doc_id}/attachments/{name}"),
+    ]
+    for collection, id_field, legacy_path, url in sources:
+        query = {'attachments': {'$elemMatch': {'stored': {'$ne': 'blob'}}}}
+        for doc in db[collection].find(query, {'_id': 0, id_field: 1, 'attachments': 1}):
+            for attachment in doc.get('attachments', []):
+                if attachment.get('stored') == 'blob':
+                    continue
+                path = legacy_path(doc[id_field], attachment['file_name'])
+                if not os.path.exists(path):
+                    counts['missing'] += 1
+                    continue
+
+                sha256, size, mime_type = hash_file(path), os.path.getsize(path), guess_mime_type(path)
+                tmp_path = os.path.join(BLOB_DIR, f"migrate-{uuid.uuid4().hex}")
+                os.makedirs(BLOB_DIR, exist_ok=True)
+                os.replace(path, tmp_path)
+                store(db, tmp_path, sha256, size, mime_type)
+                db[collection].update_one(
+                    {id_field: doc[id_field], 'attachments.file_name': attachment['file_name']},
+                    {'$set': {
+                        'attachments.$.sha256': sha256,
+                        'attachments.$.size': size,
+                        'attachments.$.mime_type': mime_type,
+                        'attachments.$.stored': 'blob',
+                        'attachments.$.url': url(doc[id_field], attachment['file_name']),
+                        'attachments.$.blob_url': f"/blobs/{sha256}",
+                    }}
+                )
+                counts['migrated'] += 1
+    return counts
+
+
+if __name__ == '__main__':
+    from database import get_database
+
+    parser = argparse.ArgumentParser(description="Maintain the content-addressed attachment store")
+    parser.add_argument('command', choices=['migrate'])
+    parser.add_argument('--static', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'))
+    args = parser.parse_args()
+    print(f"BLOBSTORE : {migrate_legacy(get_database(), args.static)}")
@@ -1,18 +1,351 @@
-from pymongo import MongoClient
+from pymongo import AsyncMongoClient, MongoClient, IndexModel, ASCENDING, DESCENDING, monitoring
+from pymongo.errors import PyMongoError
 from flask import current_app, g
+import atexit
 import os
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Every access path the routes and the evaluator use, per collection.
+INDEXES = {
+    'tenders': [
+        IndexModel([('tender_id', ASCENDING)], unique=True, name='tender_id_unique'),
+        IndexModel([('stage', ASCENDING), ('tender_id', ASCENDING)], name='stage_tender_id'),
+    ],
+    'submissions': [
+        IndexModel([('bid_id', ASCENDING)], unique=True, name='bid_id_unique'),
+        IndexModel([('tender_id', ASCENDING), ('evaluation_score', DESCENDING), ('bid_id', ASCENDING)],
+                   name='tender_id_score_bid_id'),
+    ],
+    'tender_rankings': [
+        IndexModel([('bid_id', ASCENDING)], unique=True, name='bid_id_unique'),
+        IndexModel([('tender_id', ASCENDING), ('total_score', DESCENDING), ('bid_id', ASCENDING)],
+                   name='tender_id_rank'),
+        IndexModel([('tender_id', ASCENDING), ('current_stage', ASCENDING), ('total_score', DESCENDING),
+                    ('bid_id', ASCENDING)], name='tender_id_stage_rank'),
+    ],
+    'vendors': [
+        IndexModel([('vendor_id', ASCENDING)], unique=True, name='vendor_id_unique'),
+    ],
+    'eval_jobs': [
+        IndexModel([('job_id', ASCENDING)], unique=True, name='job_id_unique'),
+        IndexModel([('status', ASCENDING), ('run_after', ASCENDING)], name='status_run_after'),
+        IndexModel([('status', ASCENDING), ('lease_expires_at', ASCENDING)], name='status_lease'),
+        # At most one queued job per bid, which also makes enqueueing race-free
+        IndexModel([('bid_id', ASCENDING)], unique=True, name='bid_id_queued_unique',
+                   partialFilterExpression={'status': 'queued'}),
+        IndexModel([('tender_id', ASCENDING), ('batch_id', ASCENDING), ('status', ASCENDING)],
+                   name='tender_batch_status'),
+    ],
+    'gemini_files': [
+        IndexModel([('sha256', ASCENDING)], unique=True, name='sha256_unique'),
+        IndexModel([('expires_at', ASCENDING)], expireAfterSeconds=0, name='expires_at_ttl'),
+    ],
+    'document_extracts': [
+        IndexModel([('sha256', ASCENDING), ('version', ASCENDING)], unique=True, name='sha256_version_unique'),
+    ],
+    'blobs': [
+        IndexModel([('sha256', ASCENDING)], unique=True, name='sha256_unique'),
+    ],
+    'uploads': [
+        IndexModel([('upload_id', ASCENDING)], unique=True, name='upload_id_unique'),
+        IndexModel([('expires_at', ASCENDING)], name='expires_at'),
+    ],
+    'response_cache': [
+        IndexModel([('expires_at', ASCENDING)], expireAfterSeconds=0, name='expires_at_ttl'),
+    ],
+    'prompt_caches': [
+        IndexModel([('key', ASCENDING)], unique=True, name='key_unique'),
+        IndexModel([('expires_at', ASCENDING)], expireAfterSeconds=0, name='expires_at_ttl'),
+    ],
+    'eval_metrics': [
+        # Raw traces are kept 90 days; summaries read a recent window
+        IndexModel([('created_at', ASCENDING)], expireAfterSeconds=90 * 24 * 3600, name='created_at_ttl'),
+        IndexModel([('tender_id', ASCENDING), ('created_at', ASCENDING)], name='tender_id_created_at'),
+    ],
+}
+
+# Representative hot queries; none of them should need a collection scan.
+SMOKE_QUERIES = [
+    ('tenders', {'tender_id': 'TND-0000-000'}, None),
+    ('tenders', {'stage': 'live'}, None),
+    ('tenders', {}, {'tender_id': -1}),
+    ('submissions', {'bid_id': 'bid-0'}, None),
+    ('submissions', {'tender_id': 'TND-0000-000'}, {'evaluation_score': -1, 'bid_id': 1}),
+    ('tender_rankings', {'tender_id': 'TND-0000-000'}, {'total_score': -1, 'bid_id': 1}),
+    ('vendors', {'vendor_id': 'vendor-0'}, None),
+    ('eval_jobs', {'status': 'queued', 'run_after': {'$lte': 0}}, {'run_after': 1}),
+]
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection pool counters for the shared client, exposed via /health/db."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {
+            'connections_open': 0,
+            'connections_created_total': 0,
+            'connections_checked_out': 0,
+            'checkouts_total': 0,
+            'checkout_failures_total': 0,
+            'pool_clears_total': 0,
+        }
+
+    def _inc(self, key, by=1):
+        with self._lock:
+            self.counts[key] += by
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counts)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._inc('pool_clears_total')
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._inc('connections_open')
+        self._inc('connections_created_total')
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._inc('connections_open', -1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._inc('checkout_failures_total')
+
+    def connection_checked_out(self, event):
+        self._inc('connections_checked_out')
+        self._inc('checkouts_total')
+
+    def connection_checked_in(self, event):
+        self._inc('connections_checked_out', -1)
+
+
+pool_metrics = PoolMetrics()
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """
+    Per-command counts and durations for the shared client.
+
+    Commands run on the thread that issued them, so a request (see
+    profiling.py) can `begin()` a tally on its thread and read the Mongo
+    time it spent at the end. Commands slower than MONGO_SLOW_QUERY_MS are
+    logged with the command itself.
+    """
+
+    def __init__(self, slow_ms=None):
+        self.slow_ms = float(slow_ms if slow_ms is not None else os.environ.get('MONGO_SLOW_QUERY_MS', 100))
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._pending = {}  # (connection, request id) -> (command name, collection, command)
+        self.totals = {}  # command name -> [count, seconds, failures]
+
+    def begin(self, label=None):
+        """Start counting the commands issued by this thread."""
+        self._local.tally = {'label': label, 'commands': 0, 'seconds': 0.0}
+
+    def end(self):
+        """Stop counting on this thread; returns the tally (or None)."""
+        tally = getattr(self._local, 'tally', None)
+        self._local.tally = None
+        return tally
+
+    def snapshot(self):
+        with self._lock:
+            return {name: list(values) for name, values in self.totals.items()}
+
+    def _finished(self, event, failed):
+        seconds = event.duration_micros / 1e6
+        key = (event.connection_id, event.request_id)
+        with self._lock:
+            name, collection, command = self._pending.pop(key, (event.command_name, None, None))
+            totals = self.totals.setdefault(name, [0, 0.0, 0])
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] += failed
+
+        tally = getattr(self._local, 'tally', None)
+        if tally is not None:
+            tally['commands'] += 1
+            tally['seconds'] += seconds
+
+        if seconds * 1000 >= self.slow_ms:
+            where = f" during {tally['label']}" if tally and tally['label'] else ''
+            print(f"DB SLOW QUERY : {name} on {collection} took {seconds * 1000:.0f}ms{where}: {str(command)[:500]}")
+
+    def started(self, event):
+        command = {key: value for key, value in event.command.items() if key not in ('lsid', '$clusterTime', '$db')}
+        collection = event.command.get(event.command_name)
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (
+                event.command_name, collection if isinstance(collection, str) else None, command
+            )
+
+    def succeeded(self, event):
+        self._finished(event, 0)
+
+    def failed(self, event):
+        self._finished(event, 1)
+
+
+command_metrics = CommandMetrics()
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+def _client_options():
+    options = {
+        'maxPoolSize': int(os.environ.get('MONGO_MAX_POOL_SIZE', 100)),
+        'minPoolSize': int(os.environ.get('MONGO_MIN_POOL_SIZE', 0)),
+        'maxIdleTimeMS': int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', 300000)),
+        'connectTimeoutMS': int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', 5000)),
+        'serverSelectionTimeoutMS': int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000)),
+        'readPreference': os.environ.get('MONGO_READ_PREFERENCE', 'primary'),
+        'event_listeners': [pool_metrics, command_metrics],
+    }
+    for env, option in (('MONGO_SOCKET_TIMEOUT_MS', 'socketTimeoutMS'),
+                        ('MONGO_WAIT_QUEUE_TIMEOUT_MS', 'waitQueueTimeoutMS')):
+        if os.environ.get(env):
+            options[option] = int(os.environ[env])
+    return options
+
+def get_client(uri=None):
+    """
+    Return the process-wide MongoClient, creating it on first use.
+
+    Routes, the evaluator and the job workers all share this client (and its
+    connection pool). A new client is created after a fork so child
+    processes never reuse the parent's sockets.
+    """
+    global _client, _client_pid
+    if _client is not None and _client_pid == os.getpid():
+        return _client
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = MongoClient(uri or os.environ.get('MONGODB_URI'), **_client_options())
+            _client_pid = os.getpid()
+    return _client
+
+def get_database(name=None):
+    return get_client()[name or os.environ.get('MONGO_DBNAME', 'db')]
+
+def close_client():
+    """Close the shared client; the next get_client() call opens a new one."""
+    global _client
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+
+atexit.register(close_client)
+
+def create_async_client(uri=None):
+    """
+    An AsyncMongoClient with the shared client's settings, for the async app.
+
+    It is bound to the event loop it is first used on, so the async app
+    opens one when it starts serving and closes it on shutdown. Its pool
+    is left out of pool_stats(), which describes the sync client.
+    """
+    options = _client_options()
+    options['event_listeners'] = [command_metrics]
+    return AsyncMongoClient(uri or os.environ.get('MONGODB_URI'), **options)
+
+def pool_stats():
+    """Pool counters plus the configured limits of the shared client."""
+    stats = pool_metrics.snapshot()
+    client = get_client()
+    stats['max_pool_size'] = client.options.pool_options.max_pool_size
+    stats['min_pool_size'] = client.options.pool_options.min_pool_size
+    return stats
+
 def get_db():
     if 'db' not in g:
-        # Use environment variable for MongoDB URI
-        uri = current_app.config.get('MONGO_URI', os.environ.get('MONGODB_URI'))
-        client = MongoClient(uri)
-        g.db = client[current_app.config.get('MONGO_DBNAME', 'db')]
+        g.db = get_database(current_app.config.get('MONGO_DBNAME'))
     return g.db
 
+def ensure_indexes(db):
+    """Idempotently build every declared index, reporting (not raising) failures."""
+    for collection, indexes in INDEXES.items():
+        try:
+            db[collection].create_indexes(indexes)
+        except PyMongoError as e:
+            print(f"DB INDEXES : could not build indexes on {collection}: {e}")
+
+def missing_indexes(db):
+    """Return {collection: [index names]} for declared indexes that do not exist."""
+    missing = {}
+    for collection, indexes in INDEXES.items():
+        existing = db[collection].index_information()
+        names = [index.document['name'] for index in indexes if index.document['name'] not in existing]
+        if names:
+            missing[collection] = names
+    return missing
+
+def _plan_stages(plan):
+    stages = [plan.get('stage')]
+    for key in ('inputStage', 'queryPlan'):
+        if key in plan:
+            stages += _plan_stages(plan[key])
+    for child in plan.get('inputStages', []):
+        stages += _plan_stages(child)
+    return stages
+
+def collection_scans(db):
+    """Explain SMOKE_QUERIES and return the ones whose winning plan scans the collection."""
+    scans = []
+    for collection, query, sort in SMOKE_QUERIES:
+        command = {'find': collection, 'filter': query, 'limit': 1}
+        if sort:
+            command['sort'] = sort
+        explain = db.command('explain', command, verbosity='queryPlanner')
+        stages = _plan_stages(explain['queryPlanner']['winningPlan'])
+        if 'COLLSCAN' in stages or ('SORT' in stages and sort):
+            scans.append((collection, query, sort, stages))
+    return scans
+
+def check_indexes(db):
+    """Print any missing indexes and hot queries that would scan a collection."""
+    for collection, names in missing_indexes(db).items():
+        print(f"DB INDEXES : missing on {collection}: {', '.join(names)}")
+    for collection, query, sort, stages in collection_scans(db):
+        print(f"DB INDEXES : {collection} query {query} sort {sort} is not index-backed: {stages}")
+
 def init_db(app):
-    # Optional: Initialize indexes here if needed
-    pass
+    # Open the shared client with the app's URI so every request reuses it
+    get_client(app.config.get('MONGO_URI'))
+    # Build indexes at startup; MONGO_ENSURE_INDEXES=0 skips it (e.g. when a
+    # migration job owns index builds)
+    if os.environ.get('MONGO_ENSURE_INDEXES', '1') == '0':
+        return
+    try:
+        db = get_database(app.config.get('MONGO_DBNAME'))
+        ensure_indexes(db)
+        check_indexes(db)
+    except PyMongoError as e:
+        print(f"DB INDEXES : index check failed: {e}")
+
+if __name__ == '__main__':
+    # python database.py - build and verify indexes against MONGODB_URI
+    db = get_database()
+    ensure_indexes(db)
+    check_indexes(db)
+    print("DB INDEXES : check complete")
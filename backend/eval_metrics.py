@@ -0,0 +1,208 @@
+"""
+Per-bid, per-agent instrumentation of the evaluation pipeline.
+
+run_agent opens an AgentTrace on the thread it runs on; ai_chat and
+LLMClient add to whichever trace is active there, so nothing has to be
+threaded through their signatures. `wait_seconds` is time spent queued on
+the rate limiter and concurrency cap, `model_seconds` time spent in the
+upstream requests themselves. A finished trace is saved on the
+submission under `evaluation_metrics.<agent>` and appended to the
+`eval_metrics` collection for aggregation:
+
+    {
+        "bid_id": "...", "tender_id": "...", "agent": "technical", "model": "...",
+        "attempts": 1, "llm_calls": 1, "llm_retries": 0,
+        "request_bytes": 48213, "input_tokens": 12000, "cached_tokens": 3000, "output_tokens": 400,
+        "wait_seconds": 0.4, "model_seconds": 6.2, "parse_seconds": 0.001, "total_seconds": 6.7,
+        "cost_usd": 0.0014, "ok": true, "error": null, "created_at": <datetime>
+    }
+
+Downloading and preparing a bid's attachments happens once for all of its
+agents and is saved the same way under the agent name "inputs".
+"""
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from pymongo.errors import PyMongoError
+
+# USD per million tokens; defaults are gemini-2.0-flash list prices
+PRICE_INPUT = float(os.environ.get("GEMINI_PRICE_INPUT_PER_MTOK", 0.10))
+PRICE_CACHED = float(os.environ.get("GEMINI_PRICE_CACHED_PER_MTOK", 0.025))
+PRICE_OUTPUT = float(os.environ.get("GEMINI_PRICE_OUTPUT_PER_MTOK", 0.40))
+
+# Samples read per summary; older ones in the window are ignored past this
+SUMMARY_MAX_SAMPLES = 50000
+
+_local = threading.local()
+
+
+def current():
+    """The trace active on this thread, or None."""
+    return getattr(_local, 'trace', None)
+
+
+def add(field, amount=1):
+    """Add to a counter of the active trace; a no-op outside a trace."""
+    trace = current()
+    if trace is not None:
+        trace.add(field, amount)
+
+
+def request_size(contents, system_prompt=None):
+    """Bytes of text and inline data sent with a request (file handles count as nothing)."""
+    size = len(system_prompt.encode()) if system_prompt else 0
+    for content in contents or []:
+        for part in getattr(content, 'parts', None) or []:
+            if getattr(part, 'text', None):
+                size += len(part.text.encode())
+            inline = getattr(part, 'inline_data', None)
+            if inline is not None and inline.data:
+                size += len(inline.data)
+    return size
+
+
+def record_call(response, request_bytes):
+    """Add one model call's size and token usage to the active trace."""
+    trace = current()
+    if trace is None:
+        return
+    usage = getattr(response, 'usage_metadata', None)
+    trace.add('llm_calls')
+    trace.add('request_bytes', request_bytes)
+    trace.add('input_tokens', getattr(usage, 'prompt_token_count', None) or 0)
+    trace.add('cached_tokens', getattr(usage, 'cached_content_token_count', None) or 0)
+    trace.add('output_tokens', (getattr(usage, 'candidates_token_count', None) or 0)
+              + (getattr(usage, 'thoughts_token_count', None) or 0))
+
+
+def cost_usd(fields):
+    cached = fields.get('cached_tokens', 0)
+    uncached = max(0, fields.get('input_tokens', 0) - cached)
+    return (uncached * PRICE_INPUT + cached * PRICE_CACHED + fields.get('output_tokens', 0) * PRICE_OUTPUT) / 1e6
+
+
+class AgentTrace:
+    """
+    Collects the metrics of one agent (or the "inputs" stage) for one bid
+    and saves them when the `with` block exits, whether it failed or not.
+
+    Args:
+        db: pymongo database holding submissions and eval_metrics.
+        bid_id (str): The submission being evaluated.
+        tender_id (str): Its tender, for per-tender aggregates.
+        agent (str): Agent name, or "inputs".
+        model (str): Model the agent calls.
+    """
+
+    def __init__(self, db, bid_id, tender_id, agent, model=None):
+        self.db = db
+        self.fields = {'bid_id': bid_id, 'tender_id': tender_id, 'agent': agent, 'model': model}
+        self._lock = threading.Lock()
+        self._started = None
+
+    def add(self, field, amount=1):
+        with self._lock:
+            self.fields[field] = self.fields.get(field, 0) + amount
+
+    @contextmanager
+    def timer(self, field):
+        """Add the time spent in the block to `field` (seconds)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(field, time.perf_counter() - started)
+
+    def __enter__(self):
+        self._previous = current()
+        _local.trace = self
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _local.trace = self._previous
+        self.fields.update({
+            'total_seconds': time.perf_counter() - self._started,
+            'cost_usd': cost_usd(self.fields),
+            'ok': exc is None,
+            'error': str(exc) if exc is not None else None,
+            'created_at': datetime.utcnow(),
+        })
+        self.save()
+        return False
+
+    def save(self):
+        # Metrics must never fail an evaluation
+        try:
+            self.db.submissions.update_one(
+                {'bid_id': self.fields['bid_id']},
+                {'$set': {f"evaluation_metrics.{self.fields['agent']}": dict(self.fields)}}
+            )
+            self.db.eval_metrics.insert_one(dict(self.fields))
+        except PyMongoError as e:
+            print(f"EVAL METRICS : could not save metrics for bid {self.fields['bid_id']}: {e}")
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return None
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def summarize(db, hours=24, tender_id=None):
+    """
+    Aggregate recent traces for capacity planning.
+
+    Returns:
+        dict: Latency percentiles, tokens and failures per agent, and
+            token/cost totals per tender, over the last `hours`.
+    """
+    since = datetime.utcnow() - timedelta(hours=hours)
+    match = {'created_at': {'$gte': since}}
+    if tender_id:
+        match['tender_id'] = tender_id
+
+    samples = {}
+    cursor = db.eval_metrics.find(
+        match,
+        {'_id': 0, 'agent': 1, 'ok': 1, 'total_seconds': 1, 'model_seconds': 1, 'wait_seconds': 1,
+         'download_seconds': 1, 'input_tokens': 1, 'output_tokens': 1, 'llm_retries': 1, 'attempts': 1},
+    ).sort('created_at', -1).limit(SUMMARY_MAX_SAMPLES)
+    for doc in cursor:
+        samples.setdefault(doc['agent'], []).append(doc)
+
+    agents = {}
+    for agent, docs in samples.items():
+        summary = {'count': len(docs), 'failed': sum(1 for doc in docs if not doc.get('ok'))}
+        for field in ('total_seconds', 'model_seconds', 'wait_seconds', 'download_seconds'):
+            values = sorted(doc[field] for doc in docs if doc.get(field) is not None)
+            if values:
+                summary[field] = {'p50': percentile(values, 0.5), 'p95': percentile(values, 0.95), 'max': values[-1]}
+        for field in ('input_tokens', 'output_tokens', 'llm_retries', 'attempts'):
+            summary[f'avg_{field}'] = sum(doc.get(field, 0) for doc in docs) / len(docs)
+        agents[agent] = summary
+
+    tenders = list(db.eval_metrics.aggregate([
+        {'$match': {**match, 'agent': {'$ne': 'inputs'}}},
+        {'$group': {
+            '_id': '$tender_id',
+            'bids': {'$addToSet': '$bid_id'},
+            'calls': {'$sum': '$llm_calls'},
+            'input_tokens': {'$sum': '$input_tokens'},
+            'cached_tokens': {'$sum': '$cached_tokens'},
+            'output_tokens': {'$sum': '$output_tokens'},
+            'cost_usd': {'$sum': '$cost_usd'},
+        }},
+        {'$project': {
+            '_id': 0, 'tender_id': '$_id', 'bids': {'$size': '$bids'}, 'calls': 1,
+            'input_tokens': 1, 'cached_tokens': 1, 'output_tokens': 1, 'cost_usd': 1,
+        }},
+        {'$sort': {'cost_usd': -1}},
+    ]))
+
+    return {'since': since.isoformat(), 'hours': hours, 'agents': agents, 'tenders': tenders}
@@ -0,0 +1,285 @@
+"""
+MongoDB-backed queue of submission evaluations.
+
+Jobs live in the `eval_jobs` collection:
+
+    {
+        "job_id": "job-<hex>", "bid_id": "...", "tender_id": "...", "batch_id": "...",
+        "options": {"mode": "stale"},
+        "status": "queued" | "running" | "done" | "failed",
+        "attempts": 0, "max_attempts": 5,
+        "run_after": <datetime>, "lease_expires_at": <datetime>,
+        "worker_id": "...", "last_error": "...",
+        "created_at": <datetime>, "updated_at": <datetime>
+    }
+
+A worker claims a job by atomically flipping it to "running" with a lease.
+While the job runs the lease is renewed; if the worker dies the lease runs
+out and another worker picks the job up again, unless that was its last
+attempt, in which case it is marked failed. evaluate_submission_async
+skips agents that already saved a result, so a reclaimed job resumes a
+half-finished evaluation rather than starting over.
+
+A worker can be `paused` by a callable (e.g. the Gemini circuit breaker's
+`remaining`): while it reports seconds left no jobs are claimed, and jobs
+that fail during a pause go back to the queue after it without spending an
+attempt, since the failure says nothing about the bid itself.
+"""
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+
+MAX_ATTEMPTS = int(os.environ.get("EVAL_MAX_ATTEMPTS", 5))
+LEASE_SECONDS = int(os.environ.get("EVAL_LEASE_SECONDS", 120))
+BACKOFF_BASE_SECONDS = float(os.environ.get("EVAL_BACKOFF_BASE_SECONDS", 30))
+BACKOFF_MAX_SECONDS = float(os.environ.get("EVAL_BACKOFF_MAX_SECONDS", 900))
+
+
+def enqueue_evaluation(db, bid_id, tender_id=None, options=None, **fields):
+    """
+    Queue an evaluation for a submission.
+
+    A bid that already has a queued job is not queued twice; the existing
+    job is updated with `fields` (e.g. a batch_id) and returned instead.
+    `options` are passed to the handler as keyword arguments (e.g.
+    {'mode': 'stale'}) and replace those of an existing queued job; without
+    options the queued job reverts to a default evaluation.
+
+    Returns:
+        dict: The job document.
+    """
+    now = datetime.utcnow()
+    job = {
+        'job_id': f"job-{uuid.uuid4().hex}",
+        'bid_id': bid_id,
+        'tender_id': tender_id,
+        'status': 'queued',
+        'attempts': 0,
+        'max_attempts': MAX_ATTEMPTS,
+        'run_after': now,
+        'created_at': now,
+    }
+    update = {'$setOnInsert': job, '$set': {'updated_at': now, **fields}}
+    if options:
+        update['$set']['options'] = options
+    else:
+        update['$unset'] = {'options': ''}
+    return db.eval_jobs.find_one_and_update(
+        {'bid_id': bid_id, 'status': 'queued'},
+        update,
+        upsert=True,
+        projection={'_id': 0},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def fail_abandoned_jobs(db, now=None):
+    """
+    Mark failed the jobs whose lease ran out on their last attempt.
+
+    A bid that crashes or exhausts its worker never reaches fail_job, so
+    without this it would be reclaimed after every lease forever.
+    """
+    now = now or datetime.utcnow()
+    result = db.eval_jobs.update_many(
+        {'status': 'running', 'lease_expires_at': {'$lt': now},
+         '$expr': {'$gte': ['$attempts', '$max_attempts']}},
+        {'$set': {'status': 'failed', 'finished_at': now, 'updated_at': now,
+                  'last_error': 'lease expired on the last attempt (worker died or hung)'},
+         '$unset': {'lease_expires_at': ''}}
+    )
+    if result.modified_count:
+        print(f"EVAL QUEUE : {result.modified_count} job(s) failed after their worker died on the last attempt")
+    return result.modified_count
+
+
+def claim_job(db, worker_id, lease_seconds=LEASE_SECONDS):
+    """Atomically take the next runnable job (or one whose lease ran out with attempts left)."""
+    now = datetime.utcnow()
+    fail_abandoned_jobs(db, now)
+    return db.eval_jobs.find_one_and_update(
+        {'$or': [
+            {'status': 'queued', 'run_after': {'$lte': now}},
+            {'status': 'running', 'lease_expires_at': {'$lt': now},
+             '$expr': {'$lt': ['$attempts', '$max_attempts']}},
+        ]},
+        {
+            '$set': {
+                'status': 'running',
+                'worker_id': worker_id,
+                'lease_expires_at': now + timedelta(seconds=lease_seconds),
+                'updated_at': now,
+            },
+            '$inc': {'attempts': 1},
+        },
+        sort=[('run_after', 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def renew_lease(db, job_id, worker_id, lease_seconds=LEASE_SECONDS):
+    now = datetime.utcnow()
+    db.eval_jobs.update_one(
+        {'job_id': job_id, 'worker_id': worker_id, 'status': 'running'},
+        {'$set': {'lease_expires_at': now + timedelta(seconds=lease_seconds), 'updated_at': now}}
+    )
+
+
+def complete_job(db, job):
+    db.eval_jobs.update_one(
+        {'job_id': job['job_id'], 'worker_id': job['worker_id']},
+        {'$set': {'status': 'done', 'finished_at': datetime.utcnow(), 'updated_at': datetime.utcnow()},
+         '$unset': {'lease_expires_at': ''}}
+    )
+
+
+def backoff_seconds(attempts):
+    """Exponential backoff with full jitter for the given attempt number."""
+    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0)))
+    return random.uniform(delay / 2, delay)
+
+
+def fail_job(db, job, error):
+    """Schedule a retry with backoff, or mark the job failed once out of attempts."""
+    now = datetime.utcnow()
+    if job['attempts'] >= job.get('max_attempts', MAX_ATTEMPTS):
+        update = {'status': 'failed', 'finished_at': now}
+    else:
+        update = {'status': 'queued', 'run_after': now + timedelta(seconds=backoff_seconds(job['attempts']))}
+    update.update({'last_error': error, 'updated_at': now})
+    db.eval_jobs.update_one(
+        {'job_id': job['job_id'], 'worker_id': job['worker_id']},
+        {'$set': update, '$unset': {'lease_expires_at': ''}}
+    )
+
+
+def release_job(db, job, delay_seconds=0):
+    """Hand a job back to the queue without counting the attempt (e.g. on shutdown)."""
+    now = datetime.utcnow()
+    db.eval_jobs.update_one(
+        {'job_id': job['job_id'], 'worker_id': job['worker_id'], 'status': 'running'},
+        {'$set': {'status': 'queued', 'run_after': now + timedelta(seconds=delay_seconds), 'updated_at': now},
+         '$inc': {'attempts': -1},
+         '$unset': {'lease_expires_at': ''}}
+    )
+
+
+class EvaluationWorker:
+    """
+    Pulls evaluation jobs from the queue and runs at most `concurrency` at once.
+
+    Args:
+        db: pymongo database holding the eval_jobs collection.
+        handler (callable): Called with the bid_id and options of each job; raising marks the attempt failed.
+        concurrency (int): Maximum number of evaluations running in parallel.
+        poll_interval (float): Seconds to wait when the queue is empty.
+        paused (callable): Returns the seconds the worker should hold off (0 to run).
+    """
+
+    def __init__(self, db, handler, concurrency=2, poll_interval=2.0, lease_seconds=LEASE_SECONDS, paused=None):
+        self.db = db
+        self.handler = handler
+        self.paused = paused or (lambda: 0)
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._stop = threading.Event()
+        self._running = {}
+        self._running_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='eval-worker')
+        self._threads = []
+
+    def start(self):
+        for target in (self._claim_loop, self._heartbeat_loop):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"EVAL QUEUE : worker {self.worker_id} started with concurrency {self.concurrency}")
+        return self
+
+    def _claim_loop(self):
+        while not self._stop.is_set():
+            pause = self.paused()
+            if pause > 0:
+                self._stop.wait(min(pause, self.poll_interval * 5))
+                continue
+            # Only claim when a slot is free so leases aren't held by idle jobs
+            if not self._slots.acquire(timeout=self.poll_interval):
+                continue
+            try:
+                job = claim_job(self.db, self.worker_id, self.lease_seconds)
+            except Exception as e:
+                print(f"EVAL QUEUE : error claiming job: {e}")
+                job = None
+            if job is None:
+                self._slots.release()
+                self._stop.wait(self.poll_interval)
+                continue
+            with self._running_lock:
+                self._running[job['job_id']] = job
+            try:
+                self._pool.submit(self._run, job)
+            except RuntimeError:
+                # stop() shut the pool down between the claim and the submit
+                with self._running_lock:
+                    self._running.pop(job['job_id'], None)
+                release_job(self.db, job)
+                self._slots.release()
+
+    def _run(self, job):
+        try:
+            self.handler(job['bid_id'], **job.get('options', {}))
+            complete_job(self.db, job)
+            print(f"EVAL QUEUE : job {job['job_id']} done for bid {job['bid_id']}")
+        except Exception as e:
+            pause = self.paused()
+            if pause > 0:
+                # The upstream is down, not the bid; retry once it is back
+                release_job(self.db, job, delay_seconds=pause)
+                print(f"EVAL QUEUE : job {job['job_id']} released for {pause:.0f}s while paused: {e}")
+                return
+            traceback.print_exc()
+            fail_job(self.db, job, str(e))
+            print(f"EVAL QUEUE : job {job['job_id']} attempt {job['attempts']} failed for bid {job['bid_id']}: {e}")
+        finally:
+            with self._running_lock:
+                self._running.pop(job['job_id'], None)
+            self._slots.release()
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.lease_seconds / 3):
+            with self._running_lock:
+                job_ids = list(self._running)
+            for job_id in job_ids:
+                try:
+                    renew_lease(self.db, job_id, self.worker_id, self.lease_seconds)
+                except Exception as e:
+                    print(f"EVAL QUEUE : error renewing lease for {job_id}: {e}")
+
+    def stop(self, timeout=None):
+        """
+        Stop claiming new jobs and wait up to `timeout` seconds for running ones.
+
+        Jobs still running after the timeout are handed back to the queue so
+        another worker can resume them immediately.
+        """
+        self._stop.set()
+        self._pool.shutdown(wait=False)
+        deadline = None if timeout is None else datetime.utcnow() + timedelta(seconds=timeout)
+        while self._running and (deadline is None or datetime.utcnow() < deadline):
+            time.sleep(0.5)
+        with self._running_lock:
+            leftover = list(self._running.values())
+        for job in leftover:
+            release_job(self.db, job)
+        print(f"EVAL QUEUE : worker {self.worker_id} stopped, released {len(leftover)} job(s)")
@@ -0,0 +1,197 @@
+"""
+Response schemas for the evaluation agents, and parsing of their answers.
+
+The schemas are built from the tender so array lengths and object keys
+match its requirements exactly. The same dict is sent to Gemini as
+`response_schema` and checked locally with `validate`, since the model can
+still truncate or drift. Schema dicts use the Gemini (OpenAPI subset) form:
+upper-case `type`, `properties`, `required`, `items`, `min_items`,
+`max_items`, `minimum`, `maximum`.
+"""
+import json
+import re
+
+SCORE = {'type': 'NUMBER', 'minimum': 0, 'maximum': 100}
+REASONING = {'type': 'STRING'}
+COST = {'type': 'NUMBER', 'minimum': 0}
+
+
+def checklist(items):
+    """One boolean per requirement, in order."""
+    count = len(items) if isinstance(items, (list, tuple)) else 0
+    return {'type': 'ARRAY', 'items': {'type': 'BOOLEAN'}, 'min_items': count, 'max_items': count}
+
+
+def agent_object(properties):
+    return {
+        'type': 'OBJECT',
+        'properties': properties,
+        'required': list(properties),
+        'property_ordering': list(properties),
+    }
+
+
+def elegibility_schema(requirements):
+    return agent_object({
+        'elegibility': checklist(requirements.get('eligibility', [])),
+        'elegibility_score': SCORE,
+        'elegibility_reasoning': REASONING,
+    })
+
+
+def technical_schema(requirements):
+    skus = requirements.get('technical_sku', {}) or {}
+    sku_properties = {
+        component: checklist(list(specs) if isinstance(specs, dict) else specs)
+        for component, specs in skus.items()
+    }
+    properties = {
+        'technical_checklist': checklist(requirements.get('technical_checklist', [])),
+        'technical_score': SCORE,
+        'technical_reasoning': REASONING,
+    }
+    if sku_properties:
+        # Gemini rejects OBJECT schemas without properties
+        properties = {'technical_sku': agent_object(sku_properties), **properties}
+    return agent_object(properties)
+
+
+def financial_schema(requirements):
+    line_item = agent_object({'rate_per_unit': COST, 'quantity': COST, 'total_cost': COST})
+    others = {
+        'type': 'OBJECT',
+        'properties': {'transportation': COST, 'installation': COST, 'warranty': COST},
+        'nullable': True,
+    }
+    breakdown = {component: line_item for component in (requirements.get('technical_sku', {}) or {})}
+    breakdown.update({'others': others, 'total_budget': COST})
+    financial = agent_object(breakdown)
+    financial['required'] = [key for key in breakdown if key != 'others']
+    return agent_object({
+        'financial': financial,
+        'financial_checklist': checklist(requirements.get('financial_checklist', [])),
+        'financial_score': SCORE,
+        'financial_reasoning': REASONING,
+    })
+
+
+def legal_schema(requirements):
+    return agent_object({
+        'legal': checklist(requirements.get('legal', [])),
+        'legal_score': SCORE,
+        'legal_reasoning': REASONING,
+    })
+
+
+def validate(value, schema, path='$'):
+    """
+    Check a parsed answer against a schema.
+
+    Returns:
+        list: Human readable problems, empty when the value is valid.
+    """
+    if value is None:
+        return [] if schema.get('nullable') else [f"{path} is missing or null"]
+
+    kind = schema.get('type')
+    if kind == 'OBJECT':
+        if not isinstance(value, dict):
+            return [f"{path} must be an object"]
+        errors = [f"{path}.{key} is required" for key in schema.get('required', []) if key not in value]
+        for key, sub_schema in schema.get('properties', {}).items():
+            if key in value:
+                errors += validate(value[key], sub_schema, f"{path}.{key}")
+        return errors
+    if kind == 'ARRAY':
+        if not isinstance(value, list):
+            return [f"{path} must be an array"]
+        errors = []
+        if 'min_items' in schema and len(value) < schema['min_items']:
+            errors.append(f"{path} must have at least {schema['min_items']} items, got {len(value)}")
+        if 'max_items' in schema and len(value) > schema['max_items']:
+            errors.append(f"{path} must have at most {schema['max_items']} items, got {len(value)}")
+        for i, item in enumerate(value):
+            errors += validate(item, schema.get('items', {}), f"{path}[{i}]")
+        return errors
+    if kind == 'BOOLEAN':
+        return [] if isinstance(value, bool) else [f"{path} must be true or false"]
+    if kind in ('NUMBER', 'INTEGER'):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return [f"{path} must be a number"]
+        if 'minimum' in schema and value < schema['minimum']:
+            return [f"{path} must be >= {schema['minimum']}"]
+        if 'maximum' in schema and value > schema['maximum']:
+            return [f"{path} must be <= {schema['maximum']}"]
+        return []
+    if kind == 'STRING':
+        return [] if isinstance(value, str) else [f"{path} must be a string"]
+    return []
+
+
+def coerce(value, schema):
+    """Fix harmless type drift: numbers and booleans sent as strings."""
+    kind = schema.get('type')
+    if kind == 'OBJECT' and isinstance(value, dict):
+        properties = schema.get('properties', {})
+        return {key: coerce(item, properties[key]) if key in properties else item for key, item in value.items()}
+    if kind == 'ARRAY' and isinstance(value, list):
+        return [coerce(item, schema.get('items', {})) for item in value]
+    if kind == 'BOOLEAN' and isinstance(value, str) and value.strip().lower() in ('true', 'false'):
+        return value.strip().lower() == 'true'
+    if kind in ('NUMBER', 'INTEGER') and isinstance(value, str):
+        try:
+            return float(value.replace(',', '').strip().rstrip('%'))
+        except ValueError:
+            return value
+    return value
+
+
+TRAILING_COMMA = re.compile(r',\s*([}\]])')
+PYTHON_LITERALS = re.compile(r'\b(True|False|None)\b')
+
+
+def repair_json(text):
+    """
+    Best-effort fix of near-valid JSON: code fences, prose around the
+    object, trailing commas, Python literals and smart quotes.
+    """
+    text = text.replace('```json', '').replace('```', '').strip()
+    start, end = text.find('{'), text.rfind('}')
+    if start != -1 and end > start:
+        text = text[start:end + 1]
+    text = text.replace('“', '"').replace('”', '"')
+    text = TRAILING_COMMA.sub(r'\1', text)
+    return PYTHON_LITERALS.sub(lambda m: {'True': 'true', 'False': 'false', 'None': 'null'}[m.group(1)], text)
+
+
+def parse_answer(text, schema):
+    """
+    Parse and validate an agent answer, repairing it if needed.
+
+    Returns:
+        tuple: (value, problems) - value is None when the text is not JSON at all.
+    """
+    try:
+        value = json.loads(text)
+    except (TypeError, ValueError):
+        try:
+            value = json.loads(repair_json(text or ''))
+        except ValueError as e:
+            return None, [f"not valid JSON: {e}"]
+    value = coerce(value, schema)
+    return value, validate(value, schema)
+
+
+def example_value(schema):
+    """A value that satisfies the schema (used by the offline fakes; accepts REST camelCase too)."""
+    kind = str(schema.get('type', '')).upper()
+    if kind == 'OBJECT':
+        return {key: example_value(sub_schema) for key, sub_schema in schema.get('properties', {}).items()}
+    if kind == 'ARRAY':
+        count = schema.get('min_items', schema.get('minItems', 1))
+        return [example_value(schema.get('items', {})) for _ in range(int(count))]
+    if kind == 'BOOLEAN':
+        return True
+    if kind in ('NUMBER', 'INTEGER'):
+        return max(schema.get('minimum', 0), min(80, schema.get('maximum', 80)))
+    return "Fake evaluation."
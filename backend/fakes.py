@@ -0,0 +1,304 @@
+"""
+Local stand-ins for the Gemini client so the evaluation pipeline can run
+offline. Set GEMINI_FAKE=1 to make ai_eval use FakeGenaiClient.
+
+FakeGeminiServer goes one level lower: a local HTTP server speaking the
+generateContent REST API (plus plain file downloads), for exercising the
+real genai client, timeouts and retries. Point GEMINI_BASE_URL at its url
+with GEMINI_FILES_API=0 and GEMINI_CONTEXT_CACHE=0.
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from google.genai import errors, types
+
+from eval_schema import example_value
+
+
+def _system_text(config):
+    instruction = getattr(config, 'system_instruction', None) or []
+    if isinstance(instruction, str):
+        return instruction
+    return "\n".join(getattr(part, 'text', '') or '' for part in instruction)
+
+
+def _response_schema(config):
+    schema = getattr(config, 'response_schema', None)
+    if isinstance(schema, types.Schema):
+        schema = schema.model_dump(exclude_none=True, mode='json')
+    return schema
+
+
+def default_responder(model, contents, config):
+    """
+    Produce a plausible JSON answer for an evaluation agent.
+
+    With a response schema the answer is a valid instance of it; otherwise
+    every "<name>_score" / "<name>_reasoning" key mentioned in the system
+    prompt is filled in.
+    """
+    return _answer(_response_schema(config), _system_text(config))
+
+
+def _answer(schema, prompt):
+    if schema:
+        return json.dumps(example_value(schema))
+    answer = {}
+    for name in sorted(set(re.findall(r'"(\w+)_score"', prompt))):
+        answer[f"{name}_score"] = 80
+        answer[f"{name}_reasoning"] = "Fake evaluation."
+    return json.dumps(answer)
+
+
+class _FakeFiles:
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.store = {}
+        self.upload_count = 0
+        self._lock = threading.Lock()
+
+    def upload(self, file, config=None):
+        data = file.read() if hasattr(file, 'read') else open(file, 'rb').read()
+        name = f"files/{uuid.uuid4().hex[:12]}"
+        uploaded = types.File(
+            name=name,
+            uri=f"https://fake.googleapis.com/v1beta/{name}",
+            mime_type=getattr(config, 'mime_type', None),
+            display_name=getattr(config, 'display_name', None),
+            size_bytes=len(data),
+            state=types.FileState.ACTIVE,
+            expiration_time=datetime.now(timezone.utc) + self.ttl,
+        )
+        with self._lock:
+            self.store[name] = uploaded
+            self.upload_count += 1
+        return uploaded
+
+    def get(self, name):
+        uploaded = self.store.get(name)
+        if uploaded is None or uploaded.expiration_time <= datetime.now(timezone.utc):
+            raise errors.ClientError(403, {'error': {
+                'code': 403,
+                'message': f"File {name} does not exist or has expired.",
+                'status': 'PERMISSION_DENIED',
+            }})
+        return uploaded
+
+    def delete(self, name):
+        self.store.pop(name, None)
+
+    def expire(self, name):
+        """Test helper: make an uploaded file lapse immediately."""
+        self.store[name].expiration_time = datetime.now(timezone.utc)
+
+
+class _FakeCaches:
+    def __init__(self):
+        self.store = {}
+        self.create_count = 0
+
+    def create(self, model, config=None):
+        name = f"cachedContents/{uuid.uuid4().hex[:12]}"
+        ttl = int(str(getattr(config, 'ttl', None) or '3600s').rstrip('s'))
+        cached = types.CachedContent(
+            name=name,
+            model=model,
+            display_name=getattr(config, 'display_name', None),
+            expire_time=datetime.now(timezone.utc) + timedelta(seconds=ttl),
+        )
+        self.store[name] = (cached, config)
+        self.create_count += 1
+        return cached
+
+    def get(self, name):
+        entry = self.store.get(name)
+        if entry is None or entry[0].expire_time <= datetime.now(timezone.utc):
+            raise errors.ClientError(404, {'error': {
+                'code': 404,
+                'message': f"CachedContent {name} not found.",
+                'status': 'NOT_FOUND',
+            }})
+        return entry[0]
+
+    def system_text(self, name):
+        self.get(name)
+        config = self.store[name][1]
+        instruction = getattr(config, 'system_instruction', None)
+        return instruction if isinstance(instruction, str) else _system_text(config)
+
+
+class _FakeModels:
+    def __init__(self, files, caches, responder, latency):
+        self.files = files
+        self.caches = caches
+        self.responder = responder
+        self.latency = latency
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def _check_file_refs(self, contents):
+        for content in contents or []:
+            for part in getattr(content, 'parts', None) or []:
+                file_data = getattr(part, 'file_data', None)
+                if file_data is not None:
+                    self.files.get(file_data.file_uri.split('/v1beta/')[-1])
+
+    def generate_content(self, model, contents, config=None):
+        self._check_file_refs(contents)
+        cached_content = getattr(config, 'cached_content', None)
+        if cached_content:
+            # Answer as if the cached system prompt had been sent with the call
+            config = types.GenerateContentConfig(
+                system_instruction=self.caches.system_text(cached_content),
+                response_schema=getattr(config, 'response_schema', None),
+            )
+        with self._lock:
+            self.calls.append({'model': model, 'contents': contents, 'config': config})
+        if self.latency:
+            time.sleep(self.latency)
+        text = self.responder(model, contents, config)
+        return types.GenerateContentResponse(
+            candidates=[types.Candidate(
+                content=types.Content(role='model', parts=[types.Part.from_text(text=text)]),
+                finish_reason=types.FinishReason.STOP,
+            )],
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=len(_system_text(config)) // 4,
+                candidates_token_count=len(text) // 4,
+            ),
+        )
+
+
+class FakeGenaiClient:
+    """
+    Offline replacement for google.genai.Client covering files, caches and models.
+
+    Args:
+        responder (callable): (model, contents, config) -> response text.
+        latency (float): Seconds every generate_content call takes.
+        file_ttl (timedelta): How long uploaded files stay valid.
+    """
+
+    def __init__(self, responder=None, latency=0.0, file_ttl=timedelta(hours=48)):
+        self.files = _FakeFiles(file_ttl)
+        self.caches = _FakeCaches()
+        self.models = _FakeModels(self.files, self.caches, responder or default_responder, latency)
+
+    def close(self):
+        pass
+
+
+class FakeGeminiServer:
+    """
+    Local HTTP server answering POST /v1beta/models/<model>:generateContent
+    and GET requests for files registered in `attachments` (with ETags).
+
+    Args:
+        responder (callable): (model, request body dict) -> response text.
+        latency (float): Seconds every generateContent request takes.
+
+    Use fail_next(429, 503, retry_after=1) to make the next requests fail.
+    """
+
+    def __init__(self, responder=None, latency=0.0):
+        self.responder = responder or self.default_responder
+        self.latency = latency
+        self.attachments = {}  # path -> bytes
+        self.requests = []
+        self._failures = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @staticmethod
+    def default_responder(model, body):
+        schema = (body.get('generationConfig') or {}).get('responseSchema')
+        parts = (body.get('systemInstruction') or {}).get('parts', [])
+        return _answer(schema, "\n".join(part.get('text', '') for part in parts))
+
+    def fail_next(self, *statuses, retry_after=None):
+        with self._lock:
+            self._failures.extend((status, retry_after) for status in statuses)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _next_failure(self):
+        with self._lock:
+            return self._failures.pop(0) if self._failures else None
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body=b'', content_type='application/json', headers=None):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                data = fake.attachments.get(self.path)
+                if data is None:
+                    return self._send(404, b'{}')
+                etag = f'"{hashlib.sha256(data).hexdigest()}"'
+                if self.headers.get('If-None-Match') == etag:
+                    return self._send(304, headers={'ETag': etag})
+                self._send(200, data, 'application/pdf', {'ETag': etag})
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                match = re.search(r'/models/([^/:]+):generateContent', self.path)
+                with fake._lock:
+                    fake.requests.append({'path': self.path, 'body': body})
+                if fake.latency:
+                    time.sleep(fake.latency)
+
+                failure = fake._next_failure()
+                if failure:
+                    status, retry_after = failure
+                    error = {'error': {'code': status, 'message': 'fake failure', 'status': 'UNAVAILABLE'}}
+                    headers = {'Retry-After': str(retry_after)} if retry_after is not None else None
+                    return self._send(status, json.dumps(error).encode(), headers=headers)
+                if not match:
+                    return self._send(404, b'{}')
+
+                text = fake.responder(match.group(1), body)
+                response = {
+                    'candidates': [{
+                        'content': {'role': 'model', 'parts': [{'text': text}]},
+                        'finishReason': 'STOP',
+                    }],
+                    'usageMetadata': {
+                        'promptTokenCount': len(json.dumps(body)) // 4,
+                        'candidatesTokenCount': len(text) // 4,
+                        'totalTokenCount': (len(json.dumps(body)) + len(text)) // 4,
+                    },
+                }
+                self._send(200, json.dumps(response).encode())
+
+        return Handler
@@ -0,0 +1,98 @@
+"""
+Sending attachment files to clients.
+
+All file routes go through `serve_file`, which supports conditional and
+byte-range requests, uses the content hash as a strong ETag, and marks
+content-addressed URLs (/blobs/<sha256>) immutable.
+
+With FILE_OFFLOAD set, the app only authorizes and resolves the file and a
+front proxy streams the bytes, so downloads do not hold an app worker:
+
+    FILE_OFFLOAD=nginx     X-Accel-Redirect to an internal location, e.g.
+
+        location /_protected/blobs/  { internal; alias /app/blobs/; }
+        location /_protected/static/ { internal; alias /app/static/; }
+
+    FILE_OFFLOAD=sendfile  X-Sendfile with the file path (Apache mod_xsendfile,
+                           lighttpd), via Flask's USE_X_SENDFILE.
+
+Without it the WSGI server streams the file (wsgi.file_wrapper, which
+gunicorn turns into sendfile(2)).
+"""
+import os
+
+from flask import Response, abort, request, send_file
+from werkzeug.security import safe_join
+
+from attachments import guess_mime_type
+from blobstore import BLOB_DIR, blob_path
+
+FILE_OFFLOAD = os.environ.get("FILE_OFFLOAD", "")
+NGINX_BLOB_PREFIX = os.environ.get("FILE_OFFLOAD_BLOB_PREFIX", "/_protected/blobs/")
+NGINX_STATIC_PREFIX = os.environ.get("FILE_OFFLOAD_STATIC_PREFIX", "/_protected/static/")
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def init_file_serving(app):
+    if FILE_OFFLOAD == 'sendfile':
+        app.config['USE_X_SENDFILE'] = True
+
+
+def _accel_redirect(internal_uri, mimetype, download_name, etag):
+    if etag and request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = internal_uri
+    if etag:
+        response.set_etag(etag)
+    if download_name:
+        response.headers.set('Content-Disposition', 'inline', filename=download_name)
+    return response
+
+
+def serve_file(path, internal_uri, mimetype=None, download_name=None, etag=None, immutable=False):
+    """
+    Respond with a file from disk.
+
+    Args:
+        path (str): Absolute path of the file.
+        internal_uri (str): Where the nginx internal location finds the same file.
+        mimetype (str): Content type, guessed from download_name or path if None.
+        download_name (str): File name sent in Content-Disposition.
+        etag (str): Strong ETag (the content hash); derived from mtime/size if None.
+        immutable (bool): The URL always names the same bytes, cache it for a year.
+    """
+    if not os.path.isfile(path):
+        abort(404)
+    mimetype = mimetype or guess_mime_type(download_name or path)
+
+    if FILE_OFFLOAD == 'nginx':
+        response = _accel_redirect(internal_uri, mimetype, download_name, etag)
+    else:
+        response = send_file(path, mimetype=mimetype, download_name=download_name,
+                             etag=etag or True, conditional=True)
+
+    if immutable:
+        response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        # Named URLs can be re-pointed at new content; revalidate with the ETag
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def serve_blob(sha256, mimetype=None, download_name=None, immutable=False):
+    relative = os.path.relpath(blob_path(sha256), BLOB_DIR).replace(os.sep, '/')
+    return serve_file(blob_path(sha256), NGINX_BLOB_PREFIX + relative, mimetype, download_name,
+                      etag=sha256, immutable=immutable)
+
+
+def serve_static(static_folder, *parts):
+    """Serve a legacy file stored by name under static/"""
+    relative = safe_join(*parts)
+    if relative is None:
+        abort(404)
+    path = safe_join(static_folder, relative)
+    if path is None:
+        abort(404)
+    return serve_file(path, NGINX_STATIC_PREFIX + relative, download_name=parts[-1])
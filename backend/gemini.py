@@ -8,11 +8,15 @@ from google.genai import types
 
 from dotenv import load_dotenv
 
+from llm_client import LLMClient, http_options
+
 load_dotenv()
 
 client = genai.Client(
     api_key=os.environ.get("GEMINI_API_KEY"),
+    http_options=http_options(),
 )
+llm = LLMClient(client)
 
 def ai_chat(system_prompt, user_prompt, file_attachments=None, temp=0):
     """
@@ -79,7 +83,7 @@ def ai_chat(system_prompt, user_prompt, file_attachments=None, temp=0):
         ],
     )
 
-    response = client.models.generate_content(
+    response = llm.generate_content(
         model=model,
         contents=contents,
         config=generate_content_config,
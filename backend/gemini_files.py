@@ -0,0 +1,117 @@
+import io
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from google.genai import types
+
+# Gemini keeps uploaded files for 48 hours; treat a handle as expired a bit
+# early so it never lapses between lookup and the generate call.
+FILE_TTL = timedelta(hours=48)
+EXPIRY_MARGIN = timedelta(minutes=int(os.environ.get("GEMINI_FILES_EXPIRY_MARGIN_MIN", 60)))
+# Give up on a file Gemini is still processing after this long
+PROCESSING_TIMEOUT_SECONDS = float(os.environ.get("GEMINI_FILES_PROCESSING_TIMEOUT", 300))
+
+
+class DocumentRegistry:
+    """
+    Uploads bid documents to the Gemini Files API once and reuses the handle.
+
+    Handles are keyed by content hash and stored in MongoDB together with
+    their expiry, so every agent of an evaluation, later re-evaluations and
+    other worker processes share a single upload. Expired or missing
+    handles are uploaded again transparently. Files API calls go through the
+    LLMClient, so they are paced, retried and stopped by an open breaker like
+    model calls.
+    """
+
+    def __init__(self, llm, collection, min_bytes=0, processing_timeout=PROCESSING_TIMEOUT_SECONDS):
+        self.llm = llm
+        self.client = llm.client
+        self.collection = collection
+        self.min_bytes = min_bytes
+        self.processing_timeout = processing_timeout
+        self._locks = {}  # sha256 -> [lock, holders and waiters]
+        self._locks_guard = threading.Lock()
+
+    @contextmanager
+    def _locked(self, sha256):
+        # One lock per sha256 while anyone holds or waits for it; the last
+        # one out drops it so the map doesn't grow for the life of the process
+        with self._locks_guard:
+            entry = self._locks.setdefault(sha256, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._locks_guard:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[sha256]
+
+    def _is_fresh(self, record):
+        expires_at = record.get('expires_at')
+        if not expires_at:
+            return False
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        return expires_at - EXPIRY_MARGIN > datetime.now(timezone.utc)
+
+    def _upload(self, attachment):
+        config = types.UploadFileConfig(mime_type=attachment.mime_type, display_name=attachment.sha256)
+        # A fresh stream per attempt, since a failed attempt may have read it
+        uploaded = self.llm.call(lambda: self.client.files.upload(file=io.BytesIO(attachment.data), config=config))
+        # Large PDFs are processed asynchronously before they can be used
+        deadline = time.monotonic() + self.processing_timeout
+        while uploaded.state == types.FileState.PROCESSING:
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Gemini still processing file {attachment.sha256} "
+                                   f"after {self.processing_timeout:.0f}s")
+            time.sleep(1)
+            uploaded = self.llm.call(self.client.files.get, name=uploaded.name)
+        if uploaded.state == types.FileState.FAILED:
+            raise RuntimeError(f"Gemini could not process file {attachment.sha256}")
+
+        now = datetime.now(timezone.utc)
+        record = {
+            'sha256': attachment.sha256,
+            'name': uploaded.name,
+            'uri': uploaded.uri,
+            'mime_type': attachment.mime_type,
+            'size': attachment.size,
+            'uploaded_at': now,
+            'expires_at': uploaded.expiration_time or now + FILE_TTL,
+        }
+        self.collection.update_one(
+            {'sha256': attachment.sha256},
+            {'$set': record},
+            upsert=True
+        )
+        return record
+
+    def get_record(self, attachment):
+        """Return a live file record for the attachment, uploading it if needed."""
+        with self._locked(attachment.sha256):
+            record = self.collection.find_one({'sha256': attachment.sha256}, {'_id': 0})
+            if record and self._is_fresh(record):
+                return record
+            return self._upload(attachment)
+
+    def invalidate(self, sha256):
+        """Forget a handle so the next lookup uploads the document again."""
+        self.collection.delete_one({'sha256': sha256})
+
+    def part_for(self, attachment):
+        """
+        Build the types.Part an agent should send for this attachment.
+
+        Small attachments (below min_bytes) are inlined; everything else is
+        referenced by its Files API URI.
+        """
+        if attachment.size < self.min_bytes:
+            return attachment.to_part()
+        record = self.get_record(attachment)
+        return types.Part.from_uri(file_uri=record['uri'], mime_type=record['mime_type'])
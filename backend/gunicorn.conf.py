@@ -0,0 +1,104 @@
+"""
+Production server configuration.
+
+    gunicorn -c gunicorn.conf.py
+
+Runs `server:create_app()` in one process per CPU, each with a pool of
+threads (the routes mostly wait on MongoDB and file I/O). Every setting can
+be overridden from the environment:
+
+    PORT                        Listen port (8080)
+    WEB_CONCURRENCY             Worker processes (usable CPUs)
+    GUNICORN_THREADS            Threads per worker (8)
+    GUNICORN_TIMEOUT            Seconds a worker may stay silent before it is restarted (120)
+    GUNICORN_GRACEFUL_TIMEOUT   Seconds a worker gets to finish on shutdown (90)
+    GUNICORN_KEEPALIVE          Idle keep-alive seconds; keep above the load balancer's idle timeout (75)
+    GUNICORN_MAX_REQUESTS       Recycle a worker after this many requests, 0 never (2000)
+    FORWARDED_ALLOW_IPS         Proxies trusted for X-Forwarded-* headers (127.0.0.1)
+
+Evaluations are processed by `python worker.py`. With
+EVAL_INPROCESS_WORKERS > 0 each worker process also runs an evaluation
+worker, and the Gemini rate budget is split between the processes; on
+shutdown its running evaluations get until shortly before the master's
+kill deadline to finish and the rest are handed back to the queue for
+another process to resume.
+
+With more than one worker the response cache defaults to the shared Mongo
+backend (RESPONSE_CACHE_BACKEND=mongo) so an invalidation reaches them all.
+"""
+import os
+import signal
+import time
+
+
+def _cpu_count():
+    # Respect the CPU affinity / container limits rather than the host's CPUs
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+wsgi_app = 'server:create_app()'
+bind = f"0.0.0.0:{os.environ.get('PORT', 8080)}"
+
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', _cpu_count()))
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 90))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 75))
+
+# Bound slow growth (caches, fragmentation) without restarting every worker at once
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = max_requests // 10
+
+# Workers see each other's cache invalidations only through the shared backend
+if workers > 1:
+    os.environ.setdefault('RESPONSE_CACHE_BACKEND', 'mongo')
+
+# In-process evaluation workers share GEMINI_RPM instead of each using all of it
+if int(os.environ.get('EVAL_INPROCESS_WORKERS', 0)) > 0:
+    os.environ.setdefault('GEMINI_PROCESSES', str(workers))
+
+# The app must be created in each worker after the fork: MongoClient,
+# the genai HTTP client and the evaluation worker threads are not fork-safe
+preload_app = False
+
+forwarded_allow_ips = os.environ.get('FORWARDED_ALLOW_IPS', '127.0.0.1')
+accesslog = '-'
+errorlog = '-'
+# Request id and total time (microseconds) next to the usual fields
+access_log_format = '%(h)s "%(r)s" %(s)s %(b)s %(D)sus rid=%({x-request-id}o)s'
+
+
+def post_worker_init(worker):
+    """Note when shutdown starts; the master kills the worker graceful_timeout after that."""
+    def stamped(handler):
+        def handle(sig, frame):
+            if not hasattr(worker, 'shutdown_started'):
+                worker.shutdown_started = time.monotonic()
+            handler(sig, frame)
+        return handle
+
+    for sig, handler in ((signal.SIGTERM, worker.handle_exit), (signal.SIGQUIT, worker.handle_quit),
+                         (signal.SIGINT, worker.handle_quit)):
+        signal.signal(sig, stamped(handler))
+    signal.siginterrupt(signal.SIGTERM, False)
+
+
+def worker_exit(server, worker):
+    """Drain the in-process evaluation worker before the process goes away."""
+    app = getattr(worker, 'wsgi', None)
+    extensions = getattr(app, 'extensions', None)
+    if not extensions or 'eval_worker' not in extensions:
+        return
+    from server import stop_eval_worker
+
+    # Finishing in-flight requests already used part of the graceful timeout;
+    # leave 10s before the master's SIGKILL to hand unfinished jobs back
+    started = getattr(worker, 'shutdown_started', time.monotonic())
+    drain = max(0, started + graceful_timeout - 10 - time.monotonic())
+    server.log.info("Worker %s draining evaluations for up to %.0fs", worker.pid, drain)
+    stop_eval_worker(app, timeout=drain)
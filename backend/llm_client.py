@@ -0,0 +1,266 @@
+"""
+Resilient wrapper around the Gemini client.
+
+Every Gemini call in the process (models, files, caches) goes through
+`LLMClient`, which:
+
+* paces calls with a shared token bucket (GEMINI_RPM / GEMINI_BURST),
+* caps calls in flight with a shared semaphore (LLM_MAX_CONCURRENCY),
+  both split evenly between the GEMINI_PROCESSES processes that call Gemini,
+* retries 429/5xx and transport errors with jittered exponential backoff,
+  waiting at least as long as the server's Retry-After / retryDelay,
+* gives up once the call's deadline (LLM_DEADLINE_SECONDS) would be passed,
+  including while queueing for the rate limiter or a free slot,
+* trips a circuit breaker after LLM_BREAKER_FAILURES consecutive upstream
+  failures; while it is open calls fail fast with CircuitOpenError and the
+  evaluation workers stop claiming jobs (see EvaluationWorker's `paused`).
+
+Time spent queueing and upstream, and retries, are added to the active
+eval_metrics trace.
+
+Per-request socket timeouts are set on the genai client itself with
+`http_options()`.
+"""
+import logging
+import os
+import random
+import re
+import threading
+import time
+
+import httpx
+from google.genai import errors, types
+
+import eval_metrics
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = (408, 429, 500, 502, 503, 504)
+
+REQUEST_TIMEOUT_SECONDS = float(os.environ.get("LLM_REQUEST_TIMEOUT_SECONDS", 120))
+DEADLINE_SECONDS = float(os.environ.get("LLM_DEADLINE_SECONDS", 300))
+MAX_ATTEMPTS = int(os.environ.get("LLM_MAX_ATTEMPTS", 5))
+BACKOFF_BASE_SECONDS = float(os.environ.get("LLM_BACKOFF_BASE_SECONDS", 2))
+BACKOFF_MAX_SECONDS = float(os.environ.get("LLM_BACKOFF_MAX_SECONDS", 60))
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the upstream while the circuit breaker is open."""
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket used to pace outbound calls to a rate-limited API.
+
+    Tokens refill continuously at `rate` per second up to `capacity`; each
+    `acquire()` takes one token, blocking until one is available.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens=1, timeout=None):
+        """
+        Block until `tokens` are available, then consume them.
+
+        Returns:
+            bool: False, without consuming, if they can't be had within `timeout` seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and stays open for
+    `reset_seconds`; then one trial call is let through (half-open), which
+    closes the breaker on success or reopens it on failure.
+    """
+
+    def __init__(self, failure_threshold=5, reset_seconds=60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def remaining(self):
+        """Seconds until the breaker lets a trial call through (0 when closed)."""
+        with self._lock:
+            if self._opened_at is None:
+                return 0.0
+            return max(0.0, self._opened_at + self.reset_seconds - time.monotonic())
+
+    def is_open(self):
+        return self.remaining() > 0
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() < self._opened_at + self.reset_seconds or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._trial_running:
+                    logger.warning("circuit open after %d consecutive failures", self._failures)
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+
+# GEMINI_RPM, GEMINI_BURST and LLM_MAX_CONCURRENCY are budgets for the whole
+# deployment; each of the GEMINI_PROCESSES processes calling Gemini gets its share
+GEMINI_PROCESSES = max(1, int(os.environ.get("GEMINI_PROCESSES", 1)))
+
+# Shared by every LLMClient in the process
+gemini_rate_limiter = TokenBucket(
+    rate=float(os.environ.get("GEMINI_RPM", 15)) / 60 / GEMINI_PROCESSES,
+    capacity=max(1, int(os.environ.get("GEMINI_BURST", 4)) // GEMINI_PROCESSES),
+)
+gemini_semaphore = threading.BoundedSemaphore(
+    max(1, int(os.environ.get("LLM_MAX_CONCURRENCY", 8)) // GEMINI_PROCESSES)
+)
+gemini_breaker = CircuitBreaker(
+    failure_threshold=int(os.environ.get("LLM_BREAKER_FAILURES", 5)),
+    reset_seconds=float(os.environ.get("LLM_BREAKER_RESET_SECONDS", 60)),
+)
+
+
+def http_options(timeout_seconds=REQUEST_TIMEOUT_SECONDS):
+    """HttpOptions for genai.Client: request timeout and optional GEMINI_BASE_URL (e.g. a fake server)."""
+    options = {'timeout': int(timeout_seconds * 1000)}
+    if os.environ.get("GEMINI_BASE_URL"):
+        options['base_url'] = os.environ["GEMINI_BASE_URL"]
+    return types.HttpOptions(**options)
+
+
+def _header(error, name):
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    return headers.get(name) if headers is not None else None
+
+
+def retry_after_seconds(error):
+    """Delay the server asked for, from Retry-After or a google.rpc.RetryInfo detail."""
+    value = _header(error, 'retry-after')
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    details = getattr(error, 'details', None)
+    if isinstance(details, dict):
+        for detail in details.get('error', {}).get('details', []) or []:
+            delay = isinstance(detail, dict) and detail.get('retryDelay')
+            match = re.fullmatch(r'([\d.]+)s', delay or '')
+            if match:
+                return float(match.group(1))
+    return None
+
+
+def is_retryable(error):
+    if isinstance(error, errors.APIError):
+        return error.code in RETRYABLE_STATUS
+    return isinstance(error, (httpx.TimeoutException, httpx.TransportError, TimeoutError, ConnectionError))
+
+
+class LLMClient:
+    """
+    Args:
+        client: genai.Client (or FakeGenaiClient).
+        rate_limiter (TokenBucket): Paces calls; shared default.
+        semaphore (threading.Semaphore): Bounds calls in flight; shared default.
+        breaker (CircuitBreaker): Shared default.
+        deadline_seconds (float): Total time a call may take including retries.
+        max_attempts (int): Attempts per call.
+    """
+
+    def __init__(self, client, rate_limiter=None, semaphore=None, breaker=None,
+                 deadline_seconds=DEADLINE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        self.client = client
+        self.rate_limiter = rate_limiter or gemini_rate_limiter
+        self.semaphore = semaphore or gemini_semaphore
+        self.breaker = breaker or gemini_breaker
+        self.deadline_seconds = deadline_seconds
+        self.max_attempts = max_attempts
+
+    def backoff(self, attempt, error):
+        delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempt - 1)))
+        return max(delay, retry_after_seconds(error) or 0)
+
+    def call(self, fn, *args, **kwargs):
+        """
+        Run fn(*args, **kwargs) against the upstream with pacing, bounded
+        concurrency, retries and the circuit breaker.
+        """
+        deadline = time.monotonic() + self.deadline_seconds
+        for attempt in range(1, self.max_attempts + 1):
+            # Fail fast without queueing on the limiter while the upstream is down
+            if self.breaker.is_open():
+                raise CircuitOpenError(f"Gemini circuit open for another {self.breaker.remaining():.0f}s")
+            waiting = time.monotonic()
+            paced = self.rate_limiter.acquire(timeout=max(0.0, deadline - time.monotonic()))
+            acquired = paced and self.semaphore.acquire(timeout=max(0.0, deadline - time.monotonic()))
+            eval_metrics.add('wait_seconds', time.monotonic() - waiting)
+            if not paced:
+                raise TimeoutError("Deadline passed waiting for the Gemini rate limit")
+            if not acquired:
+                raise TimeoutError("Deadline passed waiting for a free Gemini slot")
+            try:
+                if not self.breaker.allow():
+                    raise CircuitOpenError(f"Gemini circuit open for another {self.breaker.remaining():.0f}s")
+                started = time.monotonic()
+                try:
+                    result = fn(*args, **kwargs)
+                except Exception as e:
+                    eval_metrics.add('model_seconds', time.monotonic() - started)
+                    if not is_retryable(e):
+                        # The upstream answered; the request itself was bad
+                        self.breaker.record_success()
+                        raise
+                    self.breaker.record_failure()
+                    delay = self.backoff(attempt, e)
+                    if attempt == self.max_attempts or time.monotonic() + delay > deadline:
+                        raise
+                    logger.warning("attempt %d/%d failed (%s), retrying in %.1fs", attempt, self.max_attempts, e, delay)
+                    eval_metrics.add('llm_retries')
+                else:
+                    eval_metrics.add('model_seconds', time.monotonic() - started)
+                    self.breaker.record_success()
+                    return result
+            finally:
+                self.semaphore.release()
+            time.sleep(delay)
+
+    def generate_content(self, **kwargs):
+        return self.call(self.client.models.generate_content, **kwargs)
@@ -0,0 +1,187 @@
+"""
+Local text, table and layout extraction for bid PDFs.
+
+Each attachment is parsed once per content hash and the result cached in the
+`document_extracts` collection:
+
+    {
+        "sha256": "...", "version": 1, "page_count": 2,
+        "pages": [
+            {"number": 1, "width": 595.0, "height": 842.0, "text": "...",
+             "tables": [{"bbox": [x0, top, x1, bottom], "rows": [["a", "b"], ...]}],
+             "ocr": false},
+            ...
+        ],
+        "error": null, "extracted_at": <datetime>
+    }
+
+so the agents can be sent compact text instead of the raw PDF. Parsing uses
+pdfplumber; pages without a text layer are OCRed only when pytesseract (and
+the tesseract binary) is installed. Without pdfplumber nothing is extracted
+and the evaluator keeps sending the files themselves.
+"""
+import io
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from pymongo.errors import DocumentTooLarge
+
+try:
+    import pdfplumber
+except ImportError:
+    pdfplumber = None
+
+try:
+    import pytesseract
+except ImportError:
+    pytesseract = None
+
+# Bump when the extraction output changes so cached results are redone
+EXTRACTOR_VERSION = 1
+OCR_RESOLUTION = int(os.environ.get("PDF_OCR_DPI", 200))
+# Pages with less text than this are treated as scanned images
+MIN_PAGE_CHARS = 20
+
+
+def available():
+    return pdfplumber is not None
+
+
+def _ocr_page(page):
+    image = page.to_image(resolution=OCR_RESOLUTION).original
+    return pytesseract.image_to_string(image)
+
+
+def extract_pdf(data):
+    """
+    Extract every page of a PDF.
+
+    Returns:
+        list: One dict per page with number, size, text, tables and whether it was OCRed.
+    """
+    pages = []
+    with pdfplumber.open(io.BytesIO(data)) as pdf:
+        for number, page in enumerate(pdf.pages, start=1):
+            text = page.extract_text() or ''
+            tables = [{'bbox': list(table.bbox), 'rows': table.extract()} for table in page.find_tables()]
+            ocr = False
+            if len(text.strip()) < MIN_PAGE_CHARS and page.images and pytesseract is not None:
+                text = _ocr_page(page)
+                ocr = True
+            pages.append({
+                'number': number,
+                'width': float(page.width),
+                'height': float(page.height),
+                'text': text,
+                'tables': tables,
+                'ocr': ocr,
+            })
+            # Release the parsed page objects; long bids would otherwise keep them all
+            page.close()
+    return pages
+
+
+def is_complete(extract):
+    """Whether the text captures every page, i.e. no page is left as an unread image."""
+    pages = extract.get('pages') or []
+    return bool(pages) and all(len(page['text'].strip()) >= MIN_PAGE_CHARS for page in pages)
+
+
+def render_pages(extract, name, page_numbers=None):
+    """
+    Render extracted pages as compact text for a prompt.
+
+    Args:
+        extract (dict): Result of DocumentExtractor.get.
+        name (str): Document name shown in the page headers.
+        page_numbers (iterable): Only these pages (all pages if None).
+    """
+    wanted = set(page_numbers) if page_numbers is not None else None
+    lines = []
+    for page in extract.get('pages') or []:
+        if wanted is not None and page['number'] not in wanted:
+            continue
+        lines.append(f"=== {name} - page {page['number']} of {extract['page_count']} ===")
+        lines.append(page['text'].strip())
+        for table in page['tables']:
+            lines.append("[table]")
+            for row in table['rows']:
+                lines.append(" | ".join('' if cell is None else str(cell).replace('\n', ' ') for cell in row))
+    return "\n".join(lines)
+
+
+class DocumentExtractor:
+    """
+    Extract PDFs once per content hash and share the result.
+
+    Results are kept in a small in-process LRU in front of the Mongo
+    collection, and concurrent agents asking for the same document wait for
+    a single extraction.
+    """
+
+    def __init__(self, collection, memory_entries=64):
+        self.collection = collection
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()  # sha256 -> extract
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _remember(self, sha256, extract):
+        with self._lock:
+            self._memory[sha256] = extract
+            self._memory.move_to_end(sha256)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _cached(self, sha256):
+        with self._lock:
+            extract = self._memory.get(sha256)
+            if extract is not None:
+                self._memory.move_to_end(sha256)
+                return extract
+        extract = self.collection.find_one({'sha256': sha256, 'version': EXTRACTOR_VERSION}, {'_id': 0})
+        if extract is not None:
+            self._remember(sha256, extract)
+        return extract
+
+    def get(self, attachment):
+        """
+        Return the extract of a PDF attachment, or None if it is not a PDF,
+        pdfplumber is missing or the file could not be parsed.
+        """
+        if not available() or attachment.mime_type != 'application/pdf':
+            return None
+
+        extract = self._cached(attachment.sha256)
+        if extract is None:
+            with self._lock:
+                lock = self._locks.setdefault(attachment.sha256, threading.Lock())
+            with lock:
+                extract = self._cached(attachment.sha256)
+                if extract is None:
+                    extract = self._extract(attachment)
+            with self._lock:
+                self._locks.pop(attachment.sha256, None)
+        return extract if not extract.get('error') else None
+
+    def _extract(self, attachment):
+        extract = {'sha256': attachment.sha256, 'version': EXTRACTOR_VERSION, 'extracted_at': datetime.utcnow()}
+        try:
+            pages = extract_pdf(attachment.data)
+            extract.update({'page_count': len(pages), 'pages': pages, 'error': None})
+        except Exception as e:
+            # Remember the failure too, so broken files are not parsed on every evaluation
+            print(f"PDF EXTRACT : could not parse {attachment.sha256}: {e}")
+            extract.update({'page_count': 0, 'pages': None, 'error': str(e)})
+
+        try:
+            self.collection.replace_one(
+                {'sha256': attachment.sha256, 'version': EXTRACTOR_VERSION}, extract, upsert=True
+            )
+        except DocumentTooLarge:
+            print(f"PDF EXTRACT : extract of {attachment.sha256} too large to cache, kept in memory only")
+        extract.pop('_id', None)
+        self._remember(attachment.sha256, extract)
+        return extract
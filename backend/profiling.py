@@ -0,0 +1,266 @@
+"""
+Request-level profiling for the API.
+
+`init_profiling(app)` wraps the WSGI app in ProfilingMiddleware, which
+
+* gives every request an id (the incoming X-Request-ID, or a new one) and
+  returns it in the X-Request-ID response header,
+* records latency per method, route rule and status in histograms, together
+  with the MongoDB time and command count of the request (from the shared
+  client's CommandMetrics), and logs requests slower than SLOW_REQUEST_MS,
+* with PROFILE_SLOW_MS set, samples the stacks of in-flight requests every
+  PROFILE_INTERVAL_MS and writes the samples of requests slower than the
+  threshold to PROFILE_DIR as collapsed stacks (flamegraph.pl / speedscope).
+
+Latency is measured until the response body has been fully sent, so
+streamed listings are timed in full. `render_metrics` exposes everything,
+with the Mongo pool and per-command counters, in Prometheus text format
+(GET /metrics).
+"""
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from flask import request
+
+from database import command_metrics, pool_stats
+
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", 1000))
+PROFILE_SLOW_MS = float(os.environ.get("PROFILE_SLOW_MS", 0))
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", 10))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles'))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a label tuple, Prometheus style."""
+
+    def __init__(self, name, help_text, label_names, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # labels -> [bucket counts..., count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.setdefault(labels, [0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labels, values in sorted(series.items()):
+            base = _labels(self.label_names, labels)
+            for bound, count in zip(self.buckets, values):
+                lines.append(f'{self.name}_bucket{{{base}le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{base}le="+Inf"}} {values[-2]}')
+            lines.append(f"{self.name}_count{{{base.rstrip(',')}}} {values[-2]}")
+            lines.append(f"{self.name}_sum{{{base.rstrip(',')}}} {values[-1]}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    return ''.join(f'{name}="{_escape(value)}",' for name, value in zip(names, values))
+
+
+request_seconds = Histogram(
+    'texora_http_request_duration_seconds', 'Time to handle a request, body included.',
+    ('method', 'route', 'status'),
+)
+request_mongo_seconds = Histogram(
+    'texora_http_request_mongo_seconds', 'MongoDB time spent per request.',
+    ('method', 'route'),
+)
+request_mongo_commands = Histogram(
+    'texora_http_request_mongo_commands', 'MongoDB commands issued per request.',
+    ('method', 'route'), buckets=(0, 1, 2, 5, 10, 25, 50, 100, 250),
+)
+
+
+class StackSampler:
+    """
+    Samples the Python stack of registered threads on one background thread.
+
+    Cheap enough to leave on: nothing is kept for requests that turn out
+    fast, and the sampler only runs while a request is in flight.
+    """
+
+    def __init__(self, interval_seconds):
+        self.interval = interval_seconds
+        self._samples = {}  # thread id -> Counter of collapsed stacks
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self, thread_id):
+        with self._lock:
+            self._samples[thread_id] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self, thread_id):
+        with self._lock:
+            return self._samples.pop(thread_id, Counter())
+
+    def _run(self):
+        while True:
+            with self._lock:
+                watched = list(self._samples)
+            if not watched:
+                self._wake.clear()
+                self._wake.wait()
+                continue
+            frames = sys._current_frames()
+            for thread_id in watched:
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                entries = []
+                while frame is not None:
+                    entries.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                stack = ';'.join(reversed(entries))
+                with self._lock:
+                    if thread_id in self._samples:
+                        self._samples[thread_id][stack] += 1
+            time.sleep(self.interval)
+
+
+def _write_profile(request_id, label, samples):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{int(time.time())}-{request_id}.folded")
+    with open(path, 'w') as out:
+        for stack, count in samples.items():
+            out.write(f"{stack} {count}\n")
+    hottest = ', '.join(stack.rsplit(';', 1)[-1] for stack, _ in samples.most_common(3))
+    print(f"PROFILE : {label} profile written to {path} (hottest: {hottest})")
+
+
+class ProfilingMiddleware:
+    def __init__(self, wsgi_app, sampler=None):
+        self.wsgi_app = wsgi_app
+        self.sampler = sampler
+
+    def __call__(self, environ, start_response):
+        request_id = environ.get('HTTP_X_REQUEST_ID') or uuid.uuid4().hex
+        environ['texora.request_id'] = request_id
+        started = time.perf_counter()
+        status_holder = {}
+        thread_id = threading.get_ident()
+        command_metrics.begin(request_id)
+        if self.sampler is not None:
+            self.sampler.start(thread_id)
+
+        def _start_response(status, headers, exc_info=None):
+            status_holder['status'] = status.split(' ', 1)[0]
+            headers = [(name, value) for name, value in headers if name.lower() != 'x-request-id']
+            headers.append(('X-Request-ID', request_id))
+            return start_response(status, headers, exc_info)
+
+        def finish():
+            seconds = time.perf_counter() - started
+            tally = command_metrics.end() or {'commands': 0, 'seconds': 0.0}
+            samples = self.sampler.stop(thread_id) if self.sampler is not None else None
+            method = environ.get('REQUEST_METHOD', '')
+            route = environ.get('texora.route', 'unmatched')
+            status = status_holder.get('status', '500')
+            request_seconds.observe((method, route, status), seconds)
+            request_mongo_seconds.observe((method, route), tally['seconds'])
+            request_mongo_commands.observe((method, route), tally['commands'])
+
+            label = f"{method} {environ.get('PATH_INFO', '')} {status} [{request_id}]"
+            if seconds * 1000 >= SLOW_REQUEST_MS:
+                print(f"PROFILE : slow request {label} took {seconds * 1000:.0f}ms, "
+                      f"mongo {tally['seconds'] * 1000:.0f}ms in {tally['commands']} commands")
+            if samples and seconds * 1000 >= PROFILE_SLOW_MS:
+                try:
+                    _write_profile(request_id, label, samples)
+                except OSError as e:
+                    print(f"PROFILE : could not write profile for {label}: {e}")
+
+        try:
+            body = self.wsgi_app(environ, _start_response)
+        except Exception:
+            finish()
+            raise
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if isinstance(file_wrapper, type) and isinstance(body, file_wrapper):
+            # Wrapping would stop the server using sendfile(2); the transfer goes untimed
+            finish()
+            return body
+        return _ClosingIterator(body, finish)
+
+
+class _ClosingIterator:
+    """Passes the body through and runs `callback` once the server closes it."""
+
+    def __init__(self, body, callback):
+        self._body = body
+        self._callback = callback
+
+    def __iter__(self):
+        return iter(self._body)
+
+    def close(self):
+        try:
+            if hasattr(self._body, 'close'):
+                self._body.close()
+        finally:
+            callback, self._callback = self._callback, None
+            if callback is not None:
+                callback()
+
+
+def _record_route():
+    if request.url_rule is not None:
+        request.environ['texora.route'] = request.url_rule.rule
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for histogram in (request_seconds, request_mongo_seconds, request_mongo_commands):
+        lines += histogram.render()
+
+    commands = command_metrics.snapshot()
+    for metric, index, help_text in (
+        ('texora_mongo_commands_total', 0, 'MongoDB commands completed.'),
+        ('texora_mongo_command_seconds_total', 1, 'Time spent in MongoDB commands.'),
+        ('texora_mongo_command_failures_total', 2, 'MongoDB commands that failed.'),
+    ):
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+        lines += [f'{metric}{{command="{_escape(name)}"}} {values[index]}' for name, values in sorted(commands.items())]
+
+    try:
+        pool = pool_stats()
+    except Exception as e:
+        print(f"PROFILE : could not read pool stats: {e}")
+        pool = {}
+    for key, value in sorted(pool.items()):
+        kind = 'counter' if key.endswith('_total') else 'gauge'
+        lines += [f"# TYPE texora_mongo_pool_{key} {kind}", f"texora_mongo_pool_{key} {value}"]
+    return "\n".join(lines) + "\n"
+
+
+def init_profiling(app):
+    """Wrap the Flask app in the profiling middleware."""
+    sampler = StackSampler(PROFILE_INTERVAL_MS / 1000) if PROFILE_SLOW_MS > 0 else None
+    app.wsgi_app = ProfilingMiddleware(app.wsgi_app, sampler)
+    app.before_request(_record_route)
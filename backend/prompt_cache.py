@@ -0,0 +1,167 @@
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from google.genai import types
+
+from llm_client import CircuitOpenError
+
+CACHE_TTL_SECONDS = int(os.environ.get("GEMINI_CACHE_TTL_SECONDS", 3600))
+# Gemini rejects cached content below a model-specific token minimum
+# (model name prefix -> tokens, the longest matching prefix wins);
+# GEMINI_CACHE_MIN_TOKENS overrides the table.
+MODEL_MIN_TOKENS = {
+    "gemini-1.5-": 32768,
+    "gemini-2.0-": 4096,
+    "gemini-2.5-flash": 1024,
+    "gemini-2.5-pro": 4096,
+}
+DEFAULT_MIN_TOKENS = 4096
+# After a failed create, don't retry the same prompt for this long.
+FAILURE_COOLDOWN = timedelta(minutes=int(os.environ.get("GEMINI_CACHE_COOLDOWN_MIN", 30)))
+EXPIRY_MARGIN = timedelta(minutes=5)
+
+
+def min_cache_tokens(model):
+    """Smallest prompt, in tokens, that `model` accepts as cached content."""
+    if os.environ.get("GEMINI_CACHE_MIN_TOKENS"):
+        return int(os.environ["GEMINI_CACHE_MIN_TOKENS"])
+    prefixes = [prefix for prefix in MODEL_MIN_TOKENS if model.startswith(prefix)]
+    return MODEL_MIN_TOKENS[max(prefixes, key=len)] if prefixes else DEFAULT_MIN_TOKENS
+
+
+class PromptCache:
+    """
+    Gemini context caches for the per-tender part of each agent prompt.
+
+    The system prompt plus the rendered tender requirements are identical for
+    every bid on a tender, so they are stored once per (tender, agent) as a
+    cached-content entry and referenced by name from each generate call.
+    Entries are keyed by a digest of the prompt text, so changed requirements
+    get a fresh cache; they are shared across processes through MongoDB and
+    recreated shortly before their TTL runs out. When caching is not possible
+    (prompt too small, API error) `get` returns None and the caller sends the
+    prompt uncached.
+
+    Only the system prompt and requirements are cached; the bid's attachments
+    differ per call and are sent with it. Their size is measured with the
+    API's token counter against the model's minimum, once per prompt, and
+    prompts with fewer characters than that minimum are skipped without a call.
+    Token counts and cache creation go through the LLMClient like model calls.
+    """
+
+    def __init__(self, llm, collection, model, ttl_seconds=CACHE_TTL_SECONDS):
+        self.llm = llm
+        self.client = llm.client
+        self.collection = collection
+        self.model = model
+        self.ttl_seconds = ttl_seconds
+        self.min_tokens = min_cache_tokens(model)
+        self._entries = {}  # key -> (name, expires_at)
+        self._failed_until = {}  # key -> datetime
+        self._too_small = set()  # keys below the model's minimum
+        self._locks = {}  # key -> [lock, holders and waiters]
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self, key):
+        # One lock per key while anyone holds or waits for it; the last
+        # one out drops it so the map doesn't grow for the life of the process
+        with self._lock:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[key]
+
+    def _key(self, tender_id, agent_name, system_prompt, user_prompt):
+        digest = hashlib.sha256(f"{self.model}\0{system_prompt}\0{user_prompt}".encode()).hexdigest()[:16]
+        return f"{tender_id}:{agent_name}:{digest}"
+
+    def _fresh(self, expires_at):
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        return expires_at - EXPIRY_MARGIN > datetime.now(timezone.utc)
+
+    def _cacheable(self, system_prompt, user_prompt):
+        # A token spans at least one character, so a shorter prompt can't qualify
+        if len(system_prompt) + len(user_prompt) < self.min_tokens:
+            return False
+        # The Gemini API counts contents only, so the system prompt goes in as text
+        counted = self.llm.call(
+            self.client.models.count_tokens,
+            model=self.model,
+            contents=[types.Content(role="user", parts=[
+                types.Part.from_text(text=system_prompt), types.Part.from_text(text=user_prompt)])],
+        )
+        return counted.total_tokens >= self.min_tokens
+
+    def _create(self, key, system_prompt, user_prompt):
+        cached = self.llm.call(
+            self.client.caches.create,
+            model=self.model,
+            config=types.CreateCachedContentConfig(
+                display_name=key,
+                system_instruction=system_prompt,
+                contents=[types.Content(role="user", parts=[types.Part.from_text(text=user_prompt)])],
+                ttl=f"{self.ttl_seconds}s",
+            ),
+        )
+        expires_at = cached.expire_time or datetime.now(timezone.utc) + timedelta(seconds=self.ttl_seconds)
+        self.collection.update_one(
+            {'key': key},
+            {'$set': {'key': key, 'name': cached.name, 'model': self.model, 'expires_at': expires_at}},
+            upsert=True
+        )
+        return cached.name, expires_at
+
+    def get(self, tender_id, agent_name, system_prompt, user_prompt):
+        """
+        Return the cached-content name for this prompt, creating it if needed.
+
+        Returns:
+            str | None: The cache name, or None if the prompt must be sent uncached.
+        """
+        key = self._key(tender_id, agent_name, system_prompt, user_prompt)
+        if key in self._too_small:
+            return None
+        with self._locked(key):
+            entry = self._entries.get(key)
+            if entry and self._fresh(entry[1]):
+                return entry[0]
+            failed_until = self._failed_until.get(key)
+            if failed_until and failed_until > datetime.now(timezone.utc):
+                return None
+
+            try:
+                record = self.collection.find_one({'key': key})
+                if record and self._fresh(record['expires_at']):
+                    entry = (record['name'], record['expires_at'])
+                elif not self._cacheable(system_prompt, user_prompt):
+                    self._too_small.add(key)
+                    return None
+                else:
+                    entry = self._create(key, system_prompt, user_prompt)
+            except CircuitOpenError:
+                # The call itself will fail fast too; try caching again once it closes
+                return None
+            except Exception as e:
+                print(f"PROMPT CACHE : caching unavailable for {key}, sending uncached: {e}")
+                self._failed_until[key] = datetime.now(timezone.utc) + FAILURE_COOLDOWN
+                return None
+
+            self._entries[key] = entry
+            return entry[0]
+
+    def invalidate(self, name):
+        """Drop a cache entry that the API no longer recognises."""
+        with self._lock:
+            self._entries = {k: v for k, v in self._entries.items() if v[0] != name}
+        self.collection.delete_many({'name': name})
@@ -0,0 +1,169 @@
+"""
+Materialized per-tender leaderboard.
+
+`tender_rankings` holds one small document per submission:
+
+    {
+        "tender_id": "...", "bid_id": "...", "vendor_name": "...",
+        "total_score": 84.2, "scores": {"technical_score": 80, ...},
+        "current_stage": 1, "updated_at": <datetime>
+    }
+
+It is refreshed whenever a submission's scores or stage change, so ranking
+queries read K indexed documents instead of scanning and sorting every
+submission of the tender.
+"""
+import argparse
+import math
+from datetime import datetime
+
+from pymongo import ASCENDING, DESCENDING
+
+SCORE_FIELDS = ['verification_score', 'elegibility_score', 'technical_score', 'financial_score', 'legal_score']
+RANK_ORDER = [('total_score', DESCENDING), ('bid_id', ASCENDING)]
+
+
+def ranking_pipeline(match, updated_at='$$NOW'):
+    """Project the matching submissions into leaderboard rows."""
+    return [
+        {'$match': match},
+        {'$lookup': {
+            'from': 'vendors',
+            'localField': 'vendor_id',
+            'foreignField': 'vendor_id',
+            'as': 'vendor',
+        }},
+        {'$project': {
+            '_id': 0,
+            'tender_id': 1,
+            'bid_id': 1,
+            'vendor_name': {'$cond': [
+                {'$ne': [{'$ifNull': ['$bidder_name', '']}, '']},
+                '$bidder_name',
+                {'$arrayElemAt': ['$vendor.company_name', 0]},
+            ]},
+            'total_score': {'$ifNull': ['$evaluation_score', None]},
+            'scores': {field: {'$ifNull': [f'$evaluation.{field}', None]} for field in SCORE_FIELDS},
+            'current_stage': {'$ifNull': ['$current_stage', 0]},
+            'updated_at': updated_at,
+        }},
+    ]
+
+
+MERGE_STAGE = {'$merge': {'into': 'tender_rankings', 'on': 'bid_id', 'whenMatched': 'replace', 'whenNotMatched': 'insert'}}
+
+
+def merge_rankings(db, match):
+    """Write the leaderboard rows of the matching submissions."""
+    try:
+        db.submissions.aggregate(ranking_pipeline(match) + [MERGE_STAGE])
+    except NotImplementedError:
+        # mongomock has no $merge (or $$NOW); build the rows on the client
+        for row in db.submissions.aggregate(ranking_pipeline(match, {'$literal': datetime.utcnow()})):
+            db.tender_rankings.replace_one({'bid_id': row['bid_id']}, row, upsert=True)
+
+
+def refresh_ranking(db, bid_id):
+    """
+    Recompute the leaderboard entry of one submission from its current state.
+
+    The row is built from the submission by the server in one $merge, so two
+    refreshes racing on a bid cannot write back a state read before the other.
+    """
+    merge_rankings(db, {'bid_id': bid_id})
+    if not db.submissions.find_one({'bid_id': bid_id}, {'_id': 1}):
+        db.tender_rankings.delete_one({'bid_id': bid_id})
+
+
+def rebuild_rankings(db, tender_id=None):
+    """Backfill the leaderboard from the submissions collection (all tenders or one)."""
+    merge_rankings(db, {'tender_id': tender_id} if tender_id else {})
+
+
+def stage_filter(stage):
+    """Stages are stored as ints or strings; match either spelling."""
+    try:
+        return {'$in': [int(stage), str(stage)]}
+    except (TypeError, ValueError):
+        return stage
+
+
+def bids_below(db, query, score):
+    """Number of ranked bids matching `query` that score strictly below `score`."""
+    if score is None:
+        return 0
+    return db.tender_rankings.count_documents({**query, 'total_score': {'$lt': score}})
+
+
+def percentile(below, total):
+    """Share of bids a bid scores above; tied bids share a percentile."""
+    return round(100.0 * below / total, 1) if total else None
+
+
+def top_rankings(db, tender_id, k=10, stage=None, offset=0):
+    """
+    Return the best `k` ranked bids of a tender, optionally within one stage.
+
+    Returns:
+        dict: total bids considered and the ranked rows with rank and percentile.
+    """
+    query = {'tender_id': tender_id}
+    if stage is not None:
+        query['current_stage'] = stage_filter(stage)
+
+    total = db.tender_rankings.count_documents(query)
+    rows = db.tender_rankings.find(query, {'_id': 0, 'updated_at': 0}).sort(RANK_ORDER).skip(offset).limit(k)
+
+    rankings = []
+    below = {}
+    for i, row in enumerate(rows, start=offset + 1):
+        score = row.get('total_score')
+        if score not in below:
+            below[score] = bids_below(db, query, score)
+        row['rank'] = i
+        row['percentile'] = percentile(below[score], total)
+        rankings.append(row)
+    return {'tender_id': tender_id, 'total': total, 'rankings': rankings}
+
+
+def top_percent(db, tender_id, percent, stage=None):
+    """Bids in the top `percent` of a tender (e.g. 10 for the top 10%)."""
+    query = {'tender_id': tender_id}
+    if stage is not None:
+        query['current_stage'] = stage_filter(stage)
+    total = db.tender_rankings.count_documents(query)
+    return top_rankings(db, tender_id, k=max(1, math.ceil(total * percent / 100.0)), stage=stage)
+
+
+def bid_percentile(db, tender_id, bid_id):
+    """
+    Exact rank and percentile of one bid, counting bids it scores above.
+
+    Returns:
+        dict | None: rank, percentile and score, or None if the bid is not ranked.
+    """
+    entry = db.tender_rankings.find_one({'tender_id': tender_id, 'bid_id': bid_id}, {'_id': 0, 'updated_at': 0})
+    if not entry:
+        return None
+
+    query = {'tender_id': tender_id}
+    total = db.tender_rankings.count_documents(query)
+    score = entry.get('total_score')
+    if score is None:
+        above = db.tender_rankings.count_documents({**query, 'total_score': {'$ne': None}})
+    else:
+        above = db.tender_rankings.count_documents({**query, 'total_score': {'$gt': score}})
+    entry['rank'] = above + 1
+    entry['percentile'] = percentile(bids_below(db, query, score), total)
+    entry['total'] = total
+    return entry
+
+
+if __name__ == '__main__':
+    from database import get_database
+
+    parser = argparse.ArgumentParser(description="Rebuild the tender_rankings leaderboard")
+    parser.add_argument('tender_id', nargs='?', help="Only rebuild this tender")
+    args = parser.parse_args()
+    rebuild_rankings(get_database(), args.tender_id)
+    print("RANKINGS : rebuild complete")
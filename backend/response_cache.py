@@ -0,0 +1,135 @@
+"""
+Cache of pre-serialized JSON responses for hot, rarely changing listings.
+
+A cached entry is the exact response body plus its ETag, so a hit costs no
+database query and no JSON encoding, and clients that send If-None-Match
+get a 304. Writers call `invalidate` after changing the underlying data.
+
+Backends:
+    memory - per process; other processes see changes within the TTL.
+    mongo  - shared through the `response_cache` collection, so an
+             invalidation is seen by every worker immediately.
+Pick one with RESPONSE_CACHE_BACKEND. Without it the backend is mongo when
+WEB_CONCURRENCY is above 1 and memory otherwise; gunicorn.conf.py sets
+RESPONSE_CACHE_BACKEND=mongo itself when it runs more than one worker.
+`uvicorn --workers N` is not visible to the app, so without WEB_CONCURRENCY
+or RESPONSE_CACHE_BACKEND each of its processes silently gets its own
+memory cache. RESPONSE_CACHE_TTL bounds staleness.
+"""
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from bson.binary import Binary
+from pymongo.errors import DuplicateKeyError
+
+CACHE_TTL_SECONDS = float(os.environ.get("RESPONSE_CACHE_TTL", 60))
+
+PORTAL_TENDERS_KEY = 'portal_tenders'
+
+
+class InProcessBackend:
+    def __init__(self):
+        self._entries = {}  # key -> (expires_at, etag, body)
+        self._generations = {}  # key -> number of invalidations
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            generation = self._generations.get(key, 0)
+        if entry and entry[0] > time.monotonic():
+            return (entry[1], entry[2]), generation
+        return None, generation
+
+    def set(self, key, etag, body, ttl, generation):
+        with self._lock:
+            if self._generations.get(key, 0) == generation:
+                self._entries[key] = (time.monotonic() + ttl, etag, body)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._generations[key] = self._generations.get(key, 0) + 1
+
+
+class MongoBackend:
+    def __init__(self, get_collection):
+        # Resolved lazily so the backend can be created before the DB client
+        self._get_collection = get_collection
+
+    def get(self, key):
+        doc = self._get_collection().find_one({'_id': key})
+        if not doc:
+            return None, 0
+        if doc.get('body') is not None and doc['expires_at'] > datetime.utcnow():
+            return (doc['etag'], bytes(doc['body'])), doc.get('generation', 0)
+        return None, doc.get('generation', 0)
+
+    def set(self, key, etag, body, ttl, generation):
+        try:
+            self._get_collection().update_one(
+                {'_id': key, 'generation': generation} if generation else
+                {'_id': key, 'generation': {'$in': [0, None]}},
+                {'$set': {'etag': etag, 'body': Binary(body), 'expires_at': datetime.utcnow() + timedelta(seconds=ttl)}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # Invalidated while building; the upsert found no matching generation
+            pass
+
+    def delete(self, key):
+        self._get_collection().update_one(
+            {'_id': key},
+            {'$inc': {'generation': 1}, '$unset': {'etag': '', 'body': '', 'expires_at': ''}},
+            upsert=True
+        )
+
+
+class ResponseCache:
+    """
+    Args:
+        backend: InProcessBackend, MongoBackend or anything with the same get/set/delete.
+        ttl (float): Seconds an entry may be served before it is rebuilt.
+
+    Every invalidation bumps the key's generation. A build only stores its
+    result if the generation is still the one it started from, so a build
+    that read the data before a write cannot cache the old bytes after the
+    write's invalidation.
+    """
+
+    def __init__(self, backend, ttl=CACHE_TTL_SECONDS):
+        self.backend = backend
+        self.ttl = ttl
+
+    def get_or_build(self, key, build):
+        """
+        Return (etag, body) for key, calling build() -> bytes on a miss.
+        """
+        entry, generation = self.backend.get(key)
+        if entry:
+            return entry
+        body = build()
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        self.backend.set(key, etag, body, self.ttl, generation)
+        return etag, body
+
+    def invalidate(self, key):
+        self.backend.delete(key)
+
+
+def default_backend():
+    # Several API processes only see each other's invalidations through Mongo
+    return 'mongo' if int(os.environ.get('WEB_CONCURRENCY', 1)) > 1 else 'memory'
+
+
+def make_cache():
+    if os.environ.get("RESPONSE_CACHE_BACKEND", default_backend()) == "mongo":
+        from database import get_database
+        return ResponseCache(MongoBackend(lambda: get_database().response_cache))
+    return ResponseCache(InProcessBackend())
+
+
+response_cache = make_cache()
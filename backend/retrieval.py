@@ -0,0 +1,122 @@
+"""
+Lexical page retrieval over extracted bid documents.
+
+Every page of a bid's extracted PDFs is indexed with BM25, each requirement
+of an agent is used as a query, and the best few pages per requirement are
+kept, so an agent reads the sections relevant to it instead of the whole
+bid. Everything runs in-process; there is no embedding model.
+"""
+import math
+import os
+import re
+from collections import Counter
+
+PAGES_PER_REQUIREMENT = int(os.environ.get("RETRIEVAL_PAGES_PER_REQUIREMENT", 2))
+MAX_PAGES = int(os.environ.get("RETRIEVAL_MAX_PAGES", 24))
+# Bids this short are sent whole; trimming them saves little and risks misses
+MIN_PAGES = int(os.environ.get("RETRIEVAL_MIN_PAGES", 8))
+
+K1 = 1.5
+B = 0.75
+
+TOKEN = re.compile(r'[a-z0-9]+(?:[.,/-][a-z0-9]+)*')
+STOPWORDS = frozenset(
+    "a an and any are as at be by for from has have in is it its must of on or shall should "
+    "that the their this to was were will with within not no all per".split()
+)
+
+
+def tokenize(text):
+    return [token for token in TOKEN.findall(text.lower()) if len(token) > 1 and token not in STOPWORDS]
+
+
+def requirement_queries(requirements):
+    """
+    Flatten a requirement structure into one query string per requirement.
+
+    Lists give one query per item; a dict gives one query per key holding
+    the key and everything below it (e.g. an SKU with its specs).
+    """
+    if isinstance(requirements, str):
+        return [requirements] if requirements.strip() else []
+    if isinstance(requirements, dict):
+        return [f"{key} {' '.join(requirement_queries(value))}".strip() for key, value in requirements.items()]
+    if isinstance(requirements, (list, tuple)):
+        return [query for item in requirements for query in requirement_queries(item)]
+    if requirements is None:
+        return []
+    return [str(requirements)]
+
+
+class PageIndex:
+    """
+    BM25 index over the pages of one bid's documents.
+
+    Args:
+        documents (list): (name, extract) pairs as returned by pdf_extract.
+    """
+
+    def __init__(self, documents):
+        self.pages = []  # (document index, page number, term counts, length)
+        document_frequency = Counter()
+        for doc_index, (_, extract) in enumerate(documents):
+            for page in extract.get('pages') or []:
+                text = page['text'] + ' ' + ' '.join(
+                    ' '.join('' if cell is None else str(cell) for cell in row)
+                    for table in page['tables'] for row in table['rows']
+                )
+                terms = Counter(tokenize(text))
+                self.pages.append((doc_index, page['number'], terms, sum(terms.values())))
+                document_frequency.update(terms.keys())
+
+        count = len(self.pages)
+        self.average_length = (sum(page[3] for page in self.pages) / count) if count else 0
+        self.idf = {
+            term: math.log(1 + (count - df + 0.5) / (df + 0.5))
+            for term, df in document_frequency.items()
+        }
+
+    def scores(self, query):
+        terms = set(tokenize(query))
+        results = []
+        for i, (_, _, counts, length) in enumerate(self.pages):
+            score = 0.0
+            norm = K1 * (1 - B + B * length / self.average_length) if self.average_length else K1
+            for term in terms:
+                tf = counts.get(term)
+                if tf:
+                    score += self.idf[term] * tf * (K1 + 1) / (tf + norm)
+            if score > 0:
+                results.append((score, i))
+        results.sort(reverse=True)
+        return results
+
+    def select(self, queries):
+        """
+        Pick the pages an agent needs for its requirement queries.
+
+        The first page of every document is always kept (it identifies the
+        bidder). Returns None when the bid is short enough to send whole.
+
+        Returns:
+            dict | None: {document index: sorted page numbers}
+        """
+        if len(self.pages) <= MIN_PAGES:
+            return None
+
+        chosen = {i for i, page in enumerate(self.pages) if page[1] == 1}
+        ranked = [self.scores(query)[:PAGES_PER_REQUIREMENT] for query in queries]
+        # Round-robin over requirements so every one gets its best page before
+        # any gets its second, until the page budget is spent
+        for rank in range(PAGES_PER_REQUIREMENT):
+            for hits in ranked:
+                if len(chosen) >= MAX_PAGES:
+                    break
+                if rank < len(hits):
+                    chosen.add(hits[rank][1])
+
+        selection = {}
+        for i in sorted(chosen):
+            doc_index, number = self.pages[i][0], self.pages[i][1]
+            selection.setdefault(doc_index, []).append(number)
+        return selection
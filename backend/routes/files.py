@@ -1,23 +1,43 @@
-import os
-from flask import Blueprint, send_from_directory, current_app, abort
+import re
+from flask import Blueprint, current_app, abort, request
+from database import get_db
+from blobstore import find_attachment
+from file_serving import serve_blob, serve_static
 
 files_bp = Blueprint('files', __name__)
 
-@files_bp.route('/tenders/<tender_id>/<filename>')
-def get_tender_file(tender_id, filename):
-    """Get a tender_file by id - from tender folder in static"""
-    directory = os.path.join(current_app.static_folder, 'tender', tender_id)
-    try:
-        return send_from_directory(directory, filename)
-    except FileNotFoundError:
+SHA256 = re.compile(r'[0-9a-f]{64}')
+
+def send_attachment(doc, filename, *legacy_parts):
+    """Serve an attachment from the blob store, or by name from its legacy folder under static"""
+    attachment = find_attachment(doc, filename)
+    if attachment and attachment.get('stored') == 'blob':
+        return serve_blob(attachment['sha256'], attachment.get('mime_type'), filename)
+    return serve_static(current_app.static_folder, *legacy_parts, filename)
+
+@files_bp.route('/blobs/<sha256>')
+def get_blob(sha256):
+    """Get a stored file by content hash; the URL never changes meaning, so it is cached as immutable"""
+    if not SHA256.fullmatch(sha256):
+        abort(404)
+    blob = get_db().blobs.find_one({'sha256': sha256, 'refcount': {'$gt': 0}}, {'_id': 0, 'mime_type': 1})
+    if not blob:
         abort(404)
+    return serve_blob(sha256, blob.get('mime_type'), request.args.get('name'), immutable=True)
+
+@files_bp.route('/tenders/<tender_id>/files/<filename>')
+def get_tender_file(tender_id, filename):
+    """Get a tender_file by id - from the blob store or the tender folder in static"""
+    tender = get_db().tenders.find_one({'tender_id': tender_id}, {'_id': 0, 'attachments': 1})
+    return send_attachment(tender, filename, 'tender', tender_id)
+
+# URLs of attachments recorded before tender files got their own segment.
+# Routes such as /tenders/<id>/submissions take precedence over it, so files
+# named like them are only reachable under /files/.
+files_bp.add_url_rule('/tenders/<tender_id>/<filename>', 'get_legacy_tender_file', get_tender_file)
 
 @files_bp.route('/bids/<tender_id>/submissions/<vendor_identifier>/<filename>')
 def get_submission_file(tender_id, vendor_identifier, filename):
     """Get a submission_file by id - from submission folder in static"""
     # vendor_identifier corresponds to the folder name (e.g., tech_supplies_co)
-    directory = os.path.join(current_app.static_folder, 'bids', tender_id, 'submissions', vendor_identifier)
-    try:
-        return send_from_directory(directory, filename)
-    except FileNotFoundError:
-        abort(404)
+    return serve_static(current_app.static_folder, 'bids', tender_id, 'submissions', vendor_identifier, filename)
@@ -0,0 +1,30 @@
+from flask import Blueprint, Response, request, jsonify
+from database import get_db
+from eval_metrics import summarize
+from profiling import render_metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Request latency, MongoDB and pool metrics for Prometheus to scrape"""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@metrics_bp.route('/metrics/evaluation', methods=['GET'])
+def evaluation_metrics():
+    """
+    Evaluation latency, token and cost aggregates for capacity planning.
+
+    Query params: hours (window, default 24), tender_id (only that tender).
+    Per agent: sample count, failures, p50/p95/max of total, upstream, queue
+    and download seconds, and average tokens and retries. Per tender: bids,
+    model calls, tokens and estimated cost.
+    """
+    try:
+        hours = float(request.args.get('hours', 24))
+    except ValueError:
+        return jsonify({'error': 'hours must be a number'}), 400
+    if not 0 < hours <= 24 * 90:
+        return jsonify({'error': 'hours must be between 0 and 2160'}), 400
+
+    return jsonify(summarize(get_db(), hours, request.args.get('tender_id'))), 200
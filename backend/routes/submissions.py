@@ -1,11 +1,13 @@
-import os
-from flask import Blueprint, request, jsonify, current_app, send_from_directory
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 from database import get_db
 from werkzeug.utils import secure_filename
 import uuid
 from datetime import datetime
-import threading
-from ai_eval import evaluate_submission_async
+from eval_queue import enqueue_evaluation
+from batch_eval import enqueue_tender, batch_progress
+from rankings import refresh_ranking, top_rankings, top_percent, bid_percentile
+from uploads import save_file_storage
+from routes.files import send_attachment
 
 submissions_bp = Blueprint('submissions', __name__)
 
@@ -49,49 +51,246 @@ def create_submission(tender_id):
         data['attachments'] = []
         
     db.submissions.insert_one(data)
+    refresh_ranking(db, data['bid_id'])
 
-    # Trigger AI evaluation asynchronously using a Timer to ensure DB write completes first
-    threading.Thread(target=evaluate_submission_async, args=(data['bid_id'],)).start()
+    # Queue the AI evaluation; workers pick it up with bounded concurrency
+    enqueue_evaluation(db, data['bid_id'], tender_id)
 
     
     return jsonify({"message": "Submission created successfully", "bid_id": data['bid_id']}), 201
 
+SCORE_FIELDS = ['verification_score', 'elegibility_score', 'technical_score', 'financial_score', 'legal_score']
+
+def submissions_listing_pipeline(tender_id, sort='score', offset=0, limit=None):
+    """Aggregation that returns one listing row per submission with the vendor name resolved"""
+    if sort == 'submitted':
+        order = {'submitted_at': 1, 'bid_id': 1}
+    else:
+        # Unscored bids sort last; bid_id keeps pages stable between ties
+        order = {'evaluation_score': -1, 'bid_id': 1}
+
+    pipeline = [{'$match': {'tender_id': tender_id}}, {'$sort': order}]
+    if offset:
+        pipeline.append({'$skip': offset})
+    if limit:
+        pipeline.append({'$limit': limit})
+    pipeline += [
+        # Only the listed fields; the large evaluation blobs never leave Mongo
+        {'$project': {
+            '_id': 0, 'bid_id': 1, 'bidder_name': 1, 'vendor_id': 1,
+            'evaluation_score': 1, 'current_stage': 1, 'has_evaluation': {'$gt': ['$evaluation', None]},
+            **{f'evaluation.{field}': 1 for field in SCORE_FIELDS},
+        }},
+        # Vendor names for bids without bidder_name, in the same round trip
+        {'$lookup': {
+            'from': 'vendors',
+            'localField': 'vendor_id',
+            'foreignField': 'vendor_id',
+            'as': 'vendor',
+        }},
+        {'$project': {
+            'bid_id': 1, 'evaluation_score': 1, 'current_stage': 1, 'evaluation': 1, 'has_evaluation': 1,
+            'vendor_name': {'$cond': [
+                {'$ne': [{'$ifNull': ['$bidder_name', '']}, '']},
+                '$bidder_name',
+                {'$arrayElemAt': ['$vendor.company_name', 0]},
+            ]},
+        }},
+    ]
+    return pipeline
+
+def submission_listing_row(sub):
+    individual_scores = {}
+    if sub.get('has_evaluation'):
+        eval_data = sub.get('evaluation', {})
+        individual_scores = {field: eval_data.get(field) for field in SCORE_FIELDS}
+
+    return {
+        'vendor_name': sub.get('vendor_name'),
+        'submission_id': sub.get('bid_id'),
+        'total_score': sub.get('evaluation_score'),
+        'individual_scores': individual_scores,
+        'current_stage': sub.get('current_stage', 0)
+    }
+
+def listing_page(args):
+    """limit and offset of a submissions listing; ValueError carries the message for the client"""
+    try:
+        limit = int(args['limit']) if 'limit' in args else None
+        offset = int(args.get('offset', 0))
+    except ValueError:
+        raise ValueError('limit and offset must be integers')
+    if (limit is not None and limit < 1) or offset < 0:
+        raise ValueError('limit must be positive and offset non-negative')
+    return limit, offset
+
 @submissions_bp.route('/tenders/<tender_id>/submissions', methods=['GET'])
 def get_submissions(tender_id):
-    """Get all submissions for a tender with specific fields"""
+    """Get submissions for a tender with specific fields, best total score first
+
+    Query params: limit, offset (pagination), sort=score|submitted.
+    The total number of submissions is returned in X-Total-Count.
+    """
     db = get_db()
-    submissions = list(db.submissions.find({'tender_id': tender_id}))
+    try:
+        limit, offset = listing_page(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    pipeline = submissions_listing_pipeline(tender_id, request.args.get('sort', 'score'), offset, limit)
+    cursor = db.submissions.aggregate(pipeline, batchSize=200)
+
+    def generate():
+        # Stream rows as the cursor yields them instead of building the whole list
+        yield '['
+        for i, sub in enumerate(cursor):
+            yield (',' if i else '') + current_app.json.dumps(submission_listing_row(sub))
+        yield ']'
+
+    response = Response(stream_with_context(generate()), mimetype='application/json')
+    response.headers['X-Total-Count'] = str(db.submissions.count_documents({'tender_id': tender_id}))
+    return response, 200
+
+@submissions_bp.route('/tenders/<tender_id>/rankings', methods=['GET'])
+def get_rankings(tender_id):
+    """Get ranked bids for a tender from the materialized leaderboard
+
+    Query params: top (K, default 10), offset, stage, percent (top N percent
+    instead of top K), bid_id (exact rank/percentile of one bid).
+    """
+    db = get_db()
+    stage = request.args.get('stage')
+
+    if 'bid_id' in request.args:
+        entry = bid_percentile(db, tender_id, request.args['bid_id'])
+        if not entry:
+            return jsonify({'error': 'Submission not ranked for this tender'}), 404
+        return jsonify(entry), 200
+
+    try:
+        if 'percent' in request.args:
+            percent = float(request.args['percent'])
+            if not 0 < percent <= 100:
+                return jsonify({'error': 'percent must be between 0 and 100'}), 400
+            return jsonify(top_percent(db, tender_id, percent, stage)), 200
+        top = min(int(request.args.get('top', 10)), 500)
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({'error': 'top, offset and percent must be numbers'}), 400
+    if top < 1 or offset < 0:
+        return jsonify({'error': 'top must be positive and offset non-negative'}), 400
+
+    return jsonify(top_rankings(db, tender_id, top, stage, offset)), 200
+
+@submissions_bp.route('/tenders/<tender_id>/evaluate', methods=['POST'])
+def evaluate_tender_submissions(tender_id):
+    """Queue AI evaluation for every pending submission of a tender"""
+    db = get_db()
+    if not db.tenders.find_one({'tender_id': tender_id}, {'_id': 1}):
+        return jsonify({'error': 'Tender not found'}), 404
+
+    # ?mode=stale also reruns agents on already scored bids whose inputs changed
+    mode = request.args.get('mode', 'missing')
+    if mode not in ('missing', 'stale'):
+        return jsonify({'error': 'mode must be missing or stale'}), 400
+
+    batch = enqueue_tender(db, tender_id, mode=mode)
+    return jsonify({"message": "Evaluation queued", **batch}), 202
+
+@submissions_bp.route('/tenders/<tender_id>/evaluate', methods=['GET'])
+def get_tender_evaluation_progress(tender_id):
+    """Get evaluation progress for a tender, optionally for one batch"""
+    db = get_db()
+    progress = batch_progress(db, tender_id, request.args.get('batch_id'))
+    return jsonify(progress), 200
+
+def structured_evaluation(eval_data, tender_reqs):
+    """Combine a raw evaluation with the tender requirements it answers"""
     
-    result = []
-    for sub in submissions:
-        # vendor name
-        vendor_name = sub.get('bidder_name')
-        if not vendor_name and 'vendor_id' in sub:
-            vendor = db.vendors.find_one({'vendor_id': sub['vendor_id']})
-            if vendor:
-                vendor_name = vendor.get('company_name')
-        
-        # individual scores
-        individual_scores = {}
-        if 'evaluation' in sub:
-            eval_data = sub['evaluation']
-            individual_scores = {
-                'verification_score': eval_data.get('verification_score'),
-                'elegibility_score': eval_data.get('elegibility_score'),
-                'technical_score': eval_data.get('technical_score'),
-                'financial_score': eval_data.get('financial_score'),
-                'legal_score': eval_data.get('legal_score')
-            }
-
-        result.append({
-            'vendor_name': vendor_name,
-            'submission_id': sub.get('bid_id'),
-            'total_score': sub.get('evaluation_score'),
-            'individual_scores': individual_scores,
-            'current_stage': sub.get('current_stage', 0)
-        })
-        
-    return jsonify(result), 200
+    def merge_criteria(req_list, eval_list):
+        merged = []
+        if req_list and isinstance(req_list, list):
+            for i, req in enumerate(req_list):
+                status = eval_list[i] if eval_list and i < len(eval_list) else None
+                merged.append({"requirement": req, "met": status})
+        return merged
+
+    # 1. Eligibility
+    eligibility = {
+        "score": eval_data.get('elegibility_score'),
+        "reasoning": eval_data.get('elegibility_reasoning'),
+        "items": merge_criteria(tender_reqs.get('eligibility'), eval_data.get('elegibility'))
+    }
+
+    # 2. Legal
+    legal = {
+        "score": eval_data.get('legal_score'),
+        "reasoning": eval_data.get('legal_reasoning'),
+        "items": merge_criteria(tender_reqs.get('legal'), eval_data.get('legal'))
+    }
+
+    # 3. Financial
+    financial = {
+        "score": eval_data.get('financial_score'),
+        "reasoning": eval_data.get('financial_reasoning'),
+        "checklist": merge_criteria(tender_reqs.get('financial_checklist'), eval_data.get('financial_checklist')),
+        "breakdown": eval_data.get('financial')
+    }
+
+    # 4. Technical
+    tech_skus_merged = []
+    req_skus = tender_reqs.get('technical_sku', {})
+    eval_skus = eval_data.get('technical_sku', {})
+    
+    if req_skus:
+        for component, specs in req_skus.items():
+            comp_results = eval_skus.get(component, [])
+            spec_list = []
+            if isinstance(specs, dict):
+                for idx, (spec_key, spec_val) in enumerate(specs.items()):
+                    met = comp_results[idx] if idx < len(comp_results) else None
+                    spec_list.append({
+                        "spec": spec_key,
+                        "required": spec_val,
+                        "met": met
+                    })
+            tech_skus_merged.append({
+                "component": component,
+                "specs": spec_list
+            })
+
+    technical = {
+        "score": eval_data.get('technical_score'),
+        "reasoning": eval_data.get('technical_reasoning'),
+        "checklist": merge_criteria(tender_reqs.get('technical_checklist'), eval_data.get('technical_checklist')),
+        "skus": tech_skus_merged
+    }
+
+    # 5. Verification
+    verification = {
+        "score": eval_data.get('verification_score'),
+        "reasoning": eval_data.get('verification_reasoning'),
+        "items": []
+    }
+    if 'verification' in eval_data:
+        for k, v in eval_data['verification'].items():
+            verification['items'].append({"check": k, "passed": v})
+
+    return {
+        "eligibility": eligibility,
+        "legal": legal,
+        "financial": financial,
+        "technical": technical,
+        "verification": verification
+    }
+
+def shows_vendor_details(submission):
+    """Vendor details are disclosed once a bid is past stage 1"""
+    try:
+        stage_val = int(submission.get('current_stage', 0))
+    except (ValueError, TypeError):
+        stage_val = 0
+    return stage_val > 1 and 'vendor_id' in submission
 
 @submissions_bp.route('/submissions/<bid_id>', methods=['GET'])
 def get_submission(bid_id):
@@ -107,99 +306,16 @@ def get_submission(bid_id):
     tender_reqs = {}
     if tender_id:
         tender = db.tenders.find_one({'tender_id': tender_id}, {'_id': 0, 'requirements': 1})
-        
-        tender_reqs = tender['requirements']
+        # The tender may have been deleted since the bid was submitted
+        tender_reqs = (tender or {}).get('requirements') or {}
 
     # Combine Requirements and Evaluation if evaluation exists
     if 'evaluation' in submission:
-        eval_data = submission['evaluation']
-        
-        def merge_criteria(req_list, eval_list):
-            merged = []
-            if req_list and isinstance(req_list, list):
-                for i, req in enumerate(req_list):
-                    status = eval_list[i] if eval_list and i < len(eval_list) else None
-                    merged.append({"requirement": req, "met": status})
-            return merged
-
-        # 1. Eligibility
-        eligibility = {
-            "score": eval_data.get('elegibility_score'),
-            "reasoning": eval_data.get('elegibility_reasoning'),
-            "items": merge_criteria(tender_reqs.get('eligibility'), eval_data.get('elegibility'))
-        }
-
-        # 2. Legal
-        legal = {
-            "score": eval_data.get('legal_score'),
-            "reasoning": eval_data.get('legal_reasoning'),
-            "items": merge_criteria(tender_reqs.get('legal'), eval_data.get('legal'))
-        }
-
-        # 3. Financial
-        financial = {
-            "score": eval_data.get('financial_score'),
-            "reasoning": eval_data.get('financial_reasoning'),
-            "checklist": merge_criteria(tender_reqs.get('financial_checklist'), eval_data.get('financial_checklist')),
-            "breakdown": eval_data.get('financial')
-        }
-
-        # 4. Technical
-        tech_skus_merged = []
-        req_skus = tender_reqs.get('technical_sku', {})
-        eval_skus = eval_data.get('technical_sku', {})
-        
-        if req_skus:
-            for component, specs in req_skus.items():
-                comp_results = eval_skus.get(component, [])
-                spec_list = []
-                if isinstance(specs, dict):
-                    for idx, (spec_key, spec_val) in enumerate(specs.items()):
-                        met = comp_results[idx] if idx < len(comp_results) else None
-                        spec_list.append({
-                            "spec": spec_key,
-                            "required": spec_val,
-                            "met": met
-                        })
-                tech_skus_merged.append({
-                    "component": component,
-                    "specs": spec_list
-                })
-
-        technical = {
-            "score": eval_data.get('technical_score'),
-            "reasoning": eval_data.get('technical_reasoning'),
-            "checklist": merge_criteria(tender_reqs.get('technical_checklist'), eval_data.get('technical_checklist')),
-            "skus": tech_skus_merged
-        }
-
-        # 5. Verification
-        verification = {
-            "score": eval_data.get('verification_score'),
-            "reasoning": eval_data.get('verification_reasoning'),
-            "items": []
-        }
-        if 'verification' in eval_data:
-            for k, v in eval_data['verification'].items():
-                verification['items'].append({"check": k, "passed": v})
-
         # Replace raw evaluation with structured data
-        submission['evaluation'] = {
-            "eligibility": eligibility,
-            "legal": legal,
-            "financial": financial,
-            "technical": technical,
-            "verification": verification
-        }
+        submission['evaluation'] = structured_evaluation(submission['evaluation'], tender_reqs)
 
     # Vendor details logic
-    current_stage = submission.get('current_stage', 0)
-    try:
-        stage_val = int(current_stage)
-    except (ValueError, TypeError):
-        stage_val = 0
-
-    if stage_val > 1 and 'vendor_id' in submission:
+    if shows_vendor_details(submission):
         vendor = db.vendors.find_one({'vendor_id': submission['vendor_id']}, {'_id': 0})
         if vendor:
             submission['vendor_details'] = vendor
@@ -209,9 +325,8 @@ def get_submission(bid_id):
 @submissions_bp.route('/submissions/<bid_id>/attachments/<filename>', methods=['GET'])
 def get_submission_attachment(bid_id, filename):
     """Get bid file attachment by filename"""
-    # serve file
-    directory = os.path.join(current_app.static_folder, 'submissions', bid_id)
-    return send_from_directory(directory, filename)
+    submission = get_db().submissions.find_one({'bid_id': bid_id}, {'_id': 0, 'attachments': 1})
+    return send_attachment(submission, filename, 'submissions', bid_id)
 
 @submissions_bp.route('/submissions/<bid_id>/attachments', methods=['POST'])
 def add_submission_attachment(bid_id):
@@ -225,30 +340,35 @@ def add_submission_attachment(bid_id):
     if file.filename == '':
         return jsonify({'error': 'No selected file'}), 400
         
-    if file:
-        filename = secure_filename(file.filename)
-        # Save to static/submissions/{bid_id}/
-        upload_folder = os.path.join(current_app.static_folder, 'submissions', bid_id)
-        os.makedirs(upload_folder, exist_ok=True)
-        
-        file_path = os.path.join(upload_folder, filename)
-        file.save(file_path)
-        
-        # URL for accessing the file
-        file_url = f"/submissions/{bid_id}/attachments/{filename}"
-        
-        attachment_data = {
-            "file_name": filename,
-            "url": file_url,
-            "uploaded_at": datetime.utcnow()
-        }
-        
-        db.submissions.update_one(
-            {'bid_id': bid_id},
-            {'$push': {'attachments': attachment_data}}
-        )
-        
-        return jsonify(attachment_data), 201
+    if not db.submissions.find_one({'bid_id': bid_id}, {'_id': 1}):
+        return jsonify({'error': 'Submission not found'}), 404
+
+    # Streamed to a temp file and moved into the blob store when complete;
+    # a new document queues a re-evaluation of the affected agents
+    filename = secure_filename(file.filename)
+    try:
+        attachment_data, created = save_file_storage(db, file, 'submission', bid_id, filename)
+    except LookupError:
+        # Deleted while the file was uploading
+        return jsonify({'error': 'Submission not found'}), 404
+    return jsonify(attachment_data), 201 if created else 200
+
+@submissions_bp.route('/submissions/<bid_id>/reevaluate', methods=['POST'])
+def reevaluate_submission(bid_id):
+    """Queue a re-evaluation of the agents whose inputs changed (all agents with force)"""
+    db = get_db()
+    data = request.get_json(silent=True) or {}
+
+    submission = db.submissions.find_one({'bid_id': bid_id}, {'tender_id': 1})
+    if not submission:
+        return jsonify({'error': 'Submission not found'}), 404
+
+    if data.get('force'):
+        # Without stored fingerprints every agent counts as stale
+        db.submissions.update_one({'bid_id': bid_id}, {'$unset': {'evaluation_fingerprints': ''}})
+
+    job = enqueue_evaluation(db, bid_id, submission.get('tender_id'), options={'mode': 'stale'})
+    return jsonify({"message": "Re-evaluation queued", "job_id": job['job_id']}), 202
 
 @submissions_bp.route('/submissions/<submission_id>/update_stage', methods=['POST'])
 def update_submission_stage(submission_id):
@@ -271,6 +391,7 @@ def update_submission_stage(submission_id):
         {'bid_id': submission_id},
         {'$set': {'current_stage': new_stage}}
     )
+    refresh_ranking(db, submission_id)
     
     return jsonify({
         "message": "Stage updated successfully",
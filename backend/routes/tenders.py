@@ -1,49 +1,135 @@
 import os
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, Response
 from database import get_db
 from werkzeug.utils import secure_filename
 import uuid
 from datetime import datetime
+from batch_eval import enqueue_tender
+from response_cache import response_cache, PORTAL_TENDERS_KEY
+from uploads import save_file_storage
+from blobstore import release_attachments, find_attachment
 
 tenders_bp = Blueprint('tenders', __name__)
 
 def get_tender_collection():
     return get_db().tenders
 
+LISTING_FIELDS = ['tender_id', 'title', 'description', 'stage', 'end_date', 'amount', 'earnest_money_deposit']
+# Above this many matches a filtered count=estimate stops counting
+COUNT_ESTIMATE_CAP = 10000
+
+def tender_listing_query(args):
+    """Build the Mongo filter for GET /tenders from its query params"""
+    query = {}
+    if args.get('stage'):
+        stages = args['stage'].split(',')
+        query['stage'] = stages[0] if len(stages) == 1 else {'$in': stages}
+
+    # end_date is stored as an ISO-8601 string, which compares chronologically
+    end_date = {}
+    if args.get('end_after'):
+        end_date['$gte'] = args['end_after']
+    if args.get('end_before'):
+        end_date['$lte'] = args['end_before']
+    if end_date:
+        query['end_date'] = end_date
+
+    amount = {}
+    if args.get('min_amount'):
+        amount['$gte'] = float(args['min_amount'])
+    if args.get('max_amount'):
+        amount['$lte'] = float(args['max_amount'])
+    if amount:
+        query['amount'] = amount
+    return query
+
+def tender_listing_projection(fields):
+    """Map ?fields=a,b to a projection; tender_id is always kept for the cursor"""
+    if not fields:
+        names = LISTING_FIELDS
+    else:
+        names = [f.strip() for f in fields.split(',') if f.strip()]
+        if any(name.startswith('$') or '.' in name or name == '_id' for name in names):
+            raise ValueError('invalid field name')
+    projection = {'_id': 0, 'tender_id': 1}
+    projection.update({name: 1 for name in names})
+    return projection
+
 @tenders_bp.route('/tenders', methods=['GET'])
 def get_tenders():
-    """Get all tenders
+    """Get tenders
+
+    Query params:
+        limit, after     keyset pagination on tender_id (next cursor in X-Next-Cursor)
+        order            asc (default) or desc by tender_id
+        stage            one stage or a comma-separated list
+        end_after, end_before, min_amount, max_amount   range filters
+        fields           comma-separated fields to return
+        count            exact or estimate; total returned in X-Total-Count
+    Without limit every matching tender is returned, as before.
     """
     db = get_db()
-    tenders = list(db.tenders.find({}, {
-        '_id': 0,
-        'tender_id': 1,
-        'title': 1,
-        'description': 1,
-        'stage': 1,
-        'end_date': 1,
-        'amount': 1,
-        'earnest_money_deposit': 1
-    }))
-    return jsonify(tenders), 200
+    try:
+        query = tender_listing_query(request.args)
+        projection = tender_listing_projection(request.args.get('fields'))
+        limit = int(request.args['limit']) if 'limit' in request.args else None
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query parameter: {e}'}), 400
+    if limit is not None and limit < 1:
+        return jsonify({'error': 'limit must be positive'}), 400
+
+    descending = request.args.get('order') == 'desc'
+    page_query = dict(query)
+    if request.args.get('after'):
+        page_query['tender_id'] = {'$lt' if descending else '$gt': request.args['after']}
+
+    cursor = db.tenders.find(page_query, projection).sort('tender_id', -1 if descending else 1)
+    if limit:
+        cursor = cursor.limit(limit)
+    tenders = list(cursor)
+
+    response = jsonify(tenders)
+    if limit and len(tenders) == limit:
+        response.headers['X-Next-Cursor'] = tenders[-1]['tender_id']
+
+    count_mode = request.args.get('count')
+    if count_mode == 'exact':
+        response.headers['X-Total-Count'] = str(db.tenders.count_documents(query))
+    elif count_mode == 'estimate':
+        if query:
+            total = db.tenders.count_documents(query, limit=COUNT_ESTIMATE_CAP)
+        else:
+            # Collection metadata, no scan
+            total = db.tenders.estimated_document_count()
+        response.headers['X-Total-Count'] = str(total)
+        response.headers['X-Total-Count-Estimated'] = 'true'
+    return response, 200
 
 @tenders_bp.route('/portal/tenders', methods=['GET'])
 def get_tenders2():
     """Get all tenders
+    Served from the response cache with an ETag so unchanged listings get a 304
     """
-    db = get_db()
-    tenders = list(db.tenders.find({"stage": "live"}, {
-        '_id': 0,
-        'tender_id': 1,
-        'title': 1,
-        'description': 1,
-        'stage': 1,
-        'end_date': 1,
-        'amount': 1,
-        "attachments": 1,
-        'earnest_money_deposit': 1
-    }))
-    return jsonify(tenders), 200
+    def build():
+        db = get_db()
+        tenders = list(db.tenders.find({"stage": "live"}, {
+            '_id': 0,
+            'tender_id': 1,
+            'title': 1,
+            'description': 1,
+            'stage': 1,
+            'end_date': 1,
+            'amount': 1,
+            "attachments": 1,
+            'earnest_money_deposit': 1
+        }))
+        return current_app.json.dumps(tenders).encode()
+
+    etag, body = response_cache.get_or_build(PORTAL_TENDERS_KEY, build)
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
 
 
 
@@ -82,6 +168,7 @@ def create_tender():
     # Basic validation could go here
     
     db.tenders.insert_one(data)
+    response_cache.invalidate(PORTAL_TENDERS_KEY)
     
     return jsonify({"message": "Tender created successfully", "tender_id": new_id}), 201
 
@@ -104,6 +191,11 @@ def update_tender(id):
         {'tender_id': id},
         {'$set': data}
     )
+    response_cache.invalidate(PORTAL_TENDERS_KEY)
+
+    # Changed requirements make the matching agent results stale
+    if 'requirements' in data and data['requirements'] != existing_tender.get('requirements'):
+        enqueue_tender(db, id, mode='stale')
     
     if result.matched_count:
         updated_tender = db.tenders.find_one({'tender_id': id}, {'_id': 0})
@@ -114,8 +206,11 @@ def update_tender(id):
 def delete_tender(id):
     """Delete a tender by id"""
     db = get_db()
-    result = db.tenders.delete_one({'tender_id': id})
-    if result.deleted_count:
+    tender = db.tenders.find_one_and_delete({'tender_id': id}, projection={'attachments': 1})
+    if tender:
+        response_cache.invalidate(PORTAL_TENDERS_KEY)
+        release_attachments(db, tender.get('attachments'))
+        db.tender_rankings.delete_many({'tender_id': id})
         return jsonify({'message': 'Tender deleted'}), 200
     return jsonify({'error': 'Tender not found'}), 404
 
@@ -130,43 +225,40 @@ def add_attachment(id):
     if file.filename == '':
         return jsonify({'error': 'No selected file'}), 400
     
-    if file:
-        filename = secure_filename(file.filename)
-        upload_folder = os.path.join(current_app.static_folder, 'tender', id)
-        os.makedirs(upload_folder, exist_ok=True)
-        
-        file_path = os.path.join(upload_folder, filename)
-        file.save(file_path)
-        
-        # Construct URL
-        file_url = f"/static/tender/{id}/{filename}"
-        
-        attachment_data = {
-            "file_name": filename,
-            "url": file_url
-        }
-        
-        result = db.tenders.update_one(
-            {'tender_id': id},
-            {'$push': {'attachments': attachment_data}}
-        )
-        
-        return jsonify(attachment_data), 201
+    if not db.tenders.find_one({'tender_id': id}, {'_id': 1}):
+        return jsonify({'error': 'Tender not found'}), 404
+
+    # Streamed to a temp file and moved into the blob store when complete;
+    # re-uploading a file the tender already has under this name is a no-op
+    filename = secure_filename(file.filename)
+    try:
+        attachment_data, created = save_file_storage(db, file, 'tender', id, filename)
+    except LookupError:
+        # Deleted while the file was uploading
+        return jsonify({'error': 'Tender not found'}), 404
+    return jsonify(attachment_data), 201 if created else 200
 
 @tenders_bp.route('/tenders/<id>/attachments/<filename>', methods=['DELETE'])
 def remove_attachment(id, filename):
     """Remove attachment from a tender by id"""
     db = get_db()
-    result = db.tenders.update_one(
-        {'tender_id': id},
-        {'$pull': {'attachments': {'file_name': filename}}}
+    tender = db.tenders.find_one_and_update(
+        {'tender_id': id, 'attachments.file_name': filename},
+        {'$pull': {'attachments': {'file_name': filename}}},
+        projection={'attachments': 1}
     )
     
-    if result.modified_count:
-        # Remove file from disk
-        file_path = os.path.join(current_app.static_folder, 'tender', id, filename)
-        if os.path.exists(file_path):
-            os.remove(file_path)
+    if tender:
+        response_cache.invalidate(PORTAL_TENDERS_KEY)
+        attachment = find_attachment(tender, filename)
+        if attachment.get('stored') == 'blob':
+            # The blob is deleted once no tender or bid references it
+            release_attachments(db, [attachment])
+        else:
+            # Remove legacy file from disk
+            file_path = os.path.join(current_app.static_folder, 'tender', id, filename)
+            if os.path.exists(file_path):
+                os.remove(file_path)
         return jsonify({'message': 'Attachment removed'}), 200
     
     return jsonify({'error': 'Attachment or Tender not found'}), 404
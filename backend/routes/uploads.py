@@ -0,0 +1,233 @@
+import os
+import re
+import uuid
+from datetime import datetime, timedelta
+from flask import Blueprint, request, jsonify
+from pymongo import ReturnDocument
+from werkzeug.utils import secure_filename
+from database import get_db
+from uploads import (
+    TARGETS, MAX_UPLOAD_BYTES, MAX_CHUNK_BYTES, RECOMMENDED_CHUNK_BYTES, SESSION_TTL, CHUNK_LOCK_SECONDS,
+    ChunkLock, ChunkLockLost, copy_stream, part_path, chunk_hashers, cleanup_expired_uploads,
+    target_collection, target_filter, find_duplicate, register_attachment
+)
+from attachments import guess_mime_type
+from blobstore import hash_file, store
+
+uploads_bp = Blueprint('uploads', __name__)
+
+CONTENT_RANGE = re.compile(r'bytes (\d+)-(\d+)/(\d+|\*)')
+
+def session_response(session):
+    return {
+        'upload_id': session['upload_id'],
+        'target': session['target'],
+        'target_id': session['target_id'],
+        'file_name': session['file_name'],
+        'size': session.get('size'),
+        'received': session['received'],
+        'status': session['status'],
+        'chunk_size': RECOMMENDED_CHUNK_BYTES,
+        'max_chunk_size': MAX_CHUNK_BYTES,
+    }
+
+def lock_free():
+    return {'$or': [{'locked_until': None}, {'locked_until': {'$lt': datetime.utcnow()}}]}
+
+def chunk_offset():
+    """Chunk start from Content-Range (bytes a-b/total) or ?offset="""
+    header = request.headers.get('Content-Range')
+    if header:
+        match = CONTENT_RANGE.fullmatch(header.strip())
+        if not match:
+            raise ValueError('malformed Content-Range')
+        return int(match.group(1))
+    return int(request.args['offset'])
+
+@uploads_bp.route('/uploads', methods=['POST'])
+def init_upload():
+    """Start a resumable upload for a tender or submission attachment
+
+    Body: {"target": "tender"|"submission", "target_id", "file_name",
+           "size" (optional, bytes), "sha256" (optional, verified on completion)}
+    """
+    db = get_db()
+    data = request.json
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+
+    target, target_id = data.get('target'), data.get('target_id')
+    if target not in TARGETS or not target_id:
+        return jsonify({'error': 'target must be tender or submission, with a target_id'}), 400
+    filename = secure_filename(data.get('file_name') or '')
+    if not filename:
+        return jsonify({'error': 'No file name provided'}), 400
+
+    size = data.get('size')
+    if size is not None and (not isinstance(size, int) or size < 0 or size > MAX_UPLOAD_BYTES):
+        return jsonify({'error': f'size must be an integer up to {MAX_UPLOAD_BYTES} bytes'}), 413
+    if not target_collection(db, target).find_one(target_filter(target, target_id), {'_id': 1}):
+        return jsonify({'error': f'{target.capitalize()} not found'}), 404
+
+    cleanup_expired_uploads(db)
+
+    now = datetime.utcnow()
+    session = {
+        'upload_id': f"upl-{uuid.uuid4().hex}",
+        'target': target,
+        'target_id': target_id,
+        'file_name': filename,
+        'size': size,
+        'sha256': (data.get('sha256') or '').lower() or None,
+        'received': 0,
+        'status': 'open',
+        'created_at': now,
+        'updated_at': now,
+        'expires_at': now + SESSION_TTL,
+    }
+    db.uploads.insert_one(session)
+    # Empty part file so GET/PUT see the session's bytes from the start
+    open(part_path(session['upload_id']), 'wb').close()
+    return jsonify(session_response(session)), 201
+
+@uploads_bp.route('/uploads/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+    """Get upload progress; clients resume by sending the chunk at `received`"""
+    db = get_db()
+    session = db.uploads.find_one({'upload_id': upload_id}, {'_id': 0})
+    if not session:
+        return jsonify({'error': 'Upload not found'}), 404
+    return jsonify(session_response(session)), 200
+
+@uploads_bp.route('/uploads/<upload_id>', methods=['PUT'])
+def put_chunk(upload_id):
+    """Append one chunk (raw request body) at the offset given by Content-Range or ?offset="""
+    db = get_db()
+    try:
+        offset = chunk_offset()
+    except (KeyError, ValueError):
+        return jsonify({'error': 'Content-Range or offset is required'}), 400
+
+    # Only one request writes a session at a time, and only at its current end
+    lock_id = uuid.uuid4().hex
+    session = db.uploads.find_one_and_update(
+        {'upload_id': upload_id, 'status': 'open', 'received': offset, **lock_free()},
+        {'$set': {'locked_until': datetime.utcnow() + timedelta(seconds=CHUNK_LOCK_SECONDS), 'lock_id': lock_id}},
+        projection={'_id': 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if not session:
+        current = db.uploads.find_one({'upload_id': upload_id}, {'_id': 0})
+        if not current:
+            return jsonify({'error': 'Upload not found'}), 404
+        return jsonify({'error': 'Chunk does not continue the upload', **session_response(current)}), 409
+
+    limit = (session['size'] if session.get('size') is not None else MAX_UPLOAD_BYTES) - offset
+    hasher = chunk_hashers.take(upload_id, offset)
+    lock = ChunkLock(db, upload_id, lock_id)
+    try:
+        with open(part_path(upload_id), 'r+b') as out:
+            # Drop bytes of an earlier chunk that failed midway
+            out.truncate(offset)
+            out.seek(offset)
+            written = copy_stream(request.stream, out, hasher, min(MAX_CHUNK_BYTES, limit), before_write=lock)
+    except ChunkLockLost:
+        chunk_hashers.discard(upload_id)
+        return lock_lost_response(db, upload_id)
+    except BaseException:
+        db.uploads.update_one({'upload_id': upload_id, 'lock_id': lock_id},
+                              {'$unset': {'locked_until': '', 'lock_id': ''}})
+        raise
+
+    # Only counts if the lock was still ours for the whole write
+    now = datetime.utcnow()
+    session = db.uploads.find_one_and_update(
+        lock.filter(),
+        {'$set': {'received': offset + written, 'updated_at': now, 'expires_at': now + SESSION_TTL},
+         '$unset': {'locked_until': '', 'lock_id': ''}},
+        projection={'_id': 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if not session:
+        chunk_hashers.discard(upload_id)
+        return lock_lost_response(db, upload_id)
+    chunk_hashers.put(upload_id, offset + written, hasher)
+    return jsonify(session_response(session)), 200
+
+def lock_lost_response(db, upload_id):
+    current = db.uploads.find_one({'upload_id': upload_id}, {'_id': 0})
+    if not current:
+        return jsonify({'error': 'Upload not found'}), 404
+    return jsonify({'error': 'Chunk took too long and was superseded; resume from received',
+                    **session_response(current)}), 409
+
+@uploads_bp.route('/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    """Verify the received file and attach it to its tender or submission"""
+    db = get_db()
+    session = db.uploads.find_one_and_update(
+        {'upload_id': upload_id, 'status': 'open', **lock_free()},
+        {'$set': {'status': 'completing', 'locked_until': datetime.utcnow() + timedelta(seconds=CHUNK_LOCK_SECONDS)}},
+        projection={'_id': 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if not session:
+        current = db.uploads.find_one({'upload_id': upload_id}, {'_id': 0})
+        if not current:
+            return jsonify({'error': 'Upload not found'}), 404
+        return jsonify({'error': 'Upload is not open or a chunk is being written', **session_response(current)}), 409
+
+    def finish(status):
+        db.uploads.update_one(
+            {'upload_id': upload_id},
+            {'$set': {'status': status, 'updated_at': datetime.utcnow()}, '$unset': {'locked_until': ''}}
+        )
+
+    if session.get('size') is not None and session['received'] != session['size']:
+        finish('open')
+        return jsonify({'error': 'Upload is incomplete', **session_response(session)}), 409
+
+    path = part_path(upload_id)
+    target, target_id, filename = session['target'], session['target_id'], session['file_name']
+    try:
+        hasher = chunk_hashers.take(upload_id, session['received'])
+        sha256 = hasher.hexdigest() if hasher is not None else hash_file(path)
+
+        if session.get('sha256') and session['sha256'] != sha256:
+            os.remove(path)
+            finish('failed')
+            return jsonify({'error': 'Checksum mismatch', 'expected': session['sha256'], 'received': sha256}), 422
+
+        duplicate = find_duplicate(db, target, target_id, filename, sha256)
+        if duplicate:
+            os.remove(path)
+            finish('complete')
+            return jsonify(duplicate), 200
+
+        mime_type = guess_mime_type(filename)
+        store(db, path, sha256, session['received'], mime_type)
+    except BaseException:
+        # Leave the session resumable; the part file is still in place
+        finish('open')
+        raise
+
+    try:
+        attachment_data = register_attachment(db, target, target_id, filename, sha256, session['received'], mime_type)
+    except LookupError as e:
+        finish('failed')
+        return jsonify({'error': str(e)}), 404
+    finish('complete')
+    return jsonify(attachment_data), 201
+
+@uploads_bp.route('/uploads/<upload_id>', methods=['DELETE'])
+def abort_upload(upload_id):
+    """Abort an upload and discard the bytes received so far"""
+    db = get_db()
+    result = db.uploads.delete_one({'upload_id': upload_id, 'status': {'$in': ['open', 'failed']}, **lock_free()})
+    if not result.deleted_count:
+        return jsonify({'error': 'Upload not found, finished or busy'}), 404
+    chunk_hashers.discard(upload_id)
+    path = part_path(upload_id)
+    if os.path.exists(path):
+        os.remove(path)
+    return jsonify({'message': 'Upload aborted'}), 200
@@ -1,32 +1,107 @@
-from flask import Flask, jsonify
-from flask_cors import CORS
-from routes.tenders import tenders_bp
-from routes.submissions import submissions_bp
-from routes.vendors import vendors_bp
-from routes.files import files_bp
-from database import init_db
-
-# Initialize the Flask application
-app = Flask(__name__, static_folder='static', static_url_path='/static')
-
-# Enable CORS
-CORS(app)
-
-# Initialize Database
-init_db(app)
-
-# Register Blueprints
-app.register_blueprint(tenders_bp)
-app.register_blueprint(submissions_bp)
-app.register_blueprint(vendors_bp)
-app.register_blueprint(files_bp)
-
-@app.route('/')
-def index():
-    return jsonify({"message": "Tender Management API is running"}), 200
-
-if __name__ == '__main__':
-    # Run the application on port from environment variable (default 8080 for Cloud Run)
-    import os
-    port = int(os.environ.get('PORT', 8080))
-    app.run(debug=False, port=port, host='0.0.0.0')
+import os
+from flask import Flask, jsonify
+from flask_cors import CORS
+from routes.tenders import tenders_bp
+from routes.submissions import submissions_bp
+from routes.vendors import vendors_bp
+from routes.files import files_bp
+from routes.uploads import uploads_bp
+from routes.metrics import metrics_bp
+from routes.calls import calls_bp
+from uploads import MAX_UPLOAD_BYTES
+from file_serving import init_file_serving
+from profiling import init_profiling
+from database import init_db, get_db, pool_stats
+
+def index():
+    return jsonify({"message": "Tender Management API is running"}), 200
+
+def db_health():
+    """MongoDB reachability and shared connection pool metrics"""
+    try:
+        get_db().command('ping')
+        status = "ok"
+    except Exception as e:
+        status = f"error: {e}"
+    return jsonify({"status": status, "pool": pool_stats()}), 200 if status == "ok" else 503
+
+def start_eval_worker(app, concurrency):
+    """Process queued evaluations in this process (see eval_queue.EvaluationWorker)."""
+    from ai_eval import db as eval_db, evaluate_submission_async
+    from eval_queue import EvaluationWorker
+    from llm_client import gemini_breaker
+    app.extensions['eval_worker'] = EvaluationWorker(eval_db, evaluate_submission_async, concurrency=concurrency,
+                                                     paused=gemini_breaker.remaining).start()
+
+def stop_eval_worker(app, timeout=None):
+    """Let in-flight evaluations finish for up to `timeout` seconds, then hand the rest back to the queue."""
+    worker = app.extensions.pop('eval_worker', None)
+    if worker is not None:
+        worker.stop(timeout=timeout)
+
+def create_app(config=None):
+    """
+    Build the Flask application.
+
+    Every process (each gunicorn worker, see gunicorn.conf.py) calls this
+    itself after forking, so the Mongo and Gemini clients it opens are
+    never shared between processes.
+    """
+    app = Flask(__name__, static_folder='static', static_url_path='/static')
+    # Reject oversized request bodies up front (multipart overhead on top of the file)
+    app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES + 1024 * 1024
+    if config:
+        app.config.update(config)
+
+    # Enable CORS (pagination metadata travels in response headers)
+    CORS(app, expose_headers=['X-Total-Count', 'X-Total-Count-Estimated', 'X-Next-Cursor', 'X-Request-ID'])
+
+    # Initialize Database
+    init_db(app)
+
+    # FILE_OFFLOAD=nginx|sendfile hands attachment downloads to the front proxy
+    init_file_serving(app)
+
+    # Request ids, latency histograms, per-request Mongo time and slow-request profiles
+    init_profiling(app)
+
+    # Register Blueprints
+    app.register_blueprint(tenders_bp)
+    app.register_blueprint(submissions_bp)
+    app.register_blueprint(vendors_bp)
+    app.register_blueprint(files_bp)
+    app.register_blueprint(uploads_bp)
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(calls_bp)
+
+    app.add_url_rule('/', view_func=index)
+    app.add_url_rule('/health/db', view_func=db_health)
+
+    # Evaluations run in dedicated workers (python worker.py). Every API
+    # process started with EVAL_INPROCESS_WORKERS > 0 runs its own evaluation
+    # worker and Gemini rate limiter (see GEMINI_PROCESSES in llm_client.py).
+    eval_concurrency = int(app.config.get('EVAL_INPROCESS_WORKERS', os.environ.get('EVAL_INPROCESS_WORKERS', 0)))
+    if eval_concurrency > 0:
+        start_eval_worker(app, eval_concurrency)
+
+    return app
+
+_app = None
+
+def __getattr__(name):
+    # `server.app` is built on first use, so importing this module (e.g. from
+    # the gunicorn master) does not open any clients
+    global _app
+    if name == 'app':
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+if __name__ == '__main__':
+    # Development server only; production runs gunicorn -c gunicorn.conf.py
+    # Run the application on port from environment variable (default 8080 for Cloud Run)
+    port = int(os.environ.get('PORT', 8080))
+    # A single process, so it can evaluate submissions itself
+    create_app({'EVAL_INPROCESS_WORKERS': int(os.environ.get('EVAL_INPROCESS_WORKERS', 1))}).run(
+        debug=False, port=port, host='0.0.0.0')
@@ -0,0 +1,59 @@
+import os
+import sys
+
+import mongomock
+import pytest
+
+# Tests import the backend modules the way the servers do, from backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# ai_eval (imported with the routes) builds its Gemini client at import time
+os.environ.setdefault('GEMINI_FAKE', '1')
+os.environ.setdefault('MONGO_ENSURE_INDEXES', '0')
+
+import blobstore  # noqa: E402
+import database  # noqa: E402
+import uploads  # noqa: E402
+
+_find_and_modify = mongomock.collection.Collection._find_and_modify
+
+
+def _find_and_modify_by_id(self, query, projection=None, *args, **kwargs):
+    # mongomock re-runs the original filter to return the updated document
+    # unless _id is projected, so an update that stops the filter matching
+    # (e.g. taking a lock) would come back as None; MongoDB returns the document
+    if isinstance(projection, dict) and projection.get('_id') == 0:
+        projection = {key: value for key, value in projection.items() if key != '_id'} or None
+        doc = _find_and_modify(self, query, projection, *args, **kwargs)
+        if doc is not None:
+            doc.pop('_id', None)
+        return doc
+    return _find_and_modify(self, query, projection, *args, **kwargs)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """The shared database client, pointed at a fresh in-memory mongomock."""
+    monkeypatch.setattr(mongomock.collection.Collection, '_find_and_modify', _find_and_modify_by_id)
+    monkeypatch.setattr(database, '_client', mongomock.MongoClient())
+    monkeypatch.setattr(database, '_client_pid', os.getpid())
+    return database.get_database()
+
+
+@pytest.fixture
+def blob_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(blobstore, 'BLOB_DIR', str(tmp_path / 'blobs'))
+    monkeypatch.setattr(uploads, 'BLOB_DIR', str(tmp_path / 'blobs'))
+    monkeypatch.delenv('UPLOAD_TMP_DIR', raising=False)
+    return tmp_path / 'blobs'
+
+
+@pytest.fixture
+def app(db, blob_dir):
+    from server import create_app
+    return create_app({'TESTING': True})
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,99 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from async_app import ROUTES, create_async_app
+from asgi import Dispatcher
+
+
+@pytest.fixture
+def dispatcher(app):
+    return Dispatcher(create_async_app(), app, wsgi_threads=2)
+
+
+def scope(method, path):
+    return {'type': 'http', 'method': method, 'path': path}
+
+
+@pytest.mark.parametrize('method, path', [
+    ('GET', '/tenders'),
+    ('GET', '/tenders/T1'),
+    ('GET', '/tenders/T1/submissions'),
+    ('GET', '/submissions/B1'),
+    ('GET', '/vendors/V1'),
+    ('POST', '/api/calls/make-call'),
+])
+def test_async_routes_go_to_the_async_app(dispatcher, method, path):
+    assert dispatcher.handled_async(scope(method, path))
+
+
+@pytest.mark.parametrize('method, path', [
+    ('POST', '/tenders'),
+    ('DELETE', '/tenders/T1'),
+    ('GET', '/tenders/T1/rankings'),
+    ('GET', '/tenders/T1/files/spec.pdf'),
+    ('GET', '/portal/tenders'),
+    ('PUT', '/uploads/upl-1'),
+    ('GET', '/tenders/'),
+    ('GET', '/no/such/route'),
+])
+def test_everything_else_goes_to_flask(dispatcher, method, path):
+    assert not dispatcher.handled_async(scope(method, path))
+
+
+def test_every_async_route_has_the_same_flask_route(app):
+    # The Flask app stays a drop-in fallback (e.g. under gunicorn) for every async URL
+    flask_urls = app.url_map.bind('')
+    for rule, _, methods in ROUTES:
+        path = rule.replace('<id>', 'X').replace('<tender_id>', 'X').replace('<bid_id>', 'X').replace('<vendor_id>', 'X')
+        for method in methods:
+            flask_urls.match(path, method=method)
+
+
+def test_flask_routes_answer_the_same_through_the_dispatcher(dispatcher, client, db):
+    db.tender_rankings.insert_one({'tender_id': 'T1', 'bid_id': 'B1', 'total_score': 80, 'current_stage': 1})
+
+    async def get():
+        transport = httpx.ASGITransport(app=dispatcher)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as http:
+            return await http.get('/tenders/T1/rankings')
+
+    response = asyncio.run(get())
+    direct = client.get('/tenders/T1/rankings')
+    assert response.status_code == direct.status_code == 200
+    assert response.json() == direct.get_json()
+
+
+def test_submission_of_a_deleted_tender_is_still_served(client, db):
+    db.submissions.insert_one({'bid_id': 'B1', 'tender_id': 'GONE', 'evaluation': {'legal': []}})
+
+    response = client.get('/submissions/B1')
+
+    assert response.status_code == 200
+    assert response.get_json()['bid_id'] == 'B1'
+
+
+class AsyncCollection:
+    """Awaitable find_one over a mongomock collection, enough for the single-document routes."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def find_one(self, *args, **kwargs):
+        return self.collection.find_one(*args, **kwargs)
+
+
+def test_async_submission_of_a_deleted_tender_matches_flask(client, db):
+    db.submissions.insert_one({'bid_id': 'B1', 'tender_id': 'GONE', 'evaluation': {'legal': []}})
+    async_app = create_async_app()
+    async_app.extensions['mongo'] = {'db': SimpleNamespace(**{name: AsyncCollection(db[name])
+                                                             for name in ('submissions', 'tenders', 'vendors')})}
+
+    async def get():
+        return await async_app.test_client().get('/submissions/B1')
+
+    response = asyncio.run(get())
+    assert response.status_code == 200
+    assert asyncio.run(response.get_json()) == client.get('/submissions/B1').get_json()
@@ -0,0 +1,24 @@
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_bench_runs_end_to_end_on_mongomock(tmp_path):
+    output = tmp_path / 'results.json'
+    completed = subprocess.run(
+        [sys.executable, '-m', 'bench.run', '--mongo-uri', 'mongomock', '--tenders', '1', '--bids', '4',
+         '--requests', '4', '--warmup', '1', '--concurrency', '2', '--evaluations', '1',
+         '--gemini-latency', '0', '--output', str(output)],
+        cwd=BACKEND_DIR, capture_output=True, text=True, timeout=300,
+        # Through the real genai client against the bench's fake server
+        env={key: value for key, value in os.environ.items() if key != 'GEMINI_FAKE'},
+    )
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+
+    results = {result['scenario']: result for result in json.loads(output.read_text())['results']}
+    assert 'evaluate_submission' in results
+    assert results['evaluate_submission']['requests'] == 1
+    assert all(result['errors'] == 0 for result in results.values())
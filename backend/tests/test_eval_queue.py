@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta
+
+import mongomock
+import pytest
+
+from eval_queue import claim_job, complete_job, enqueue_evaluation, fail_job, release_job
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().db
+
+
+def expire_lease(db, job):
+    db.eval_jobs.update_one({'job_id': job['job_id']},
+                            {'$set': {'lease_expires_at': datetime.utcnow() - timedelta(seconds=1)}})
+
+
+def test_bid_is_queued_once(db):
+    first = enqueue_evaluation(db, 'B1', 'T1')
+    second = enqueue_evaluation(db, 'B1', 'T1', batch_id='batch-1')
+
+    assert second['job_id'] == first['job_id']
+    assert second['batch_id'] == 'batch-1'
+    assert db.eval_jobs.count_documents({}) == 1
+
+
+def test_options_replace_those_of_the_queued_job(db):
+    enqueue_evaluation(db, 'B1', 'T1', options={'mode': 'stale'})
+    job = enqueue_evaluation(db, 'B1', 'T1', options={'mode': 'missing'})
+
+    assert job['options'] == {'mode': 'missing'}
+
+
+def test_enqueue_without_options_clears_queued_options(db):
+    enqueue_evaluation(db, 'B1', 'T1', options={'mode': 'stale'})
+    job = enqueue_evaluation(db, 'B1', 'T1')
+
+    assert 'options' not in job
+
+
+def test_claimed_job_is_leased_to_one_worker(db):
+    enqueue_evaluation(db, 'B1', 'T1')
+
+    job = claim_job(db, 'w1')
+
+    assert job['status'] == 'running' and job['worker_id'] == 'w1' and job['attempts'] == 1
+    assert claim_job(db, 'w2') is None
+
+
+def test_expired_lease_is_reclaimed_with_attempts_left(db):
+    enqueue_evaluation(db, 'B1', 'T1')
+    expire_lease(db, claim_job(db, 'w1'))
+
+    job = claim_job(db, 'w2')
+
+    assert job['worker_id'] == 'w2' and job['attempts'] == 2
+
+
+def test_expired_lease_on_the_last_attempt_fails_the_job(db):
+    enqueue_evaluation(db, 'B1', 'T1')
+    db.eval_jobs.update_one({}, {'$set': {'max_attempts': 1}})
+    expire_lease(db, claim_job(db, 'w1'))
+
+    assert claim_job(db, 'w2') is None
+    job = db.eval_jobs.find_one({'bid_id': 'B1'})
+    assert job['status'] == 'failed'
+    assert 'lease expired' in job['last_error']
+
+
+def test_failed_attempt_is_retried_until_out_of_attempts(db):
+    enqueue_evaluation(db, 'B1', 'T1')
+    db.eval_jobs.update_one({}, {'$set': {'max_attempts': 2}})
+
+    fail_job(db, claim_job(db, 'w1'), 'boom')
+    job = db.eval_jobs.find_one({'bid_id': 'B1'})
+    assert job['status'] == 'queued' and job['run_after'] > datetime.utcnow()
+
+    db.eval_jobs.update_one({}, {'$set': {'run_after': datetime.utcnow()}})
+    fail_job(db, claim_job(db, 'w1'), 'boom')
+    assert db.eval_jobs.find_one({'bid_id': 'B1'})['status'] == 'failed'
+
+
+def test_released_job_does_not_spend_an_attempt(db):
+    enqueue_evaluation(db, 'B1', 'T1')
+    release_job(db, claim_job(db, 'w1'))
+
+    job = claim_job(db, 'w2')
+
+    assert job['attempts'] == 1
+
+
+def test_only_the_lease_holder_completes_the_job(db):
+    enqueue_evaluation(db, 'B1', 'T1')
+    stale = claim_job(db, 'w1')
+    expire_lease(db, stale)
+    claim_job(db, 'w2')
+
+    complete_job(db, stale)
+
+    assert db.eval_jobs.find_one({'bid_id': 'B1'})['status'] == 'running'
@@ -0,0 +1,110 @@
+import threading
+from datetime import datetime, timedelta, timezone
+
+import mongomock
+from google.genai import errors
+
+from attachments import Attachment
+from fakes import FakeGenaiClient
+from gemini_files import DocumentRegistry
+import llm_client
+from llm_client import CircuitBreaker, LLMClient, TokenBucket
+
+
+def make_llm(client):
+    # Unpaced, so the process-wide GEMINI_RPM budget doesn't slow the tests
+    return LLMClient(client, rate_limiter=TokenBucket(rate=1000, capacity=100),
+                     breaker=CircuitBreaker(failure_threshold=100, reset_seconds=60))
+
+
+def make_attachment(data=b'%PDF-1.4 bid document'):
+    return Attachment('bid.pdf', data, 'application/pdf')
+
+
+def test_known_sha256_is_not_uploaded_again():
+    client = FakeGenaiClient()
+    collection = mongomock.MongoClient().db.gemini_files
+    attachment = make_attachment()
+
+    first = DocumentRegistry(make_llm(client), collection).get_record(attachment)
+    # Another process sharing the collection reuses the stored handle
+    second = DocumentRegistry(make_llm(client), collection).get_record(make_attachment())
+
+    assert client.files.upload_count == 1
+    assert second['name'] == first['name']
+
+
+def test_different_content_is_uploaded_separately():
+    client = FakeGenaiClient()
+    registry = DocumentRegistry(make_llm(client), mongomock.MongoClient().db.gemini_files)
+
+    registry.get_record(make_attachment(b'first'))
+    registry.get_record(make_attachment(b'second'))
+
+    assert client.files.upload_count == 2
+
+
+def test_expiring_handle_is_uploaded_again():
+    client = FakeGenaiClient()
+    collection = mongomock.MongoClient().db.gemini_files
+    registry = DocumentRegistry(make_llm(client), collection)
+    attachment = make_attachment()
+    registry.get_record(attachment)
+    collection.update_one({'sha256': attachment.sha256},
+                          {'$set': {'expires_at': datetime.now(timezone.utc) + timedelta(minutes=5)}})
+
+    registry.get_record(attachment)
+
+    assert client.files.upload_count == 2
+
+
+def test_invalidated_handle_is_uploaded_again():
+    client = FakeGenaiClient()
+    registry = DocumentRegistry(make_llm(client), mongomock.MongoClient().db.gemini_files)
+    attachment = make_attachment()
+    first = registry.get_record(attachment)
+
+    registry.invalidate(attachment.sha256)
+    second = registry.get_record(attachment)
+
+    assert client.files.upload_count == 2
+    assert second['name'] != first['name']
+
+
+def test_rate_limited_upload_is_retried_with_the_whole_document(monkeypatch):
+    monkeypatch.setattr(llm_client, 'BACKOFF_BASE_SECONDS', 0.01)
+    client = FakeGenaiClient()
+    upload = client.files.upload
+    attempts = []
+
+    def flaky_upload(file, config=None):
+        attempts.append(file.read())
+        file.seek(0)
+        if len(attempts) == 1:
+            raise errors.ClientError(429, {'error': {'code': 429, 'message': 'quota', 'status': 'RESOURCE_EXHAUSTED'}})
+        return upload(file=file, config=config)
+
+    monkeypatch.setattr(client.files, 'upload', flaky_upload)
+    llm = make_llm(client)
+    attachment = make_attachment()
+
+    record = DocumentRegistry(llm, mongomock.MongoClient().db.gemini_files).get_record(attachment)
+
+    assert attempts == [attachment.data, attachment.data]
+    assert record['size'] == attachment.size
+    assert client.files.upload_count == 1
+
+
+def test_concurrent_lookups_share_one_upload_and_release_the_lock():
+    client = FakeGenaiClient()
+    registry = DocumentRegistry(make_llm(client), mongomock.MongoClient().db.gemini_files)
+    attachment = make_attachment()
+
+    threads = [threading.Thread(target=registry.get_record, args=(attachment,)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert client.files.upload_count == 1
+    assert registry._locks == {}
@@ -0,0 +1,128 @@
+import threading
+import time
+
+import pytest
+from google import genai
+from google.genai import errors, types
+
+import llm_client
+from fakes import FakeGeminiServer
+from llm_client import CircuitBreaker, CircuitOpenError, LLMClient, TokenBucket
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=60)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.is_open()
+    assert not breaker.allow()
+
+
+def test_breaker_success_resets_the_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert not breaker.is_open()
+
+
+def test_breaker_half_open_lets_one_trial_through_and_closes_on_success():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert not breaker.allow()  # only one trial while it runs
+    breaker.record_success()
+    assert breaker.remaining() == 0
+    assert breaker.allow() and breaker.allow()
+
+
+def test_breaker_reopens_when_the_trial_fails():
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=0.05)
+    for _ in range(3):
+        breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.is_open()
+    assert not breaker.allow()
+
+
+def test_token_bucket_gives_up_when_the_wait_exceeds_the_timeout():
+    bucket = TokenBucket(rate=1, capacity=1)
+    assert bucket.acquire()
+    started = time.monotonic()
+
+    assert not bucket.acquire(timeout=0.1)
+    assert time.monotonic() - started < 0.1
+
+
+@pytest.fixture
+def server():
+    server = FakeGeminiServer().start()
+    yield server
+    server.stop()
+
+
+def make_llm(server, deadline_seconds=5, breaker=None):
+    client = genai.Client(api_key='test', http_options=types.HttpOptions(base_url=server.url, timeout=5000))
+    return LLMClient(
+        client,
+        rate_limiter=TokenBucket(rate=1000, capacity=100),
+        semaphore=threading.BoundedSemaphore(4),
+        breaker=breaker or CircuitBreaker(failure_threshold=100, reset_seconds=60),
+        deadline_seconds=deadline_seconds,
+    )
+
+
+def generate(llm):
+    return llm.generate_content(model='gemini-2.0-flash', contents='Evaluate the bid.')
+
+
+def test_retries_429_and_503_until_success(server, monkeypatch):
+    monkeypatch.setattr(llm_client, 'BACKOFF_BASE_SECONDS', 0.01)
+    server.fail_next(429, 503, retry_after=0)
+
+    response = generate(make_llm(server))
+
+    assert response.text is not None
+    assert len(server.requests) == 3
+
+
+def test_gives_up_when_the_retry_after_would_pass_the_deadline(server, monkeypatch):
+    monkeypatch.setattr(llm_client, 'BACKOFF_BASE_SECONDS', 0.01)
+    server.fail_next(*[503] * 10, retry_after=1)
+    started = time.monotonic()
+
+    with pytest.raises(errors.ServerError):
+        generate(make_llm(server, deadline_seconds=1.5))
+
+    # The first retry waits the full Retry-After; the second would overrun the deadline
+    assert len(server.requests) == 2
+    assert time.monotonic() - started < 1.5
+
+
+def test_open_breaker_fails_fast_without_calling_upstream(server, monkeypatch):
+    monkeypatch.setattr(llm_client, 'BACKOFF_BASE_SECONDS', 0.01)
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=60)
+    server.fail_next(503, 503, retry_after=0)
+    llm = make_llm(server, breaker=breaker)
+
+    with pytest.raises(CircuitOpenError):
+        generate(llm)
+    with pytest.raises(CircuitOpenError):
+        generate(llm)
+
+    assert len(server.requests) == 2
+
+
+def test_deadline_bounds_the_wait_for_the_rate_limiter(server):
+    llm = make_llm(server, deadline_seconds=0.2)
+    llm.rate_limiter = TokenBucket(rate=1 / 60, capacity=1)
+    llm.rate_limiter.acquire()
+
+    with pytest.raises(TimeoutError):
+        generate(llm)
+
+    assert server.requests == []
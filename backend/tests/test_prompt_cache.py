@@ -0,0 +1,64 @@
+from types import SimpleNamespace
+
+import mongomock
+import pytest
+
+from fakes import FakeGenaiClient
+from llm_client import CircuitBreaker, LLMClient, TokenBucket
+from prompt_cache import PromptCache, min_cache_tokens
+
+
+@pytest.fixture
+def client():
+    client = FakeGenaiClient()
+    client.counted = []
+
+    def count_tokens(model, contents):
+        text = ''.join(part.text for part in contents[0].parts)
+        client.counted.append(text)
+        return SimpleNamespace(total_tokens=len(text) // 4)
+
+    client.models.count_tokens = count_tokens
+    return client
+
+
+def make_cache(client, model='gemini-2.0-flash'):
+    llm = LLMClient(client, rate_limiter=TokenBucket(rate=1000, capacity=100),
+                    breaker=CircuitBreaker(failure_threshold=100, reset_seconds=60))
+    return PromptCache(llm, mongomock.MongoClient().db.prompt_caches, model)
+
+
+def test_minimum_depends_on_the_model(monkeypatch):
+    monkeypatch.delenv('GEMINI_CACHE_MIN_TOKENS', raising=False)
+    assert min_cache_tokens('gemini-2.0-flash') == 4096
+    assert min_cache_tokens('gemini-2.5-flash-lite') == 1024
+    assert min_cache_tokens('gemini-1.5-pro-002') == 32768
+    monkeypatch.setenv('GEMINI_CACHE_MIN_TOKENS', '2048')
+    assert min_cache_tokens('gemini-2.0-flash') == 2048
+
+
+def test_short_prompt_is_skipped_without_counting(client):
+    cache = make_cache(client)
+
+    assert cache.get('T1', 'legal', 'system', 'requirements' * 10) is None
+    assert client.counted == [] and client.caches.create_count == 0
+
+
+def test_prompt_below_the_minimum_is_counted_once(client):
+    cache = make_cache(client)
+    prompt = 'r' * 8000  # over 4096 characters but about 2000 tokens
+
+    assert cache.get('T1', 'legal', 'system', prompt) is None
+    assert cache.get('T1', 'legal', 'system', prompt) is None
+    assert len(client.counted) == 1 and client.caches.create_count == 0
+
+
+def test_large_prompt_is_cached_once_and_releases_its_lock(client):
+    cache = make_cache(client)
+    prompt = 'r' * 20000
+
+    name = cache.get('T1', 'legal', 'system', prompt)
+
+    assert name and cache.get('T1', 'legal', 'system', prompt) == name
+    assert client.caches.create_count == 1
+    assert cache._locks == {}
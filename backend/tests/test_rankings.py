@@ -0,0 +1,74 @@
+import pytest
+
+from rankings import bid_percentile, rebuild_rankings, refresh_ranking, top_percent, top_rankings
+
+
+@pytest.fixture
+def ranked(db):
+    for bid_id, score, stage in [('B0', 90, 1), ('B1', 80, 1), ('B2', 80, 2), ('B3', 70, 2), ('B4', None, 1)]:
+        db.tender_rankings.insert_one({'tender_id': 'T1', 'bid_id': bid_id, 'total_score': score, 'current_stage': stage})
+    return db
+
+
+def test_percentile_counts_the_bids_scored_below(ranked):
+    rows = {row['bid_id']: row for row in top_rankings(ranked, 'T1', k=5)['rankings']}
+
+    assert [rows[bid]['percentile'] for bid in ('B0', 'B1', 'B3', 'B4')] == [60.0, 20.0, 0.0, 0.0]
+
+
+def test_tied_bids_share_a_percentile(ranked):
+    rows = {row['bid_id']: row for row in top_rankings(ranked, 'T1', k=5)['rankings']}
+
+    assert rows['B1']['percentile'] == rows['B2']['percentile']
+    assert (rows['B1']['rank'], rows['B2']['rank']) == (2, 3)  # ties broken by bid_id
+
+
+def test_leaderboard_and_single_bid_lookup_agree(ranked):
+    for row in top_rankings(ranked, 'T1', k=5)['rankings']:
+        assert bid_percentile(ranked, 'T1', row['bid_id'])['percentile'] == row['percentile']
+
+
+def test_later_pages_keep_the_percentile_of_ties(ranked):
+    page = top_rankings(ranked, 'T1', k=1, offset=2)['rankings']
+
+    assert page[0]['bid_id'] == 'B2' and page[0]['rank'] == 3 and page[0]['percentile'] == 20.0
+
+
+def test_stage_ranks_within_the_stage(ranked):
+    result = top_rankings(ranked, 'T1', k=5, stage='2')
+
+    assert result['total'] == 2
+    assert [(row['bid_id'], row['percentile']) for row in result['rankings']] == [('B2', 50.0), ('B3', 0.0)]
+
+
+def test_top_percent_rounds_up(ranked):
+    assert [row['bid_id'] for row in top_percent(ranked, 'T1', 30)['rankings']] == ['B0', 'B1']
+
+
+def test_refresh_builds_the_row_from_the_submission(db):
+    db.vendors.insert_one({'vendor_id': 'V1', 'company_name': 'Acme'})
+    db.submissions.insert_one({'bid_id': 'B1', 'tender_id': 'T1', 'vendor_id': 'V1', 'evaluation_score': 75,
+                               'evaluation': {'technical_score': 70}, 'current_stage': 2})
+
+    refresh_ranking(db, 'B1')
+
+    row = db.tender_rankings.find_one({'bid_id': 'B1'})
+    assert (row['vendor_name'], row['total_score'], row['current_stage']) == ('Acme', 75, 2)
+    assert row['scores']['technical_score'] == 70
+
+
+def test_refresh_drops_the_row_of_a_deleted_submission(db):
+    db.submissions.insert_one({'bid_id': 'B1', 'tender_id': 'T1', 'evaluation_score': 75})
+    rebuild_rankings(db)
+    db.submissions.delete_one({'bid_id': 'B1'})
+
+    refresh_ranking(db, 'B1')
+
+    assert db.tender_rankings.count_documents({}) == 0
+
+
+def test_deleting_a_tender_drops_its_leaderboard(ranked, client):
+    ranked.tenders.insert_one({'tender_id': 'T1', 'attachments': []})
+
+    assert client.delete('/tenders/T1').status_code == 200
+    assert ranked.tender_rankings.count_documents({'tender_id': 'T1'}) == 0
@@ -0,0 +1,65 @@
+import mongomock
+import pytest
+
+import response_cache
+from response_cache import InProcessBackend, MongoBackend, ResponseCache
+
+
+@pytest.fixture(params=['memory', 'mongo'])
+def cache(request):
+    if request.param == 'memory':
+        return ResponseCache(InProcessBackend(), ttl=60)
+    collection = mongomock.MongoClient().db.response_cache
+    return ResponseCache(MongoBackend(lambda: collection), ttl=60)
+
+
+def test_hit_does_not_rebuild(cache):
+    builds = []
+    cache.get_or_build('k', lambda: builds.append(1) or b'body')
+
+    etag, body = cache.get_or_build('k', lambda: builds.append(1) or b'other')
+
+    assert body == b'body' and len(builds) == 1
+
+
+def test_invalidate_forces_a_rebuild(cache):
+    cache.get_or_build('k', lambda: b'old')
+    cache.invalidate('k')
+
+    assert cache.get_or_build('k', lambda: b'new')[1] == b'new'
+
+
+def test_build_racing_an_invalidation_is_not_stored(cache):
+    def build_then_write_lands():
+        cache.invalidate('k')
+        return b'read before the write'
+
+    # The racing build is still returned to its own caller...
+    assert cache.get_or_build('k', build_then_write_lands)[1] == b'read before the write'
+    # ...but the next request rebuilds instead of serving it
+    assert cache.get_or_build('k', lambda: b'fresh')[1] == b'fresh'
+    assert cache.get_or_build('k', lambda: b'unused')[1] == b'fresh'
+
+
+def test_invalidation_only_drops_its_own_key(cache):
+    cache.get_or_build('a', lambda: b'a')
+    cache.invalidate('b')
+
+    assert cache.get_or_build('a', lambda: b'rebuilt')[1] == b'a'
+
+
+def test_etag_changes_with_the_body(cache):
+    first, _ = cache.get_or_build('k', lambda: b'one')
+    cache.invalidate('k')
+    second, _ = cache.get_or_build('k', lambda: b'two')
+
+    assert first != second
+
+
+def test_several_workers_default_to_the_shared_backend(monkeypatch):
+    monkeypatch.delenv('RESPONSE_CACHE_BACKEND', raising=False)
+    monkeypatch.setenv('WEB_CONCURRENCY', '4')
+    assert response_cache.default_backend() == 'mongo'
+
+    monkeypatch.setenv('WEB_CONCURRENCY', '1')
+    assert response_cache.default_backend() == 'memory'
@@ -0,0 +1,157 @@
+import hashlib
+import io
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+import uploads
+from blobstore import blob_path
+from uploads import ChunkLock, ChunkLockLost, register_attachment, save_file_storage
+
+
+@pytest.fixture
+def tender(db):
+    db.tenders.insert_one({'tender_id': 'T1', 'attachments': []})
+    return 'T1'
+
+
+def upload(db, filename, data, tender_id='T1'):
+    return save_file_storage(db, FileStorage(io.BytesIO(data), filename), 'tender', tender_id, filename)
+
+
+def refcount(db, data):
+    blob = db.blobs.find_one({'sha256': hashlib.sha256(data).hexdigest()})
+    return blob['refcount'] if blob else 0
+
+
+def names(db):
+    return sorted(a['file_name'] for a in db.tenders.find_one({'tender_id': 'T1'})['attachments'])
+
+
+def test_same_file_under_the_same_name_is_not_attached_twice(db, blob_dir, tender):
+    first, created = upload(db, 'spec.pdf', b'spec')
+    again, created_again = upload(db, 'spec.pdf', b'spec')
+
+    assert created and not created_again
+    assert again['file_name'] == first['file_name']
+    assert names(db) == ['spec.pdf'] and refcount(db, b'spec') == 1
+
+
+def test_same_content_under_a_new_name_shares_the_blob(db, blob_dir, client, tender):
+    upload(db, 'spec.pdf', b'spec')
+    record, created = upload(db, 'copy.pdf', b'spec')
+
+    assert created and record['file_name'] == 'copy.pdf'
+    assert names(db) == ['copy.pdf', 'spec.pdf'] and refcount(db, b'spec') == 2
+    assert client.get('/tenders/T1/files/copy.pdf').status_code == 200
+
+
+def test_replacing_a_name_releases_the_old_blob(db, blob_dir, tender):
+    old, _ = upload(db, 'spec.pdf', b'old spec')
+    upload(db, 'spec.pdf', b'new spec')
+
+    assert names(db) == ['spec.pdf']
+    assert db.tenders.find_one({'tender_id': 'T1'})['attachments'][0]['sha256'] == hashlib.sha256(b'new spec').hexdigest()
+    assert refcount(db, b'old spec') == 0
+    assert not os.path.exists(blob_path(old['sha256']))
+
+
+def test_released_blob_survives_while_another_name_uses_it(db, blob_dir, tender):
+    record, _ = upload(db, 'spec.pdf', b'spec')
+    upload(db, 'copy.pdf', b'spec')
+    upload(db, 'spec.pdf', b'other')
+
+    assert refcount(db, b'spec') == 1
+    assert os.path.exists(blob_path(record['sha256']))
+
+
+def test_register_on_a_missing_target_releases_the_new_blob(db, blob_dir, tender):
+    record, _ = upload(db, 'spec.pdf', b'spec')
+    db.blobs.update_one({'sha256': record['sha256']}, {'$inc': {'refcount': 1}})  # as store() would
+
+    with pytest.raises(LookupError):
+        register_attachment(db, 'tender', 'GONE', 'spec.pdf', record['sha256'], 4, 'application/pdf')
+
+    assert refcount(db, b'spec') == 1
+
+
+def test_submission_attachment_queues_a_stale_reevaluation(db, blob_dir):
+    db.submissions.insert_one({'bid_id': 'B1', 'tender_id': 'T1', 'attachments': []})
+
+    save_file_storage(db, FileStorage(io.BytesIO(b'bid'), 'bid.pdf'), 'submission', 'B1', 'bid.pdf')
+
+    job = db.eval_jobs.find_one({'bid_id': 'B1'})
+    assert job['status'] == 'queued' and job['options'] == {'mode': 'stale'}
+
+
+def start_upload(client, size=None, sha256=None):
+    response = client.post('/uploads', json={'target': 'tender', 'target_id': 'T1', 'file_name': 'big.pdf',
+                                             'size': size, 'sha256': sha256})
+    assert response.status_code == 201
+    return response.get_json()['upload_id']
+
+
+def test_chunked_upload_resumes_from_received(db, blob_dir, client, tender):
+    data = b'0123456789'
+    upload_id = start_upload(client, size=len(data), sha256=hashlib.sha256(data).hexdigest())
+
+    assert client.put(f'/uploads/{upload_id}?offset=0', data=data[:4]).status_code == 200
+    # A chunk that doesn't continue the upload is refused with where to resume
+    skipped = client.put(f'/uploads/{upload_id}?offset=6', data=data[6:])
+    assert skipped.status_code == 409 and skipped.get_json()['received'] == 4
+    resumed = client.put(f'/uploads/{upload_id}', data=data[4:], headers={'Content-Range': 'bytes 4-9/10'})
+    assert resumed.get_json()['received'] == 10
+
+    completed = client.post(f'/uploads/{upload_id}/complete')
+    assert completed.status_code == 201
+    assert client.get('/tenders/T1/files/big.pdf').data == data
+
+
+def test_chunk_is_refused_while_another_request_holds_the_lock(db, blob_dir, client, tender):
+    upload_id = start_upload(client)
+    db.uploads.update_one({'upload_id': upload_id},
+                          {'$set': {'locked_until': datetime.utcnow() + timedelta(minutes=1), 'lock_id': 'other'}})
+
+    assert client.put(f'/uploads/{upload_id}?offset=0', data=b'abc').status_code == 409
+    assert client.post(f'/uploads/{upload_id}/complete').status_code == 409
+
+
+def test_checksum_mismatch_fails_the_upload(db, blob_dir, client, tender):
+    upload_id = start_upload(client, sha256=hashlib.sha256(b'expected').hexdigest())
+    client.put(f'/uploads/{upload_id}?offset=0', data=b'received')
+
+    assert client.post(f'/uploads/{upload_id}/complete').status_code == 422
+    assert db.uploads.find_one({'upload_id': upload_id})['status'] == 'failed'
+    assert names(db) == []
+
+
+def test_chunk_lock_renews_while_held(db, monkeypatch):
+    monkeypatch.setattr(uploads, 'CHUNK_LOCK_RENEW_SECONDS', 0)
+    soon = datetime.utcnow() + timedelta(seconds=5)
+    db.uploads.insert_one({'upload_id': 'U1', 'lock_id': 'mine', 'locked_until': soon})
+
+    ChunkLock(db, 'U1', 'mine')()
+
+    assert db.uploads.find_one({'upload_id': 'U1'})['locked_until'] > soon
+
+
+def test_chunk_lock_stops_the_write_once_superseded(db, monkeypatch, tmp_path):
+    monkeypatch.setattr(uploads, 'CHUNK_LOCK_RENEW_SECONDS', 0)
+    monkeypatch.setattr(uploads, 'COPY_CHUNK_BYTES', 4)
+    db.uploads.insert_one({'upload_id': 'U1', 'lock_id': 'mine',
+                           'locked_until': datetime.utcnow() + timedelta(minutes=1)})
+    lock = ChunkLock(db, 'U1', 'mine')
+    written = []
+
+    def superseded_after_first_piece():
+        lock()
+        if written:
+            db.uploads.update_one({'upload_id': 'U1'}, {'$set': {'lock_id': 'theirs'}})
+        written.append(1)
+
+    with open(tmp_path / 'part', 'wb') as out, pytest.raises(ChunkLockLost):
+        uploads.copy_stream(io.BytesIO(b'aaaabbbbcccc'), out, before_write=superseded_after_first_piece)
+
+    assert (tmp_path / 'part').read_bytes() == b'aaaabbbb'
@@ -0,0 +1,286 @@
+"""
+Helpers shared by the multipart and the chunked upload paths.
+
+Uploaded bytes are always streamed to a temporary file in bounded pieces
+while their SHA-256 is computed, and only moved into the blob store
+(blobstore.py) with an atomic rename once complete, so a broken upload never
+leaves a partial file where it can be served or evaluated.
+
+Chunked uploads (routes/uploads.py) keep their session in the `uploads`
+collection:
+
+    {
+        "upload_id": "upl-<hex>", "target": "tender" | "submission",
+        "target_id": "...", "file_name": "...", "size": 123 | None,
+        "sha256": "<expected hex>" | None, "received": 0,
+        "status": "open" | "completing" | "complete" | "failed",
+        "locked_until": <datetime>,   # set while one request writes a chunk
+        "lock_id": "<hex>",           # fences the writer holding the lock
+        "created_at", "updated_at", "expires_at": <datetime>
+    }
+
+The bytes received so far live in `<tmp folder>/<upload_id>.part`, by
+default under BLOB_DIR so that every replica sharing the blob volume can
+take the next chunk of an upload (UPLOAD_TMP_DIR must be shared as well).
+The writer of a chunk renews its lock as it goes and stops as soon as it
+no longer holds it, so a second writer never truncates a file in use.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from attachments import guess_mime_type
+from blobstore import BLOB_DIR, store, release, release_attachments
+from eval_queue import enqueue_evaluation
+from response_cache import response_cache, PORTAL_TENDERS_KEY
+
+COPY_CHUNK_BYTES = 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_MB", 512)) * 1024 * 1024
+MAX_CHUNK_BYTES = int(os.environ.get("UPLOAD_MAX_CHUNK_MB", 64)) * 1024 * 1024
+RECOMMENDED_CHUNK_BYTES = 8 * 1024 * 1024
+SESSION_TTL = timedelta(hours=int(os.environ.get("UPLOAD_SESSION_HOURS", 24)))
+CHUNK_LOCK_SECONDS = 300
+# Renew a chunk lock this often while the chunk is written
+CHUNK_LOCK_RENEW_SECONDS = CHUNK_LOCK_SECONDS / 5
+
+TARGETS = ('tender', 'submission')
+
+
+def tmp_folder():
+    # Must be on the same filesystem as BLOB_DIR for os.replace to be atomic,
+    # and shared between replicas like BLOB_DIR for chunked uploads
+    folder = os.environ.get("UPLOAD_TMP_DIR") or os.path.join(BLOB_DIR, '.upload_tmp')
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def copy_stream(stream, out, hasher=None, max_bytes=None, before_write=None):
+    """
+    Copy a stream into an open file in COPY_CHUNK_BYTES pieces.
+
+    `before_write` is called before each piece is written and may raise to
+    stop the copy.
+
+    Returns:
+        int: Number of bytes written.
+    """
+    written = 0
+    while True:
+        chunk = stream.read(COPY_CHUNK_BYTES)
+        if not chunk:
+            return written
+        written += len(chunk)
+        if max_bytes is not None and written > max_bytes:
+            raise RequestEntityTooLarge()
+        if before_write is not None:
+            before_write()
+        out.write(chunk)
+        if hasher is not None:
+            hasher.update(chunk)
+
+
+def target_url(target, target_id, filename):
+    if target == 'tender':
+        return f"/tenders/{target_id}/files/{filename}"
+    return f"/submissions/{target_id}/attachments/{filename}"
+
+
+def target_collection(db, target):
+    return db.tenders if target == 'tender' else db.submissions
+
+
+def target_filter(target, target_id):
+    return {'tender_id': target_id} if target == 'tender' else {'bid_id': target_id}
+
+
+def find_duplicate(db, target, target_id, filename, sha256):
+    """
+    The attachment already on the target under this name with identical
+    content, if any. The same content under another name is not a duplicate:
+    the new name is registered and shares the stored blob.
+    """
+    doc = target_collection(db, target).find_one(
+        {**target_filter(target, target_id),
+         'attachments': {'$elemMatch': {'file_name': filename, 'sha256': sha256}}},
+        {'_id': 0, 'attachments': 1}
+    )
+    if doc:
+        for attachment in doc.get('attachments', []):
+            if attachment.get('file_name') == filename and attachment.get('sha256') == sha256:
+                return attachment
+    return None
+
+
+def register_attachment(db, target, target_id, filename, sha256, size, mime_type):
+    """
+    Record a stored blob on its tender or submission.
+
+    A previous attachment with the same file name is replaced rather than
+    duplicated, and its blob reference released. Raises LookupError (after
+    releasing the new blob) when the target no longer exists. Tender changes invalidate
+    the portal listing cache and submission changes queue a re-evaluation of
+    the affected agents.
+
+    Returns:
+        dict: The attachment record.
+    """
+    attachment_data = {
+        "file_name": filename,
+        "url": target_url(target, target_id, filename),
+        "blob_url": f"/blobs/{sha256}",
+        "sha256": sha256,
+        "size": size,
+        "mime_type": mime_type,
+        "stored": "blob",
+        "uploaded_at": datetime.utcnow()
+    }
+    collection = target_collection(db, target)
+    # Drop any record with this name and append the new one in a single
+    # update, so concurrent uploads of the same name cannot interleave
+    previous = collection.find_one_and_update(
+        target_filter(target, target_id),
+        [{'$set': {'attachments': {'$concatArrays': [
+            {'$filter': {
+                'input': {'$ifNull': ['$attachments', []]},
+                'cond': {'$ne': ['$$this.file_name', {'$literal': filename}]},
+            }},
+            {'$literal': [attachment_data]},
+        ]}}}],
+        projection={'attachments': 1, 'tender_id': 1}
+    )
+
+    if previous is None:
+        # The tender or submission is gone; nothing references the new blob
+        release(db, sha256)
+        raise LookupError(f"{target} {target_id} not found")
+
+    release_attachments(db, [attachment for attachment in previous.get('attachments', [])
+                             if attachment.get('file_name') == filename])
+
+    if target == 'tender':
+        response_cache.invalidate(PORTAL_TENDERS_KEY)
+    else:
+        # New document: rerun only the agents whose inputs changed
+        enqueue_evaluation(db, target_id, previous.get('tender_id'), options={'mode': 'stale'})
+    return attachment_data
+
+
+def save_file_storage(db, file, target, target_id, filename):
+    """
+    Save a multipart upload (werkzeug FileStorage) into the blob store via a temp file.
+
+    Returns:
+        tuple: (attachment record, created) - created is False when the same
+        content was already attached under this name and that record is returned.
+    """
+    hasher = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_folder(), suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            size = copy_stream(file.stream, out, hasher, MAX_UPLOAD_BYTES)
+        sha256 = hasher.hexdigest()
+
+        duplicate = find_duplicate(db, target, target_id, filename, sha256)
+        if duplicate:
+            os.remove(tmp_path)
+            return duplicate, False
+
+        mime_type = guess_mime_type(filename)
+        store(db, tmp_path, sha256, size, mime_type)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return register_attachment(db, target, target_id, filename, sha256, size, mime_type), True
+
+
+def part_path(upload_id):
+    return os.path.join(tmp_folder(), f"{upload_id}.part")
+
+
+class ChunkLockLost(Exception):
+    """The chunk lock expired and may now be held by another request."""
+
+
+class ChunkLock:
+    """
+    Keeps a chunk lock (locked_until + lock_id) alive while a chunk is written.
+
+    Passed as copy_stream's before_write: every CHUNK_LOCK_RENEW_SECONDS the
+    lock is extended, but only if this request still holds it; otherwise
+    ChunkLockLost is raised before another byte is written.
+    """
+
+    def __init__(self, db, upload_id, lock_id):
+        self.db = db
+        self.upload_id = upload_id
+        self.lock_id = lock_id
+        self._renewed = time.monotonic()
+
+    def filter(self):
+        return {'upload_id': self.upload_id, 'lock_id': self.lock_id, 'locked_until': {'$gt': datetime.utcnow()}}
+
+    def __call__(self):
+        if time.monotonic() - self._renewed < CHUNK_LOCK_RENEW_SECONDS:
+            return
+        result = self.db.uploads.update_one(
+            self.filter(),
+            {'$set': {'locked_until': datetime.utcnow() + timedelta(seconds=CHUNK_LOCK_SECONDS)}}
+        )
+        if not result.matched_count:
+            raise ChunkLockLost(self.upload_id)
+        self._renewed = time.monotonic()
+
+
+class ChunkHashers:
+    """
+    Running SHA-256 of open chunked uploads in this process.
+
+    A hasher is only reused when it has seen exactly the bytes already on
+    disk; otherwise (chunks handled by another worker, a failed chunk) the
+    part file is hashed once at completion instead.
+    """
+
+    def __init__(self):
+        self._hashers = {}  # upload_id -> (offset, hasher)
+        self._lock = threading.Lock()
+
+    def take(self, upload_id, offset):
+        with self._lock:
+            entry = self._hashers.pop(upload_id, None)
+        if offset == 0:
+            return hashlib.sha256()
+        if entry and entry[0] == offset:
+            return entry[1]
+        return None
+
+    def put(self, upload_id, offset, hasher):
+        if hasher is not None:
+            with self._lock:
+                self._hashers[upload_id] = (offset, hasher)
+
+    def discard(self, upload_id):
+        with self._lock:
+            self._hashers.pop(upload_id, None)
+
+
+chunk_hashers = ChunkHashers()
+
+
+def cleanup_expired_uploads(db, limit=100):
+    """Delete expired upload sessions and any part files they left behind."""
+    expired = db.uploads.find(
+        {'expires_at': {'$lt': datetime.utcnow()}},
+        {'_id': 0, 'upload_id': 1}
+    ).limit(limit)
+    for session in expired:
+        chunk_hashers.discard(session['upload_id'])
+        path = part_path(session['upload_id'])
+        if os.path.exists(path):
+            os.remove(path)
+        db.uploads.delete_one({'upload_id': session['upload_id']})
@@ -0,0 +1,49 @@
+"""
+Standalone evaluation worker.
+
+    python worker.py --concurrency 4
+
+Run one or more of these next to the API (which leaves evaluation to them
+unless EVAL_INPROCESS_WORKERS is set) to process the evaluation queue with
+bounded concurrency. With several of them, set GEMINI_PROCESSES to their
+number so together they stay within GEMINI_RPM.
+"""
+import argparse
+import logging
+import os
+import signal
+import threading
+
+from ai_eval import db, evaluate_submission_async
+from eval_queue import EvaluationWorker
+from llm_client import gemini_breaker
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process queued submission evaluations")
+    parser.add_argument('--concurrency', type=int, default=int(os.environ.get("EVAL_CONCURRENCY", 4)),
+                        help="Maximum evaluations running at once")
+    parser.add_argument('--poll-interval', type=float, default=2.0,
+                        help="Seconds to wait when the queue is empty")
+    parser.add_argument('--drain-timeout', type=float, default=float(os.environ.get("EVAL_DRAIN_TIMEOUT", 60)),
+                        help="Seconds to let running evaluations finish on shutdown")
+    args = parser.parse_args()
+    logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO"), format="%(name)s : %(message)s")
+
+    worker = EvaluationWorker(
+        db,
+        evaluate_submission_async,
+        concurrency=args.concurrency,
+        poll_interval=args.poll_interval,
+        paused=gemini_breaker.remaining,
+    ).start()
+
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopped.set())
+    signal.signal(signal.SIGINT, lambda *_: stopped.set())
+    stopped.wait()
+    worker.stop(timeout=args.drain_timeout)
+
+
+if __name__ == '__main__':
+    main()